@@ -0,0 +1,133 @@
+# backend/app/commands/cascade_eval.py
+"""
+Evaluate the classifier cascade on the stored emails: agreement with transformer-only labels vs CPU time per email.
+
+Rows of the emails table are split by id (every 5th row is held out). The linear head is fitted on
+the rest (--fit) or loaded from CASCADE_HEAD_PATH. On the held-out rows every margin threshold is
+replayed: rows under the threshold take the transformer label, the others keep the stage-one label.
+The reference is the stored predicted_label (what the transformer said when the email was synced),
+or a fresh transformer pass with --relabel. CPU time is process time (all threads).
+
+Usage (from backend/): python -m app.commands.cascade_eval [--fit] [--save] [--limit 50000]
+    [--margins 0,0.1,0.2,0.3,0.5] [--relabel] [--transformer-ms 250]
+"""
+import argparse
+import time
+
+import numpy as np
+from sqlalchemy import select
+
+from app.database.db import ReadSession, EmailRecord, init_db
+from app.services import cascade
+from app.services.classifier import CANDIDATE_LABELS, EmailClassifier, length_buckets
+
+
+def load_corpus(limit: int, batch: int = 5000):
+    """(ids, cleaned texts, stored labels) for the newest `limit` rows with a known label."""
+    session = ReadSession()
+    try:
+        result = session.execute(
+            select(EmailRecord.id, EmailRecord.cleaned_text, EmailRecord.predicted_label)
+            .where(EmailRecord.cleaned_text.is_not(None), EmailRecord.predicted_label.in_(CANDIDATE_LABELS))
+            .order_by(EmailRecord.id.desc()).limit(limit)
+            .execution_options(yield_per=batch)
+        )
+        ids, texts, labels = [], [], []
+        for rows in result.partitions():
+            for row_id, text, label in rows:
+                ids.append(row_id)
+                texts.append(text)
+                labels.append(label)
+    finally:
+        session.close()
+    return np.array(ids), texts, labels
+
+
+def fit_head(features, labels, c: float = 4.0) -> cascade.LinearHead:
+    from sklearn.linear_model import LogisticRegression
+    if len(set(labels)) < 2:
+        raise SystemExit("❌ Need at least two labels in the stored emails to fit a head")
+    model = LogisticRegression(C=c, max_iter=1000)
+    model.fit(features, labels)
+    return cascade.LinearHead.from_estimator(model, meta={"trained_rows": len(labels), "C": c})
+
+
+def transformer_pass(texts, batch_size: int):
+    """Transformer-only labels and CPU seconds, using the configured zero-shot mode."""
+    clf = EmailClassifier(cache=None, cascade=False)
+    labels = [None] * len(texts)
+    start = time.process_time()
+    for bucket in length_buckets(texts, batch_size):
+        for i, (label, _) in zip(bucket, clf._zero_shot([texts[i] for i in bucket])):
+            labels[i] = label
+    return labels, time.process_time() - start
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--limit", type=int, default=50000, help="Newest stored emails to use")
+    ap.add_argument("--fit", action="store_true", help="Fit the linear head on the non-held-out rows")
+    ap.add_argument("--save", action="store_true", help="With --fit: write the head to CASCADE_HEAD_PATH")
+    ap.add_argument("--c", type=float, default=4.0, help="Inverse regularization strength for --fit")
+    ap.add_argument("--margins", default="0,0.05,0.1,0.2,0.3,0.4,0.5,0.7")
+    ap.add_argument("--relabel", action="store_true", help="Reference = fresh transformer labels, not stored ones")
+    ap.add_argument("--transformer-ms", type=float, help="Transformer CPU ms/email instead of measuring it")
+    ap.add_argument("--time-sample", type=int, default=64, help="Emails timed through the transformer")
+    ap.add_argument("--batch", type=int, default=16, help="Transformer batch size")
+    args = ap.parse_args()
+
+    init_db()
+    ids, texts, stored = load_corpus(args.limit)
+    held_out = ids % 5 == 0
+    if not held_out.any() or held_out.all():
+        raise SystemExit(f"❌ Not enough stored emails to evaluate ({len(ids)} with a known label)")
+    test_texts = [t for t, h in zip(texts, held_out) if h]
+    print(f"📚 {len(ids)} stored emails, {len(test_texts)} held out")
+
+    vectorizer = cascade.load_vectorizer()
+    if args.fit:
+        train = [i for i, h in enumerate(held_out) if not h]
+        head = fit_head(vectorizer.transform([texts[i] for i in train]), [stored[i] for i in train], args.c)
+        if args.save:
+            head.save(cascade.CASCADE_HEAD_PATH)
+            print(f"💾 Head {head.version} saved to {cascade.CASCADE_HEAD_PATH}")
+    else:
+        head = cascade.LinearHead.load()
+    stage = cascade.CascadeStage(vectorizer, head)
+    stage.check_labels(CANDIDATE_LABELS)
+
+    start = time.process_time()
+    probs = stage.score(test_texts, CANDIDATE_LABELS)
+    stage1_ms = (time.process_time() - start) * 1000 / len(test_texts)
+    top, _, margin = cascade.top_with_margin(probs)
+    stage1_labels = np.array(CANDIDATE_LABELS)[top]
+
+    if args.relabel:
+        reference, seconds = transformer_pass(test_texts, args.batch)
+        transformer_ms = seconds * 1000 / len(test_texts)
+    else:
+        reference = [s for s, h in zip(stored, held_out) if h]
+        if args.transformer_ms is not None:
+            transformer_ms = args.transformer_ms
+        else:
+            try:
+                _, seconds = transformer_pass(test_texts[:args.time_sample], args.batch)
+            except ImportError as e:
+                raise SystemExit(f"❌ Can't time the transformer ({e}); pass --transformer-ms")
+            transformer_ms = seconds * 1000 / min(len(test_texts), args.time_sample)
+    reference = np.array(reference)
+
+    print(f"⏱️ CPU per email: stage one {stage1_ms:.3f} ms, transformer {transformer_ms:.1f} ms "
+          f"({'measured' if args.transformer_ms is None else 'given'})")
+    print(f"stage one alone agrees on {np.mean(stage1_labels == reference):.1%}")
+    print(f"{'margin':>7} {'escalated':>10} {'agreement':>10} {'CPU ms/email':>13} {'speedup':>8}")
+    for threshold in (float(m) for m in args.margins.split(",")):
+        escalate = margin < threshold
+        predicted = np.where(escalate, reference, stage1_labels)
+        cpu_ms = stage1_ms + escalate.mean() * transformer_ms
+        print(f"{threshold:>7.2f} {escalate.mean():>10.1%} {np.mean(predicted == reference):>10.1%} "
+              f"{cpu_ms:>13.2f} {transformer_ms / cpu_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# backend/app/commands/fts_backfill.py
+"""
+Index stored emails into emails_fts (emails saved before the index existed, or a rebuild).
+
+Walks emails in id order, one short write transaction per chunk, and records the last indexed id
+in job_checkpoints with each chunk, so an interrupted run resumes where it stopped. The pause
+between chunks leaves the writer connection free for live syncs.
+
+Usage (from backend/): python -m app.commands.fts_backfill [--chunk 1000] [--pause 0.05] [--restart]
+"""
+import argparse
+import time
+
+from sqlalchemy import select
+
+from app.database.db import SessionLocal, EmailRecord, init_db, get_checkpoint, set_checkpoint
+from app.database.fts import fts_row, index_emails, indexed_body
+
+CHECKPOINT = "fts_backfill"
+
+
+def backfill(chunk: int = 1000, pause: float = 0.05, restart: bool = False) -> int:
+    """Index every email after the checkpoint; returns the number indexed by this run."""
+    done = 0
+    session = SessionLocal()
+    try:
+        if restart:
+            set_checkpoint(session, CHECKPOINT, 0)
+            session.commit()
+        position = get_checkpoint(session, CHECKPOINT)
+        while True:
+            rows = session.execute(
+                select(EmailRecord.id, EmailRecord.subject, indexed_body(EmailRecord).label("body"))
+                .where(EmailRecord.id > position)
+                .order_by(EmailRecord.id)
+                .limit(chunk)
+            ).all()
+            if not rows:
+                break
+            index_emails(session, [fts_row(r.id, r.subject, r.body) for r in rows])
+            position = rows[-1].id
+            set_checkpoint(session, CHECKPOINT, position)
+            session.commit()
+            done += len(rows)
+            print(f"🔎 FTS backfill: {done} indexed (up to id {position})")
+            if pause:
+                time.sleep(pause)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    return done
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--chunk", type=int, default=1000, help="Emails per transaction")
+    ap.add_argument("--pause", type=float, default=0.05, help="Seconds between chunks")
+    ap.add_argument("--restart", action="store_true", help="Ignore the checkpoint and re-index everything")
+    args = ap.parse_args()
+
+    init_db()
+    done = backfill(args.chunk, args.pause, args.restart)
+    print(f"✅ FTS backfill complete: {done} email(s) indexed")
+
+
+if __name__ == "__main__":
+    main()
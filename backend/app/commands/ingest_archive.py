@@ -0,0 +1,170 @@
+# backend/app/commands/ingest_archive.py
+"""
+Import a local mailbox archive (Google Takeout .mbox, .eml files, or directories of them) into emails, without the Gmail API.
+
+Message boundaries are found in a memory-mapped scan of each mbox. Batches of --parse-batch
+byte ranges go to --workers processes, which read and parse them with the stdlib email package
+and run parser.extract_text. At most a few batches per worker are in flight, so memory stays
+flat however large the archive is. The parent classifies --batch messages per
+predict_with_confidence call and upserts them with save_email_records, one short transaction
+per batch, with the Date header as the timestamp. archive:<Message-ID> is the upsert key, and
+messages already stored are skipped before classification: earlier imports, and mail the Gmail
+sync already stored under its Gmail id (matched on the Message-ID header). An interrupted
+import therefore resumes cheaply when rerun with the same paths.
+
+Usage (from backend/): python -m app.commands.ingest_archive PATH [PATH ...] [--workers N]
+    [--batch 256] [--parse-batch 64] [--limit N] [--reimport]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from app.database.db import (
+    SessionLocal, ReadSession, init_db, email_row, existing_message_ids, save_email_records, stored_rfc_message_ids,
+)
+from app.services import classifier as clf_module
+from app.services.mail_archive import ParsedEmail, Span, iter_archive_files, iter_spans, parse_spans
+
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # One core left for classification in the parent
+IN_FLIGHT_PER_WORKER = 4  # Parse batches queued per worker: enough to keep it busy, bounded for memory
+
+
+def iter_span_batches(paths: Iterable[str], size: int, limit: int = 0) -> Iterator[List[Span]]:
+    spans = (span for path in iter_archive_files(paths) for span in iter_spans(path))
+    if limit:
+        spans = islice(spans, limit)
+    while True:
+        batch = list(islice(spans, size))
+        if not batch:
+            return
+        yield batch
+
+
+class ArchiveImporter:
+    """Classifies and stores parsed messages in batches; keeps the run's counts."""
+
+    def __init__(self, batch: int, reimport: bool = False):
+        self.batch = batch
+        self.reimport = reimport
+        self.buffer: List[ParsedEmail] = []
+        self.stats = {"messages": 0, "failed": 0, "already_stored": 0, "saved": 0}
+        self.start = time.perf_counter()
+
+    def add(self, parsed: List[ParsedEmail], failed: int):
+        self.stats["messages"] += len(parsed) + failed
+        self.stats["failed"] += failed
+        self.buffer.extend(parsed)
+        while len(self.buffer) >= self.batch:
+            self.flush(self.buffer[:self.batch])
+            del self.buffer[:self.batch]
+
+    def finish(self):
+        if self.buffer:
+            self.flush(self.buffer)
+            self.buffer = []
+
+    def flush(self, items: List[ParsedEmail]):
+        items = list({item[0]: item for item in items}.values())  # Duplicate Message-IDs: last copy wins
+        if not self.reimport:
+            session = ReadSession()
+            try:
+                stored = existing_message_ids(session, [item[0] for item in items])
+                from_gmail = stored_rfc_message_ids(session, [item[6] for item in items if item[0] not in stored])
+            finally:
+                session.close()
+            items = [item for item in items if item[0] not in stored and item[6] not in from_gmail]
+            self.stats["already_stored"] += len(stored) + len(from_gmail)
+        if items:
+            classifier = clf_module.classifier
+            predictions = classifier.predict_with_confidence([item[4] for item in items])
+            model_version = classifier.model_fingerprint
+            rows = []
+            for (message_id, subject, body, combined, cleaned, sent_at, rfc_id), pred in zip(items, predictions):
+                row = email_row(message_id, subject, body, combined, cleaned, pred[0], float(pred[1]),
+                                pred[2], pred[3], model_version, rfc_id)
+                if sent_at is not None:
+                    row["timestamp"] = sent_at
+                rows.append(row)
+            session = SessionLocal()
+            try:
+                self.stats["saved"] += save_email_records(session, rows)
+            finally:
+                session.close()
+        elapsed = time.perf_counter() - self.start
+        print(f"📥 Archive import: {self.stats['messages']} read, {self.stats['saved']} saved "
+              f"({self.stats['messages'] / elapsed:.0f} messages/s)")
+
+    def report(self) -> Dict:
+        elapsed = time.perf_counter() - self.start
+        return dict(self.stats, seconds=round(elapsed, 1),
+                    messages_per_second=round(self.stats["messages"] / elapsed, 1) if elapsed else None)
+
+
+def _init_worker():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C is handled by the parent
+
+
+def iter_parsed(paths: List[str], workers: int = DEFAULT_WORKERS, parse_batch: int = 64,
+                limit: int = 0) -> Iterator[Tuple[List[ParsedEmail], int]]:
+    """(parsed messages, parse failures) per batch, in archive order; parsing runs in `workers` processes."""
+    batches = iter_span_batches(paths, parse_batch, limit)
+    if not workers:
+        for spans in batches:
+            yield parse_spans(spans)
+        return
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker) as pool:
+        in_flight = deque()
+        try:
+            for spans in batches:
+                in_flight.append(pool.submit(parse_spans, spans))
+                if len(in_flight) >= workers * IN_FLIGHT_PER_WORKER:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+
+def ingest(paths: List[str], workers: int = DEFAULT_WORKERS, batch: int = 256, parse_batch: int = 64,
+           limit: int = 0, reimport: bool = False) -> Dict:
+    importer = ArchiveImporter(batch, reimport)
+    for parsed, failed in iter_parsed(paths, workers, parse_batch, limit):
+        importer.add(parsed, failed)
+    importer.finish()
+    return importer.report()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("paths", nargs="+", help=".mbox / .eml files or directories containing them")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Parser processes (0 = in-process)")
+    ap.add_argument("--batch", type=int, default=256, help="Messages per classifier call / write transaction")
+    ap.add_argument("--parse-batch", type=int, default=64, help="Messages per task sent to a parser process")
+    ap.add_argument("--limit", type=int, default=0, help="Stop after this many messages (0 = all)")
+    ap.add_argument("--reimport", action="store_true", help="Classify and upsert messages already stored")
+    args = ap.parse_args()
+
+    missing = [p for p in args.paths if not os.path.exists(p)]
+    if missing:
+        raise SystemExit(f"❌ Not found: {', '.join(missing)}")
+    init_db()
+    try:
+        report = ingest(args.paths, args.workers, args.batch, args.parse_batch, args.limit, args.reimport)
+    except KeyboardInterrupt:
+        print("⚠️ Interrupted; saved batches are kept, rerun to import the rest")
+        return
+    print(json.dumps(report, indent=2))
+    print(f"✅ Archive import complete: {report['saved']} email(s) saved")
+
+
+if __name__ == "__main__":
+    main()
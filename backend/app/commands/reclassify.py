@@ -0,0 +1,234 @@
+# backend/app/commands/reclassify.py
+"""
+Relabel stored emails whose model_version isn't the current classifier's (after changing the model, ZERO_SHOT_MODE or CANDIDATE_LABELS).
+
+The emails table is walked by id on the read pool, --chunk stale rows at a time (model_version NULL
+or different). Their cleaned_text goes to a pool of --workers processes in --batch sized calls;
+every worker loads its own classifier (no prediction cache) and gets an equal share of the CPU
+threads. While the pool labels one chunk the next one is read. A labelled chunk is written back in
+one short BEGIN IMMEDIATE transaction: label, confidence, sentiment, priority and model_version by
+id, the dashboard rollups moved accordingly, and the checkpoint advanced. Ctrl-C loses at most the
+chunks in flight, and a rerun resumes after the last written one. Rows the server has relabelled
+meanwhile are left alone, and the pause between chunks leaves the writer free for live syncs.
+
+Usage (from backend/): python -m app.commands.reclassify [--workers N] [--chunk 2000] [--batch 64]
+    [--pause 0.05] [--restart]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, or_, select, update
+
+from app.database.db import SessionLocal, ReadSession, EmailRecord, init_db, get_checkpoint, set_checkpoint
+from app.database import rollups
+from app.services import parser
+from app.services.classifier import EmailClassifier
+
+CHECKPOINT = "reclassify:{}"  # One per model fingerprint, so a different model starts from the first row
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) // 2)  # The other half stays with the server
+
+Prediction = Tuple[str, float, str, str]
+
+_classifier: Optional[EmailClassifier] = None  # Per worker process
+
+
+def _init_worker(threads: Optional[int] = None):
+    global _classifier
+    if threads:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C is handled by the parent
+        os.environ["OMP_NUM_THREADS"] = str(threads)  # Before torch is imported
+    _classifier = EmailClassifier(cache=None)
+    _classifier.warm_up()
+    if threads and "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+
+def classify(texts: List[str]) -> Tuple[str, List[Prediction]]:
+    """(model fingerprint, one prediction per text), in a worker."""
+    return _classifier.model_fingerprint, _classifier.predict_with_confidence(texts)
+
+
+def _stale(version: str):
+    return or_(EmailRecord.model_version.is_(None), EmailRecord.model_version != version)
+
+
+def count_stale(version: str, after: int = 0) -> int:
+    session = ReadSession()
+    try:
+        return session.execute(
+            select(func.count()).select_from(EmailRecord).where(EmailRecord.id > after, _stale(version))
+        ).scalar()
+    finally:
+        session.close()
+
+
+def read_chunk(after: int, chunk: int, version: str) -> List[Tuple[int, Optional[str]]]:
+    """(id, cleaned text) of the next stale rows; text is None when nothing is left to classify."""
+    session = ReadSession()
+    try:
+        rows = session.execute(
+            select(EmailRecord.id, EmailRecord.cleaned_text)
+            .where(EmailRecord.id > after, _stale(version))
+            .order_by(EmailRecord.id).limit(chunk)
+        ).all()
+        missing = [r.id for r in rows if r.cleaned_text is None]
+        recovered = {}
+        if missing:  # Rows saved without cleaned_text: rebuild it while the body is still kept
+            for row_id, subject, body in session.execute(
+                select(EmailRecord.id, EmailRecord.subject, EmailRecord.body)
+                .where(EmailRecord.id.in_(missing), EmailRecord.body.is_not(None))
+            ):
+                recovered[row_id] = parser.extract_text(subject, body)[1]
+    finally:
+        session.close()
+    return [(r.id, r.cleaned_text if r.cleaned_text is not None else recovered.get(r.id)) for r in rows]
+
+
+def write_chunk(labelled: List[Tuple[int, Prediction]], version: str, checkpoint: str, position: int) -> int:
+    """Store one chunk of new labels, move the rollups and advance the checkpoint; returns rows updated."""
+    table = EmailRecord.__table__
+    stmt = (
+        update(table).where(table.c.id == bindparam("row_id"))
+        .values(predicted_label=bindparam("new_label"), confidence=bindparam("new_confidence"),
+                sentiment=bindparam("new_sentiment"), priority=bindparam("new_priority"),
+                model_version=bindparam("new_version"))
+    )
+    session = SessionLocal()
+    try:
+        # Take the write lock first: the old values read below must be the ones being replaced
+        session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+        previous = {}
+        if labelled:
+            previous = {r[0]: tuple(r[1:]) for r in session.execute(
+                select(table.c.id, table.c.predicted_label, table.c.sentiment, table.c.priority,
+                       table.c.confidence, table.c.timestamp)
+                .where(table.c.id.in_([row_id for row_id, _ in labelled]), _stale(version))
+            )}
+        updates = [
+            {"row_id": row_id, "new_label": label, "new_confidence": float(confidence or 0.0),
+             "new_sentiment": sentiment, "new_priority": priority, "new_version": version}
+            for row_id, (label, confidence, sentiment, priority) in labelled if row_id in previous
+        ]
+        if updates:
+            session.execute(stmt, updates)
+            rollups.apply(session, rollups.relabel_deltas(previous, updates))
+        set_checkpoint(session, checkpoint, position)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    return len(updates)
+
+
+def reclassify(workers: int = DEFAULT_WORKERS, chunk: int = 2000, batch: int = 64, pause: float = 0.05,
+               restart: bool = False) -> Dict:
+    """Relabel every stale row after the checkpoint; returns the run's counts."""
+    clf = EmailClassifier(cache=None)
+    version = clf.model_fingerprint
+    checkpoint = CHECKPOINT.format(version)
+    session = SessionLocal()
+    try:
+        if restart:
+            set_checkpoint(session, checkpoint, 0)
+            session.commit()
+        position = get_checkpoint(session, checkpoint)
+    finally:
+        session.close()
+    total = count_stale(version, position)
+    print(f"🔁 {total} stale email(s) after id {position}; relabelling with {clf.model_version} ({version})")
+
+    pool = None
+    if workers:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(threads,))
+    else:
+        _init_worker()
+
+    def submit(rows):
+        texts = [text for _, text in rows if text is not None]
+        slices = [texts[i:i + batch] for i in range(0, len(texts), batch)]
+        if pool is None:
+            return rows, [classify(s) for s in slices]
+        return rows, [pool.submit(classify, s) for s in slices]
+
+    stats = {"version": version, "scanned": 0, "relabelled": 0, "skipped_no_text": 0}
+    start = time.perf_counter()
+
+    def finish(rows, results):
+        predictions = []
+        for result in results:
+            fingerprint, preds = result.result() if pool is not None else result
+            if fingerprint != version:
+                raise RuntimeError(f"Worker classifier is {fingerprint}, expected {version} (model changed mid-run?)")
+            predictions.extend(preds)
+        labelled = list(zip([row_id for row_id, text in rows if text is not None], predictions))
+        stats["relabelled"] += write_chunk(labelled, version, checkpoint, rows[-1][0])
+        stats["scanned"] += len(rows)
+        stats["skipped_no_text"] += len(rows) - len(labelled)
+        elapsed = time.perf_counter() - start
+        rate = stats["scanned"] / elapsed if elapsed else 0.0
+        eta = timedelta(seconds=int(max(total - stats["scanned"], 0) / rate)) if rate else "?"
+        print(f"🔁 Reclassify: {stats['scanned']}/{total} ({rate:.0f} rows/s, ETA {eta}, up to id {rows[-1][0]})")
+
+    try:
+        pending = None
+        while True:
+            rows = read_chunk(position, chunk, version)
+            queued = submit(rows) if rows else None  # Labelled by the pool while `pending` is written
+            if rows:
+                position = rows[-1][0]
+            if pending is not None:
+                finish(*pending)
+                if pause:
+                    time.sleep(pause)
+            if queued is None:
+                break
+            pending = queued
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    # Done: the next run re-checks from the first row (new stale rows can appear anywhere)
+    session = SessionLocal()
+    try:
+        set_checkpoint(session, checkpoint, 0)
+        session.commit()
+    finally:
+        session.close()
+    elapsed = time.perf_counter() - start
+    stats.update(seconds=round(elapsed, 1), rows_per_second=round(stats["scanned"] / elapsed, 1) if elapsed else None)
+    return stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Classifier processes (0 = in-process)")
+    ap.add_argument("--chunk", type=int, default=2000, help="Rows per read / write transaction")
+    ap.add_argument("--batch", type=int, default=64, help="Texts per classifier call in a worker")
+    ap.add_argument("--pause", type=float, default=0.05, help="Seconds between chunk writes")
+    ap.add_argument("--restart", action="store_true", help="Ignore the checkpoint and scan from the first row")
+    args = ap.parse_args()
+
+    init_db()
+    try:
+        stats = reclassify(args.workers, args.chunk, args.batch, args.pause, args.restart)
+    except KeyboardInterrupt:
+        print("⚠️ Interrupted; written chunks are kept, rerun to resume from the checkpoint")
+        return
+    print(json.dumps(stats, indent=2))
+    print(f"✅ Reclassify complete: {stats['relabelled']} email(s) relabelled")
+
+
+if __name__ == "__main__":
+    main()
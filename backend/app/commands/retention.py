@@ -0,0 +1,37 @@
+# backend/app/commands/retention.py
+"""
+Run the retention policy and compaction once (the server also runs it every RETENTION_INTERVAL_HOURS).
+
+Safe to interrupt with Ctrl-C: every chunk is its own transaction, so a rerun picks up the rest.
+
+Usage (from backend/): python -m app.commands.retention [--no-compact] [--enable-incremental-vacuum]
+"""
+import argparse
+import json
+
+from app.database.db import init_db
+from app.services.retention import retention_job
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--no-compact", action="store_true", help="Skip incremental VACUUM / WAL checkpoint")
+    ap.add_argument("--enable-incremental-vacuum", action="store_true",
+                    help="One-off full VACUUM to switch an existing DB file to auto_vacuum=INCREMENTAL "
+                         "(blocks writers while it runs)")
+    args = ap.parse_args()
+
+    init_db()
+    if args.enable_incremental_vacuum:
+        reclaimed = retention_job.enable_incremental_vacuum()
+        print(f"✅ auto_vacuum=INCREMENTAL enabled, {reclaimed} bytes reclaimed by the full VACUUM")
+    try:
+        report = retention_job.run(compact=not args.no_compact)
+    except KeyboardInterrupt:
+        print("⚠️ Interrupted; completed chunks are kept, rerun to continue")
+        return
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
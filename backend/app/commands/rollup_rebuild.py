@@ -0,0 +1,76 @@
+# backend/app/commands/rollup_rebuild.py
+"""
+Recompute email_rollups from the emails table (plus the archived share) in one streaming pass.
+
+The scan runs in a single read transaction, i.e. one WAL snapshot, without holding the writer.
+Syncs keep writing meanwhile; their rollup updates since the snapshot are carried over when the
+result is swapped in (new = recomputed + (live now - live at snapshot)), so nothing is lost.
+
+Usage (from backend/): python -m app.commands.rollup_rebuild [--batch 5000]
+"""
+import argparse
+import time
+
+from sqlalchemy import delete, select
+
+from app.database.db import SessionLocal, ReadSession, EmailRecord, EmailRollup, ArchivedRollup, init_db
+from app.database import rollups
+
+
+def rebuild(batch: int = 5000) -> dict:
+    start = time.perf_counter()
+    scanned = 0
+    session = ReadSession()
+    try:
+        session.connection().exec_driver_sql("BEGIN")  # pysqlite doesn't open one for SELECTs
+        at_snapshot = rollups.read_rollups(session)
+        computed = rollups.read_rollups(session, model=ArchivedRollup)
+        result = session.execute(
+            select(EmailRecord.predicted_label, EmailRecord.sentiment, EmailRecord.priority,
+                   EmailRecord.confidence, EmailRecord.timestamp)
+            .execution_options(yield_per=batch)
+        )
+        for rows in result.partitions():
+            for row in rows:
+                rollups.add_email(computed, 1, *row)
+            scanned += len(rows)
+            if scanned % (batch * 20) == 0:
+                print(f"📊 Rollup rebuild: {scanned} emails scanned")
+    finally:
+        session.close()
+
+    session = SessionLocal()
+    try:
+        live = rollups.read_rollups(session)
+        for key in set(live) | set(at_snapshot):
+            moved = live.get(key, [0, 0.0])
+            base = at_snapshot.get(key, [0, 0.0])
+            entry = computed.setdefault(key, [0, 0.0])
+            entry[0] += moved[0] - base[0]
+            entry[1] += moved[1] - base[1]
+        drift = sum(1 for key, value in computed.items() if live.get(key, [0, 0.0])[0] != value[0])
+        session.execute(delete(EmailRollup))
+        rollups.apply(session, {k: v for k, v in computed.items() if v[0]})
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    return {"emails_scanned": scanned, "buckets": len(computed), "buckets_corrected": drift,
+            "seconds": round(time.perf_counter() - start, 3)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--batch", type=int, default=5000, help="Rows fetched per round trip")
+    args = ap.parse_args()
+
+    init_db()
+    report = rebuild(args.batch)
+    print(f"✅ Rollups rebuilt: {report['emails_scanned']} emails, {report['buckets']} buckets, "
+          f"{report['buckets_corrected']} corrected, {report['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# backend/app/commands/train_student.py
+"""
+Distill a compact student classifier from the zero-shot labels stored in the emails table.
+
+Rows are streamed by id in chunks (never the whole table in memory): predicted_label is the
+teacher label and confidence weights the example. Text is the stored cleaned_text, i.e. the same
+parser.extract_text / clean_text output the classifier sees at serve time (recomputed from
+subject + body for rows that lack it). Hashed word/bigram features feed an SGD logistic
+regression trained with partial_fit for --epochs passes; every --holdout'th id is kept out and
+used for the metrics and to calibrate a softmax temperature, so confidences stay comparable with
+the thresholds applied to zero-shot scores (e.g. auto-reply above 0.7). The result is written to model/students/<version>/ (student.npz +
+metrics.json) and LATEST is pointed at it; serve it with ZERO_SHOT_MODE=student.
+
+Replaces model/train.ipynb. Usage (from backend/): python -m app.commands.train_student
+    [--epochs 3] [--chunk 5000] [--min-confidence 0.5] [--holdout 5] [--limit N] [--out model/students]
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime
+from typing import Iterator, List, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from app.database.db import ReadSession, EmailRecord, init_db
+from app.services import parser
+from app.services.cascade import LinearHead
+from app.services.classifier import CANDIDATE_LABELS
+from app.services.student import DEFAULT_FEATURES, STUDENTS_DIR, StudentModel, build_features
+
+Example = Tuple[int, str, str, float]  # (id, cleaned text, teacher label, teacher confidence)
+
+TEMPERATURES = np.geomspace(0.25, 64, 25)  # Calibration grid
+
+
+def stream_examples(chunk: int, min_confidence: float, limit: int = 0) -> Iterator[List[Example]]:
+    """Teacher-labelled rows in id order, one short read transaction per chunk."""
+    last_id, seen = 0, 0
+    while not limit or seen < limit:
+        size = min(chunk, limit - seen) if limit else chunk
+        session = ReadSession()
+        try:
+            rows = session.execute(
+                select(EmailRecord.id, EmailRecord.cleaned_text, EmailRecord.subject, EmailRecord.body,
+                       EmailRecord.predicted_label, EmailRecord.confidence)
+                .where(EmailRecord.id > last_id, EmailRecord.predicted_label.in_(CANDIDATE_LABELS),
+                       EmailRecord.confidence >= min_confidence)
+                .order_by(EmailRecord.id).limit(size)
+            ).all()
+        finally:
+            session.close()
+        if not rows:
+            return
+        batch = []
+        for row_id, cleaned, subject, body, label, confidence in rows:
+            if cleaned is None and body is not None:
+                cleaned = parser.extract_text(subject, body)[1]
+            if cleaned:
+                batch.append((row_id, cleaned, label, float(confidence)))
+        last_id, seen = rows[-1][0], seen + len(rows)
+        yield batch
+
+
+def train(args) -> Tuple[StudentModel, dict]:
+    from sklearn.linear_model import SGDClassifier
+
+    features = build_features(DEFAULT_FEATURES)
+    model = SGDClassifier(loss="log_loss", alpha=args.alpha, average=True, random_state=args.seed)
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    trained = 0
+    for epoch in range(args.epochs):
+        for batch in stream_examples(args.chunk, args.min_confidence, args.limit):
+            batch = [e for e in batch if e[0] % args.holdout]
+            if not batch:
+                continue
+            rng.shuffle(batch)  # SGD converges better without id-ordered (i.e. time-ordered) chunks
+            model.partial_fit(features.transform([e[1] for e in batch]), [e[2] for e in batch],
+                              classes=CANDIDATE_LABELS, sample_weight=[e[3] for e in batch])
+            if epoch == 0:
+                trained += len(batch)
+        print(f"🏋️ Epoch {epoch + 1}/{args.epochs} done: {trained} training emails, "
+              f"{time.perf_counter() - start:.1f}s")
+    if not trained:
+        raise SystemExit("❌ No teacher-labelled emails to train on")
+
+    meta = {"features": DEFAULT_FEATURES, "teacher": "emails.predicted_label", "trained_rows": trained,
+            "epochs": args.epochs, "alpha": args.alpha, "min_confidence": args.min_confidence}
+    head = LinearHead.from_estimator(model, meta)
+    student = StudentModel(head, f"{datetime.utcnow():%Y%m%d-%H%M%S}-{head.version}")
+    metrics = dict(meta, version=student.version, train_seconds=round(time.perf_counter() - start, 1))
+    metrics.update(evaluate(student, args))  # Also calibrates head.meta["temperature"]
+    return student, metrics
+
+
+def evaluate(student: StudentModel, args) -> dict:
+    """
+    Agreement with the teacher on the held-out ids, streamed, plus scoring throughput. Also picks
+    the softmax temperature with the lowest held-out log loss and stores it in the head.
+    """
+    labels = student.head.labels
+    confusion = np.zeros((len(labels), len(labels)), dtype=np.int64)  # [teacher, student]
+    log_loss = np.zeros(len(TEMPERATURES))
+    seconds, total = 0.0, 0
+    for batch in stream_examples(args.chunk, args.min_confidence, args.limit):
+        batch = [e for e in batch if e[0] % args.holdout == 0]
+        if not batch:
+            continue
+        start = time.perf_counter()
+        predicted = student.score([e[1] for e in batch], labels).argmax(axis=1)
+        seconds += time.perf_counter() - start
+        total += len(batch)
+        teacher = np.array([labels.index(e[2]) for e in batch])
+        np.add.at(confusion, (teacher, predicted), 1)
+        logits = student.head.logits(student.features.transform([e[1] for e in batch]))
+        for k, temperature in enumerate(TEMPERATURES):
+            scaled = logits / temperature
+            scaled -= scaled.max(axis=1, keepdims=True)
+            log_norm = np.log(np.exp(scaled).sum(axis=1))
+            log_loss[k] -= (scaled[np.arange(len(batch)), teacher] - log_norm).sum()
+    if not total:
+        return {"holdout_rows": 0}
+    best = int(np.argmin(log_loss))
+    student.head.meta["temperature"] = student.head.temperature = float(TEMPERATURES[best])
+
+    per_label = {}
+    for i, label in enumerate(labels):
+        tp = confusion[i, i]
+        precision = tp / confusion[:, i].sum() if confusion[:, i].sum() else 0.0
+        recall = tp / confusion[i].sum() if confusion[i].sum() else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        per_label[label] = {"precision": round(float(precision), 4), "recall": round(float(recall), 4),
+                            "f1": round(float(f1), 4), "support": int(confusion[i].sum())}
+    supported = [m["f1"] for m in per_label.values() if m["support"]]
+    return {
+        "holdout_rows": total,
+        "agreement": round(float(np.trace(confusion) / total), 4),
+        "macro_f1": round(float(np.mean(supported)), 4) if supported else 0.0,
+        "per_label": per_label,
+        "confusion": {"labels": labels, "rows_teacher_cols_student": confusion.tolist()},
+        "emails_per_second": round(total / seconds, 1) if seconds else None,
+        "temperature": round(float(TEMPERATURES[best]), 3),
+        "holdout_log_loss": round(float(log_loss[best] / total), 4),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--epochs", type=int, default=3)
+    ap.add_argument("--chunk", type=int, default=5000, help="Rows per read / partial_fit call")
+    ap.add_argument("--min-confidence", type=float, default=0.5, help="Skip rows the teacher was unsure about")
+    ap.add_argument("--holdout", type=int, default=5, help="Every Nth id is held out for evaluation")
+    ap.add_argument("--limit", type=int, default=0, help="Use at most this many rows (0 = all)")
+    ap.add_argument("--alpha", type=float, default=1e-5, help="SGD L2 regularization")
+    ap.add_argument("--seed", type=int, default=13)
+    ap.add_argument("--out", default=STUDENTS_DIR, help="Directory that receives <version>/ and LATEST")
+    args = ap.parse_args()
+
+    init_db()
+    student, metrics = train(args)
+    path = student.save(args.out, metrics)
+    print(json.dumps({k: metrics[k] for k in ("version", "holdout_rows", "agreement", "macro_f1",
+                                              "emails_per_second", "temperature") if k in metrics}, indent=2))
+    print(f"✅ Student written to {path} (serve with ZERO_SHOT_MODE=student)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# backend/app/database/compression.py
+"""
+Transparent at-rest compression for large text columns.
+
+Values are zlib-compressed on write and stored as BLOBs; reads return str. Short values and rows
+written before compression existed are plain TEXT, and reads accept either, so no migration is
+needed (the retention job recompresses old rows in the background).
+"""
+import os
+import zlib
+
+from sqlalchemy import Text
+from sqlalchemy.types import TypeDecorator
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 256))  # Smaller values aren't worth it
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", 6))
+
+
+def compress_text(value: str):
+    raw = value.encode("utf-8")
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return value
+    return zlib.compress(raw, COMPRESS_LEVEL)
+
+
+def decompress_text(value):
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode("utf-8")
+    return value
+
+
+class CompressedText(TypeDecorator):
+    """Text column stored zlib-compressed (BLOB) once longer than COMPRESS_MIN_BYTES."""
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
@@ -1,40 +1,127 @@
 import os
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from sqlalchemy import event, select, tuple_, update, Column, DDL, Index, Integer, String, Text, DateTime, Float
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import QueuePool  # For larger pool
 
-DB_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "data", "emails.db")
+from app.database import fts
+from app.database.compression import CompressedText
+from app.database.sqlite_config import build_engines
+
+DB_FILE = os.getenv("EMAILS_DB_FILE", os.path.join(os.path.dirname(__file__), "..", "..", "data", "emails.db"))
 os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_FILE}"
 
-# Engine with larger pool for real-time floods
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    poolclass=QueuePool,  # Explicit pool
-    pool_size=20,  # Increased: 20 connections
-    max_overflow=30,  # Increased: 30 overflow
-    pool_timeout=60,  # Increased: 60s timeout
-    pool_pre_ping=True  # Ping before use (SQLite)
-)
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# One serialized writer connection plus a pool of read-only connections (WAL, see sqlite_config.py)
+engine, read_engine = build_engines(SQLALCHEMY_DATABASE_URL)
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)  # Anything that writes
+ReadSession = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)  # Read-only queries
 Base = declarative_base()
 
 
 class EmailRecord(Base):
     __tablename__ = "emails"
     id = Column(Integer, primary_key=True, index=True)
-    message_id = Column(String(256), index=True, unique=False, nullable=True)
+    message_id = Column(String(256), index=True, unique=True, nullable=True)  # Upsert key: Gmail id, or ARCHIVE_KEY_PREFIX + ...
+    rfc_message_id = Column(String(256), index=True, nullable=True)  # Message-ID header: links archive imports to Gmail
     subject = Column(String(1024), nullable=True)
-    body = Column(Text, nullable=True)
-    combined_text = Column(Text, nullable=True)
+    body = Column(CompressedText, nullable=True)  # zlib at rest; NULL once past the retention window
+    combined_text = Column(CompressedText, nullable=True)
     cleaned_text = Column(Text, nullable=True)
     predicted_label = Column(String(128), nullable=True)
     confidence = Column(Float, nullable=True)
+    sentiment = Column(String(32), nullable=True)
+    priority = Column(String(32), nullable=True)
+    model_version = Column(String(32), nullable=True)  # EmailClassifier.model_fingerprint that labelled the row
+    auto_replied_at = Column(DateTime, nullable=True)  # Set once when an auto-reply goes out; upserts never touch it
     timestamp = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Keyset pagination for /history: newest first, optionally within one label
+        Index("ix_emails_timestamp_id", "timestamp", "id"),
+        Index("ix_emails_label_timestamp_id", "predicted_label", "timestamp", "id"),
+    )
+
+
+# Full-text index (and its delete trigger) is created alongside the emails table, see fts.py
+for _ddl in fts.CREATE_SQL:
+    event.listen(EmailRecord.__table__, "after_create", DDL(_ddl))
+
+
+class PredictionCacheEntry(Base):
+    """Persistent tier of the classifier prediction cache (see app/services/prediction_cache.py)."""
+    __tablename__ = "prediction_cache"
+    key = Column(String(64), primary_key=True)  # sha256(model/label-set version + cleaned_text)
+    label = Column(String(128), nullable=False)
+    confidence = Column(Float, nullable=False)
+    sentiment = Column(String(32), nullable=False)
+    priority = Column(String(32), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class ReplyDraftEntry(Base):
+    """Cached LLM reply draft (see app/services/draft_cache.py)."""
+    __tablename__ = "reply_drafts"
+    key = Column(String(64), primary_key=True)  # sha256(model + label + tone + normalized email text)
+    draft = Column(Text, nullable=False)
+    provider = Column(String(32), nullable=True)
+    prompt_chars = Column(Integer, nullable=False, default=0)  # For the cost-saved estimate
+    generation_seconds = Column(Float, nullable=False, default=0.0)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)  # TTL
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)  # LRU
+
+
+class SyncJob(Base):
+    """Durable work item for the background sync queue (see app/services/work_queue.py)."""
+    __tablename__ = "sync_jobs"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(32), nullable=False)  # "history" or "messages"
+    payload = Column(Text, nullable=False)  # "sync" marker, or JSON {"source", "ids"} of message ids
+    status = Column(String(16), nullable=False, default="pending", index=True)  # pending/running/done/failed
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    enqueued_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class SyncCursor(Base):
+    """Last fully processed Gmail historyId per mailbox (incremental sync cursor)."""
+    __tablename__ = "sync_cursors"
+    mailbox = Column(String(256), primary_key=True)
+    history_id = Column(String(64), nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class RollupColumns:
+    """Shared shape of the rollup tables (see app/database/rollups.py)."""
+    dimension = Column(String(32), primary_key=True)  # label, sentiment, priority, hour, weekday, day, ...
+    bucket = Column(String(160), primary_key=True)
+    emails = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+
+
+class EmailRollup(RollupColumns, Base):
+    """Dashboard counts over every email ever stored, kept current by save_email_records."""
+    __tablename__ = "email_rollups"
+
+
+class ArchivedRollup(RollupColumns, Base):
+    """Share of email_rollups from emails the retention job has deleted (used by the rebuild)."""
+    __tablename__ = "email_rollups_archived"
+
+
+class JobCheckpoint(Base):
+    """Resume point (last processed id) for long-running maintenance commands."""
+    __tablename__ = "job_checkpoints"
+    name = Column(String(64), primary_key=True)
+    position = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 
 # New: User model for auth/register/login (email unique, hashed password)
 class User(Base):
@@ -46,20 +133,205 @@ class User(Base):
 
 
 def init_db():
+    from app.database.migrations import run_migrations
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
 
 
-def save_email_record(session, message_id, subject, body, combined_text, cleaned_text, label, confidence):
-    rec = EmailRecord(
-        message_id=message_id,
-        subject=subject,
-        body=body,
-        combined_text=combined_text,
-        cleaned_text=cleaned_text,
-        predicted_label=label,
-        confidence=confidence
-    )
-    session.add(rec)
+# Columns a re-classified message overwrites on conflict (timestamp keeps the first-seen time)
+EMAIL_UPSERT_COLUMNS = ("subject", "body", "combined_text", "cleaned_text", "predicted_label", "confidence",
+                        "sentiment", "priority", "model_version", "rfc_message_id")
+# message_id namespace of rows imported from an mbox/.eml archive (Gmail ids never contain ':')
+ARCHIVE_KEY_PREFIX = "archive:"
+# Rows per INSERT statement, well under SQLite's bound-parameter limit
+BULK_WRITE_CHUNK = 500
+
+
+def email_row(message_id, subject, body, combined_text, cleaned_text, label, confidence,
+              sentiment=None, priority=None, model_version=None, rfc_message_id=None) -> Dict:
+    return {
+        "message_id": message_id,
+        "rfc_message_id": rfc_message_id,
+        "subject": subject,
+        "body": body,
+        "combined_text": combined_text,
+        "cleaned_text": cleaned_text,
+        "predicted_label": label,
+        "confidence": confidence,
+        "sentiment": sentiment,
+        "priority": priority,
+        "model_version": model_version,
+        "timestamp": datetime.utcnow(),
+    }
+
+
+def save_email_records(session, rows: List[Dict]) -> int:
+    """
+    Upsert a batch of classified emails (dicts from email_row) in one transaction:
+    INSERT ... ON CONFLICT(message_id) DO UPDATE, so re-processing a message never duplicates it.
+    The full-text index and the dashboard rollups are updated in the same transaction.
+    """
+    from app.database import rollups
+    if not rows:
+        return 0
+    # A message_id twice in one statement would hit the same row twice; the last copy wins
+    # (NULL message_ids never conflict, so those rows are all kept)
+    rows = list({r["message_id"] if r["message_id"] is not None else i: r for i, r in enumerate(rows)}.values())
+    # Core table, not the ORM entity: the ORM bulk path adds more per call than the insert itself
+    table = EmailRecord.__table__
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.message_id],
+        set_={c: stmt.excluded[c] for c in EMAIL_UPSERT_COLUMNS},
+    ).returning(table.c.id, sort_by_parameter_order=True)
+    try:
+        for i in range(0, len(rows), BULK_WRITE_CHUNK):
+            chunk = rows[i:i + BULK_WRITE_CHUNK]
+            previous = rollups.stored_versions(session, [r["message_id"] for r in chunk])  # Before the upsert
+            ids = session.execute(stmt, chunk).scalars().all()
+            fts.index_emails(session, [fts.fts_row(row_id, r["subject"], r["body"]) for row_id, r in zip(ids, chunk)])
+            rollups.apply(session, rollups.write_deltas(previous, chunk))
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return len(rows)
+
+
+def save_email_record(session, message_id, subject, body, combined_text, cleaned_text, label, confidence,
+                      sentiment=None, priority=None, model_version=None):
+    """Single-email save; prefer save_email_records for anything that arrives in batches."""
+    save_email_records(session, [email_row(message_id, subject, body, combined_text, cleaned_text, label, confidence,
+                                           sentiment, priority, model_version)])
+    return session.execute(select(EmailRecord).where(EmailRecord.message_id == message_id)).scalars().first()
+
+
+def existing_message_ids(session, message_ids: Iterable[str]) -> Set[str]:
+    """Which of these Gmail ids are already stored (one IN query per BULK_WRITE_CHUNK ids)."""
+    message_ids = list(dict.fromkeys(message_ids))
+    found = set()
+    for i in range(0, len(message_ids), BULK_WRITE_CHUNK):
+        found.update(session.execute(
+            select(EmailRecord.message_id).where(EmailRecord.message_id.in_(message_ids[i:i + BULK_WRITE_CHUNK]))
+        ).scalars())
+    return found
+
+
+def stored_rfc_message_ids(session, rfc_message_ids: Iterable[str]) -> Set[str]:
+    """Which of these Message-ID headers are already stored, from Gmail or an archive."""
+    rfc_message_ids = list(dict.fromkeys(m for m in rfc_message_ids if m))
+    found = set()
+    for i in range(0, len(rfc_message_ids), BULK_WRITE_CHUNK):
+        found.update(session.execute(
+            select(EmailRecord.rfc_message_id)
+            .where(EmailRecord.rfc_message_id.in_(rfc_message_ids[i:i + BULK_WRITE_CHUNK]))
+        ).scalars())
+    return found
+
+
+def adopt_archived_emails(session, rfc_by_gmail_id: Dict[str, Optional[str]]) -> Set[str]:
+    """
+    Re-key archive-imported rows to the Gmail id of the same message (matched on Message-ID), so
+    the Gmail copy upserts over them instead of being stored, classified and replied to again.
+    Returns the Gmail ids that matched an archived row.
+    """
+    adopted = set()
+    try:
+        for gmail_id, rfc_id in rfc_by_gmail_id.items():
+            if not rfc_id:
+                continue
+            taken = select(EmailRecord.id).where(EmailRecord.message_id == gmail_id).exists()
+            archived = session.execute(
+                select(EmailRecord.id).where(EmailRecord.rfc_message_id == rfc_id,
+                                             EmailRecord.message_id.startswith(ARCHIVE_KEY_PREFIX), ~taken).limit(1)
+            ).scalar()
+            if archived is not None:
+                session.execute(update(EmailRecord).where(EmailRecord.id == archived).values(message_id=gmail_id))
+                adopted.add(gmail_id)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return adopted
+
+
+def claim_auto_reply(session, message_id) -> bool:
+    """Mark an email as auto-replied unless it already is; True means this caller sends the reply."""
+    claimed = session.execute(
+        update(EmailRecord).where(EmailRecord.message_id == message_id, EmailRecord.auto_replied_at.is_(None))
+        .values(auto_replied_at=datetime.utcnow())
+    ).rowcount == 1
     session.commit()
-    session.refresh(rec)
-    return rec
\ No newline at end of file
+    return claimed
+
+
+def release_auto_reply(session, message_id):
+    """Undo claim_auto_reply after a send that failed, so a later retry may reply."""
+    session.execute(update(EmailRecord).where(EmailRecord.message_id == message_id).values(auto_replied_at=None))
+    session.commit()
+
+
+def get_sync_cursor(session, mailbox):
+    row = session.get(SyncCursor, mailbox)
+    return row.history_id if row else None
+
+
+def set_sync_cursor(session, mailbox, history_id):
+    """Store the cursor; never moves it backwards."""
+    row = session.get(SyncCursor, mailbox)
+    if row is None:
+        session.add(SyncCursor(mailbox=mailbox, history_id=str(history_id)))
+    elif int(history_id) > int(row.history_id):
+        row.history_id = str(history_id)
+    session.commit()
+
+
+def get_checkpoint(session, name) -> int:
+    row = session.get(JobCheckpoint, name)
+    return row.position if row else 0
+
+
+def set_checkpoint(session, name, position):
+    """Stage the new resume point; commits with the caller's transaction."""
+    row = session.get(JobCheckpoint, name)
+    if row is None:
+        session.add(JobCheckpoint(name=name, position=position))
+    else:
+        row.position = position
+
+
+# /history returns these by default; the large text columns are only loaded when asked for
+HISTORY_COLUMNS = ("id", "message_id", "subject", "predicted_label", "confidence", "sentiment", "priority", "timestamp")
+HISTORY_OPTIONAL_COLUMNS = ("body", "combined_text", "cleaned_text")
+
+
+def email_history_page(session, limit: int, after: Optional[Tuple[datetime, int]] = None,
+                       label: Optional[str] = None, min_confidence: Optional[float] = None,
+                       max_confidence: Optional[float] = None, since: Optional[datetime] = None,
+                       until: Optional[datetime] = None, include: Sequence[str] = ()) -> Tuple[List[Dict], Optional[Tuple]]:
+    """
+    One page of stored classifications, newest first, keyset-paginated on (timestamp, id).
+    `after` is the (timestamp, id) of the last row of the previous page.
+    Returns (rows, `after` for the next page or None on the last page).
+    """
+    names = HISTORY_COLUMNS + tuple(c for c in HISTORY_OPTIONAL_COLUMNS if c in include)
+    stmt = select(*(getattr(EmailRecord, c) for c in names))
+    if label:
+        stmt = stmt.where(EmailRecord.predicted_label == label)
+    if min_confidence is not None:
+        stmt = stmt.where(EmailRecord.confidence >= min_confidence)
+    if max_confidence is not None:
+        stmt = stmt.where(EmailRecord.confidence <= max_confidence)
+    if since is not None:
+        stmt = stmt.where(EmailRecord.timestamp >= since)
+    if until is not None:
+        stmt = stmt.where(EmailRecord.timestamp < until)
+    if after is not None:
+        stmt = stmt.where(tuple_(EmailRecord.timestamp, EmailRecord.id) < tuple_(*after))
+    stmt = stmt.order_by(EmailRecord.timestamp.desc(), EmailRecord.id.desc()).limit(limit + 1)
+
+    rows = [dict(r) for r in session.execute(stmt).mappings()]
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (rows[-1]["timestamp"], rows[-1]["id"])
@@ -0,0 +1,104 @@
+# backend/app/database/fts.py
+"""
+Full-text search over stored emails (SQLite FTS5).
+
+emails_fts keeps its own copy of subject + body text (rowid = emails.id). Rows are written on the
+write path by save_email_records, from the plain text in hand, so the index never depends on how
+the emails table stores its columns. Deletes on emails are mirrored by a trigger. Rows that
+predate the index are added by `python -m app.commands.fts_backfill`.
+"""
+import html
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, text
+
+FTS_TABLE = "emails_fts"
+# Body text indexed per email; bounds the index size for huge bodies
+FTS_BODY_MAX_CHARS = int(os.getenv("FTS_BODY_MAX_CHARS", 10000))
+# bm25 column weights: subject, body
+FTS_WEIGHTS = (5.0, 1.0)
+SNIPPET_TOKENS = 12
+# Matches ranked per query, newest first. Scoring is per match, so a very common word would cost
+# a full scan of its postings; past this many matches only the most recent ones are ranked.
+FTS_RANK_WINDOW = int(os.getenv("FTS_RANK_WINDOW", 5000))
+
+_TERM_RE = re.compile(r"\w+\*?", re.UNICODE)
+# snippet() highlights with control characters, never HTML: the body is the sender's raw text
+_MARK_OPEN, _MARK_CLOSE = "\x02", "\x03"
+_MARKER_TABLE = {ord(_MARK_OPEN): None, ord(_MARK_CLOSE): None}  # Stripped from indexed text
+
+# prefix = '2 3' indexes 2- and 3-character prefixes, so `re*` / `inv*` don't expand every matching term
+CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "subject, body, tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3')",
+    f"CREATE TRIGGER IF NOT EXISTS emails_fts_delete AFTER DELETE ON emails BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; END",
+)
+
+
+def fts_row(row_id: int, subject: Optional[str], body: Optional[str]) -> Dict:
+    return {"rowid": row_id, "subject": (subject or "").translate(_MARKER_TABLE),
+            "body": (body or "")[:FTS_BODY_MAX_CHARS].translate(_MARKER_TABLE)}
+
+
+def indexed_body(table):
+    """Body text to index for a row of `emails`: cleaned_text once retention has pruned the body."""
+    return func.coalesce(table.body, table.cleaned_text)
+
+
+def highlight_snippet(snippet: Optional[str]) -> str:
+    """HTML-escape a raw snippet, then turn the match markers into <mark> tags (safe to render)."""
+    return html.escape(snippet or "").replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>")
+
+
+def index_emails(session, rows: Sequence[Dict]):
+    """Insert or replace FTS rows (from fts_row) inside the caller's transaction."""
+    if rows:
+        session.execute(
+            text(f"INSERT OR REPLACE INTO {FTS_TABLE} (rowid, subject, body) VALUES (:rowid, :subject, :body)"),
+            list(rows),
+        )
+
+
+def to_match_query(query: str) -> str:
+    """
+    Free text to a safe FTS5 query: every word must match (implicit AND), `word*` is a prefix search.
+    Quoting each term means user input can never be an FTS5 syntax error.
+    """
+    terms = []
+    for term in _TERM_RE.findall(query or ""):
+        if term.endswith("*"):
+            terms.append(f'"{term[:-1]}"*')
+        else:
+            terms.append(f'"{term}"')
+    return " ".join(terms)
+
+
+def search_emails(session, query: str, label: Optional[str] = None, limit: int = 20,
+                  offset: int = 0) -> Tuple[List[Dict], bool]:
+    """
+    Best bm25 matches first (subject weighted over body) among the newest FTS_RANK_WINDOW matches,
+    with a body snippet (HTML-escaped, matches in <mark>). Returns (rows, whether more results exist).
+    """
+    match = to_match_query(query)
+    if not match:
+        return [], False
+    # FTS5 yields matches in rowid order for free, so the window costs O(window), not O(matches).
+    # Snippets and email columns are only built for the returned page.
+    label_join = " JOIN emails le ON le.id = f.rowid AND le.predicted_label = :label" if label else ""
+    sql = (
+        f"WITH recent AS (SELECT f.rowid AS id, bm25({FTS_TABLE}, {FTS_WEIGHTS[0]}, {FTS_WEIGHTS[1]}) AS score "
+        f"FROM {FTS_TABLE} f{label_join} WHERE {FTS_TABLE} MATCH :match ORDER BY f.rowid DESC LIMIT :window), "
+        f"top AS (SELECT id, score FROM recent ORDER BY score LIMIT :limit OFFSET :offset) "
+        f"SELECT e.id, e.message_id, e.subject, e.predicted_label, e.confidence, e.timestamp, "
+        f"snippet({FTS_TABLE}, 1, char(2), char(3), '…', {SNIPPET_TOKENS}) AS snippet, top.score "
+        f"FROM top JOIN {FTS_TABLE} ON {FTS_TABLE}.rowid = top.id JOIN emails e ON e.id = top.id "
+        f"WHERE {FTS_TABLE} MATCH :match ORDER BY top.score"
+    )
+    params = {"match": match, "label": label, "window": FTS_RANK_WINDOW, "limit": limit + 1, "offset": offset}
+    rows = [dict(r) for r in session.execute(text(sql), params).mappings()]
+    for row in rows:
+        row["snippet"] = highlight_snippet(row["snippet"])
+    return rows[:limit], len(rows) > limit
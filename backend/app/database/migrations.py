@@ -0,0 +1,121 @@
+# backend/app/database/migrations.py
+"""
+In-place schema migrations for the SQLite DB, tracked with PRAGMA user_version.
+
+create_all() only creates missing tables; changes to existing tables (new indexes, constraints,
+data fixes) go here as numbered steps. Each step runs once, in its own transaction.
+"""
+from typing import Callable, List, Tuple
+
+
+def _unique_message_id(conn) -> str:
+    """Drop duplicate emails (keep the newest row per message_id), then make message_id unique."""
+    removed = conn.exec_driver_sql(
+        "DELETE FROM emails WHERE message_id IS NOT NULL AND id NOT IN "
+        "(SELECT MAX(id) FROM emails WHERE message_id IS NOT NULL GROUP BY message_id)"
+    ).rowcount
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_emails_message_id")
+    conn.exec_driver_sql("CREATE UNIQUE INDEX ix_emails_message_id ON emails (message_id)")
+    return f"removed {removed} duplicate email row(s)"
+
+
+def _history_indexes(conn) -> str:
+    """Composite indexes behind keyset pagination in /history."""
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_emails_timestamp_id ON emails (timestamp, id)")
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_emails_label_timestamp_id ON emails (predicted_label, timestamp, id)"
+    )
+    return "added (timestamp, id) and (predicted_label, timestamp, id) indexes"
+
+
+def _fts_index(conn) -> str:
+    """Full-text search table + delete trigger; existing rows are indexed by the backfill command."""
+    from app.database.fts import CREATE_SQL
+    for ddl in CREATE_SQL:
+        conn.exec_driver_sql(ddl)
+    pending = conn.exec_driver_sql("SELECT COUNT(*) FROM emails").scalar()
+    if pending:
+        return f"created emails_fts; run `python -m app.commands.fts_backfill` to index {pending} existing email(s)"
+    return "created emails_fts"
+
+
+def _rollups(conn) -> str:
+    """sentiment / priority on emails; email_archive_stats (day, label) becomes archived rollups."""
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(emails)")}
+    for name in ("sentiment", "priority"):
+        if name not in columns:
+            conn.exec_driver_sql(f"ALTER TABLE emails ADD COLUMN {name} VARCHAR(32)")
+    tables = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if "email_archive_stats" in tables:
+        for dimension, bucket in (("total", "'all'"), ("label", "label"), ("day", "day")):
+            conn.exec_driver_sql(
+                "INSERT INTO email_rollups_archived (dimension, bucket, emails, confidence_sum) "
+                f"SELECT '{dimension}', {bucket}, SUM(emails), SUM(confidence_sum) FROM email_archive_stats "
+                f"GROUP BY {bucket} ON CONFLICT (dimension, bucket) DO UPDATE SET "
+                "emails = emails + excluded.emails, confidence_sum = confidence_sum + excluded.confidence_sum"
+            )
+        conn.exec_driver_sql("DROP TABLE email_archive_stats")
+    if conn.exec_driver_sql("SELECT EXISTS (SELECT 1 FROM emails)").scalar():
+        return "added sentiment/priority; run `python -m app.commands.rollup_rebuild` to fill email_rollups"
+    return "added sentiment/priority and rollup tables"
+
+
+def _model_version(conn) -> str:
+    """emails.model_version: which classifier labelled each row (NULL = unknown, i.e. stale)."""
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(emails)")}
+    if "model_version" not in columns:
+        conn.exec_driver_sql("ALTER TABLE emails ADD COLUMN model_version VARCHAR(32)")
+    if conn.exec_driver_sql("SELECT EXISTS (SELECT 1 FROM emails)").scalar():
+        return "added model_version; run `python -m app.commands.reclassify` to relabel existing emails"
+    return "added model_version"
+
+
+def _auto_replied_at(conn) -> str:
+    """emails.auto_replied_at: a retried sync job must not send the same auto-reply twice."""
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(emails)")}
+    if "auto_replied_at" not in columns:
+        conn.exec_driver_sql("ALTER TABLE emails ADD COLUMN auto_replied_at DATETIME")
+    return "added auto_replied_at"
+
+
+def _rfc_message_id(conn) -> str:
+    """emails.rfc_message_id; archive imports (keyed by their Message-ID) move to the archive: namespace."""
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(emails)")}
+    if "rfc_message_id" not in columns:
+        conn.exec_driver_sql("ALTER TABLE emails ADD COLUMN rfc_message_id VARCHAR(256)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_emails_rfc_message_id ON emails (rfc_message_id)")
+    # Gmail ids are hex; archive keys were the raw Message-ID, or <sha1-...@archive> without one
+    moved = conn.exec_driver_sql(
+        "UPDATE emails SET rfc_message_id = CASE WHEN message_id LIKE '<sha1-%@archive>' THEN NULL "
+        "ELSE message_id END, message_id = 'archive:' || message_id WHERE message_id LIKE '<%'"
+    ).rowcount
+    return f"added rfc_message_id; moved {moved} archive-imported email(s) to archive: keys"
+
+
+# (version, step); append only, never renumber
+MIGRATIONS: List[Tuple[int, Callable]] = [
+    (1, _unique_message_id),
+    (2, _history_indexes),
+    (3, _fts_index),
+    (4, _rollups),
+    (5, _model_version),
+    (6, _auto_replied_at),
+    (7, _rfc_message_id),
+]
+
+
+def schema_version(conn) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def run_migrations(engine):
+    """Apply every step newer than the DB's user_version."""
+    with engine.connect() as conn:
+        current = schema_version(conn)
+    for version, step in MIGRATIONS:
+        if version <= current:
+            continue
+        with engine.begin() as conn:
+            note = step(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+        print(f"🗄️ DB migrated to schema v{version}: {note}")
@@ -0,0 +1,152 @@
+# backend/app/database/rollups.py
+"""
+Precomputed dashboard statistics.
+
+email_rollups holds one row per (dimension, bucket) with an email count and a confidence sum:
+totals, label, sentiment, priority, UTC hour of day, weekday, calendar day, and a 10-bin confidence
+histogram per label. save_email_records applies the change of every upsert in the same transaction
+(a re-classified email moves from its old buckets to the new ones), so /stats reads a few dozen
+rows however many emails are stored. Rows deleted by retention stay counted; their share is also
+kept in email_rollups_archived so `python -m app.commands.rollup_rebuild` can recompute everything.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import or_, select, text
+
+from app.database.db import EmailRecord, EmailRollup, BULK_WRITE_CHUNK
+
+CONFIDENCE_BINS = 10
+UNKNOWN = "unknown"
+
+# (dimension, bucket) -> [emails, confidence_sum]
+Deltas = Dict[Tuple[str, str], List[float]]
+
+
+def _confidence_bin(confidence: float) -> str:
+    return f"{min(int(confidence * CONFIDENCE_BINS), CONFIDENCE_BINS - 1) / CONFIDENCE_BINS:.1f}"
+
+
+def rollup_keys(label: Optional[str], sentiment: Optional[str], priority: Optional[str],
+                confidence: Optional[float], timestamp: Optional[datetime]) -> List[Tuple[str, str]]:
+    """Every bucket one email counts towards."""
+    label = label or UNKNOWN
+    keys = [("total", "all"), ("label", label), ("sentiment", sentiment or UNKNOWN),
+            ("priority", priority or UNKNOWN)]
+    if timestamp is not None:
+        keys += [("hour", f"{timestamp.hour:02d}"), ("weekday", str(timestamp.weekday())),
+                 ("day", timestamp.date().isoformat())]
+    if confidence is not None:
+        keys.append(("confidence", f"{label}|{_confidence_bin(confidence)}"))
+    return keys
+
+
+def add_email(deltas: Deltas, sign: int, label, sentiment, priority, confidence, timestamp):
+    for key in rollup_keys(label, sentiment, priority, confidence, timestamp):
+        entry = deltas.setdefault(key, [0, 0.0])
+        entry[0] += sign
+        entry[1] += sign * (confidence or 0.0)
+
+
+def stored_versions(session, message_ids: Iterable[Optional[str]]) -> Dict[str, tuple]:
+    """Current (label, sentiment, priority, confidence, timestamp) of the stored emails among these ids."""
+    ids = [m for m in message_ids if m is not None]
+    if not ids:
+        return {}
+    table = EmailRecord.__table__
+    rows = session.execute(
+        select(table.c.message_id, table.c.predicted_label, table.c.sentiment, table.c.priority,
+               table.c.confidence, table.c.timestamp)
+        .where(table.c.message_id.in_(ids))
+    ).all()
+    return {r[0]: tuple(r[1:]) for r in rows}
+
+
+def write_deltas(previous: Dict[str, tuple], rows: Sequence[Dict]) -> Deltas:
+    """Rollup change for upserting rows (email_row dicts) over the previously stored versions."""
+    deltas: Deltas = {}
+    for row in rows:
+        old = previous.get(row["message_id"])
+        timestamp = row["timestamp"]
+        if old is not None:
+            add_email(deltas, -1, *old)
+            timestamp = old[4]  # The upsert keeps the first-seen timestamp
+        add_email(deltas, 1, row["predicted_label"], row.get("sentiment"), row.get("priority"),
+                  row["confidence"], timestamp)
+    return {k: v for k, v in deltas.items() if v[0] or abs(v[1]) > 1e-9}
+
+
+def relabel_deltas(previous: Dict[int, tuple], updates: Sequence[Dict]) -> Deltas:
+    """Rollup change for relabelling stored rows in place (dicts keyed by row_id, see reclassify)."""
+    deltas: Deltas = {}
+    for row in updates:
+        old = previous[row["row_id"]]
+        add_email(deltas, -1, *old)
+        add_email(deltas, 1, row["new_label"], row["new_sentiment"], row["new_priority"], row["new_confidence"], old[4])
+    return {k: v for k, v in deltas.items() if v[0] or abs(v[1]) > 1e-9}
+
+
+def apply(session, deltas: Deltas, model=EmailRollup):
+    """Add deltas to a rollup table inside the caller's transaction."""
+    if not deltas:
+        return
+    # Plain SQL: SQLAlchemy's SQLite insert() isn't cacheable, so it would be recompiled on every save
+    stmt = text(
+        f"INSERT INTO {model.__tablename__} (dimension, bucket, emails, confidence_sum) "
+        "VALUES (:dimension, :bucket, :emails, :confidence_sum) ON CONFLICT (dimension, bucket) DO UPDATE SET "
+        "emails = emails + excluded.emails, confidence_sum = confidence_sum + excluded.confidence_sum"
+    )
+    values = [{"dimension": d, "bucket": b, "emails": int(n), "confidence_sum": conf}
+              for (d, b), (n, conf) in deltas.items()]
+    for i in range(0, len(values), BULK_WRITE_CHUNK):
+        session.execute(stmt, values[i:i + BULK_WRITE_CHUNK])
+
+
+def read_rollups(session, model=EmailRollup, since_day: Optional[str] = None) -> Deltas:
+    query = select(model.dimension, model.bucket, model.emails, model.confidence_sum)
+    if since_day:
+        query = query.where(or_(model.dimension != "day", model.bucket >= since_day))
+    return {(d, b): [n, conf] for d, b, n, conf in session.execute(query)}
+
+
+def dashboard_stats(session, days: int = 30, now: Optional[datetime] = None) -> Dict:
+    """Everything /stats returns, from at most a few hundred rollup rows."""
+    now = now or datetime.utcnow()
+    since = (now - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    groups = defaultdict(dict)
+    for (dimension, bucket), (n, conf) in read_rollups(session, since_day=since).items():
+        if n > 0:
+            groups[dimension][bucket] = (n, conf)
+
+    def breakdown(dimension):
+        return {
+            bucket: {"count": n, "avg_confidence": round(conf / n, 4)}
+            for bucket, (n, conf) in sorted(groups[dimension].items(), key=lambda kv: -kv[1][0])
+        }
+
+    histograms = defaultdict(lambda: [0] * CONFIDENCE_BINS)
+    for bucket, (n, _) in groups["confidence"].items():
+        label, low = bucket.rsplit("|", 1)
+        index = int(round(float(low) * CONFIDENCE_BINS))
+        histograms[label][index] += n
+        histograms["all"][index] += n
+
+    daily = []
+    for offset in range(days - 1, -1, -1):
+        day = (now - timedelta(days=offset)).strftime("%Y-%m-%d")
+        daily.append({"day": day, "count": groups["day"].get(day, (0, 0.0))[0]})
+
+    total, total_conf = groups["total"].get("all", (0, 0.0))
+    return {
+        "total": total,
+        "avg_confidence": round(total_conf / total, 4) if total else None,
+        "by_label": breakdown("label"),
+        "by_sentiment": breakdown("sentiment"),
+        "by_priority": breakdown("priority"),
+        "by_hour": [groups["hour"].get(f"{h:02d}", (0, 0.0))[0] for h in range(24)],  # UTC
+        "by_weekday": [groups["weekday"].get(str(d), (0, 0.0))[0] for d in range(7)],  # Monday first
+        "daily": daily,
+        "confidence_bins": [i / CONFIDENCE_BINS for i in range(CONFIDENCE_BINS)],
+        "confidence_histogram": dict(histograms),
+    }
@@ -0,0 +1,72 @@
+# backend/app/database/sqlite_config.py
+"""
+SQLite engine profile: WAL journaling, per-connection pragmas, and separate writer / reader pools.
+
+SQLite allows one writer at a time, so the writer engine holds a single connection: writes queue
+in the pool (in-process, FIFO) instead of fighting over the file lock and failing with
+"database is locked". With WAL, readers never block the writer or each other, so reads get their own
+small pool of query_only connections.
+"""
+import os
+from typing import Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # Safe with WAL; FULL fsyncs every commit
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))  # Other processes (CLI jobs)
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 64 * 1024))  # Page cache per connection
+SQLITE_READERS = int(os.getenv("SQLITE_READERS", 4))  # Reader pool size
+SQLITE_WRITER_TIMEOUT = int(os.getenv("SQLITE_WRITER_TIMEOUT", 30))  # Seconds to wait for the writer
+
+
+def _connection_pragmas(readonly: bool) -> Tuple[str, ...]:
+    pragmas = (
+        f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}",
+        f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}",
+        "PRAGMA temp_store = MEMORY",
+    )
+    if readonly:
+        return pragmas + ("PRAGMA query_only = ON",)
+    # journal_mode and auto_vacuum are stored in the file; only the writer needs to set them.
+    # auto_vacuum only takes effect on a new file (or after a full VACUUM, see retention.py)
+    return ("PRAGMA auto_vacuum = INCREMENTAL", "PRAGMA journal_mode = WAL") + pragmas
+
+
+def _apply_pragmas(engine: Engine, readonly: bool):
+    pragmas = _connection_pragmas(readonly)
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def build_engines(url: str, readers: int = SQLITE_READERS) -> Tuple[Engine, Engine]:
+    """(writer, reader) engines for one SQLite file."""
+    writer = create_engine(
+        url,
+        poolclass=QueuePool,
+        pool_size=1,  # The one and only writer connection
+        max_overflow=0,
+        pool_timeout=SQLITE_WRITER_TIMEOUT,
+    )
+    _apply_pragmas(writer, readonly=False)
+
+    reader = create_engine(
+        url,
+        poolclass=QueuePool,
+        pool_size=max(1, readers),
+        max_overflow=0,
+        pool_timeout=SQLITE_WRITER_TIMEOUT,
+    )
+    _apply_pragmas(reader, readonly=True)
+    return writer, reader
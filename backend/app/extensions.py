@@ -0,0 +1,5 @@
+# backend/app/extensions.py
+# Shared Flask extensions, created here so background workers can use them without importing app.main
+from flask_socketio import SocketIO
+
+socketio = SocketIO()
@@ -1,10 +1,14 @@
 from flask import Flask
-from flask_socketio import SocketIO, emit
 from flask_jwt_extended import JWTManager  # New: JWT auth
-from app.routers import email_router
+from app.routers import email_router, metrics_router
 from flask_cors import CORS
 from app.services.gmail_service import enable_watch
+from app.services import classifier as clf_module
+from app.services.work_queue import work_queue
+from app.services.retention import retention_job
+from app.extensions import socketio
 import os
+import threading
 
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 
@@ -19,9 +23,42 @@ CORS(app, origins=cors_origins)
 # JWT
 jwt = JWTManager(app)
 
-socketio = SocketIO(app, cors_allowed_origins=cors_origins)
+socketio.init_app(app, cors_allowed_origins=cors_origins)
 app.register_blueprint(email_router.bp)
-enable_watch()
+app.register_blueprint(metrics_router.bp)
+
+
+def _enable_watch_safely():
+    try:
+        enable_watch()
+    except Exception as e:
+        print("⚠️ Gmail watch not enabled:", e)
+
+
+def check_model_artifacts():
+    """Fail at startup, not on the first email, when CLASSIFIER_CASCADE / ZERO_SHOT_MODE=student lack their files."""
+    missing = clf_module.classifier.missing_artifacts()
+    if missing:
+        raise RuntimeError("❌ Model artifacts not found: " + ", ".join(missing)
+                           + ". Set these variables to the files' location (e.g. a mounted volume), "
+                           "or disable CLASSIFIER_CASCADE / ZERO_SHOT_MODE=student.")
+
+
+def start_background_tasks():
+    """
+    Startup hook: Gmail watch + model warm-up run in the background so the server
+    answers /health, auth, /sent and /send_reply immediately. Also starts the sync workers
+    and the retention scheduler (RETENTION_INTERVAL_HOURS=0 disables it).
+    """
+    threading.Thread(target=_enable_watch_safely, name="gmail-watch", daemon=True).start()
+    work_queue.start()
+    retention_job.start()
+    if os.getenv('WARM_UP_MODELS', 'true').lower() == 'true':
+        clf_module.classifier.warm_up(background=True)
+
+
+check_model_artifacts()
+start_background_tasks()
 
 if __name__ == '__main__':
     socketio.run(app, debug=os.getenv('FLASK_DEBUG', 'False').lower() == 'true', host='0.0.0.0', port=int(os.getenv('PORT', 8000)), workers=1)
\ No newline at end of file
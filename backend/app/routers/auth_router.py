@@ -2,7 +2,7 @@ from flask import Blueprint, request, jsonify
 import os
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from werkzeug.security import generate_password_hash, check_password_hash
-from app.database.db import SessionLocal, User  # User model (add if missing)
+from app.database.db import SessionLocal, ReadSession, User  # User model (add if missing)
 
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
@@ -44,7 +44,7 @@ def login():
     if email != OWNER_EMAIL:  # Fixed: Only your email logs in
         return jsonify({'error': 'Invalid credentials'}), 401
 
-    session = SessionLocal()
+    session = ReadSession()
     try:
         user = session.query(User).filter_by(email=email).first()
         if user and check_password_hash(user.password_hash, password):
@@ -1,19 +1,30 @@
 from flask import Blueprint, jsonify, request
-from flask_socketio import emit  # For SocketIO push to frontend
 import traceback
 import os
-from typing import Dict, Tuple
+from typing import Dict, Set, Tuple
+from datetime import datetime
 from email.mime.text import MIMEText
 from email.message import EmailMessage
 import base64
 from dotenv import load_dotenv
 from typing import List
 from app.services import gmail_service, classifier as clf_module, parser
-from app.database.db import SessionLocal, init_db, save_email_record, EmailRecord  # Single import
-import requests  # For OpenAI
+from app.services.model_registry import registry
+from app.services.prediction_cache import prediction_cache
+from app.services.work_queue import work_queue, message_job, HISTORY, MESSAGES, SYNC_REQUESTED
+from app.services.llm_client import llm_client, LLMError, LLMRateLimited
+from app.services.draft_cache import draft_cache
+from app.services.metrics import emails_processed, stage_seconds
+from app.extensions import socketio  # For SocketIO push to frontend (works from worker threads)
+from app.database.db import (  # Single import
+    SessionLocal, ReadSession, init_db, save_email_records, existing_message_ids, email_row, email_history_page,
+    HISTORY_OPTIONAL_COLUMNS, adopt_archived_emails, claim_auto_reply, release_auto_reply,
+)
+from app.database.fts import search_emails
+from app.database.rollups import dashboard_stats
 import re  # For clean_markdown
-import time  # For retry sleep
-import json, base64  # For notifications decode
+import math  # For Retry-After
+import json, base64, binascii  # For notifications decode
 load_dotenv()
 
 bp = Blueprint('email', __name__, url_prefix='/api/email')
@@ -31,6 +42,35 @@ def extract_addresses(msg: Dict) -> Tuple[str, str]:
     to_addr = next((h['value'] for h in headers if h['name'].lower() == 'to'), 'Unknown')
     return from_addr, to_addr
 
+
+def adopt_archived(full_msgs: Dict[str, Dict]) -> Set[str]:
+    """Gmail ids (of fetched messages) whose archive-imported copy now carries that id; see adopt_archived_emails."""
+    session = SessionLocal()
+    try:
+        return adopt_archived_emails(session, {m: gmail_service.rfc_message_id(msg) for m, msg in full_msgs.items()})
+    finally:
+        session.close()
+
+
+def classify_texts(texts: List[str]) -> List[Tuple[str, float, str, str]]:
+    """
+    Classify a page of cleaned texts in one batched call.
+    Always returns one (label, confidence, sentiment, priority) per text, in order.
+    """
+    if not texts:
+        return []
+    results = clf_module.classifier.predict_with_confidence(texts)
+    preds = []
+    for result in results or []:
+        if len(result) == 4:
+            preds.append(tuple(result))
+        else:  # Fallback when sentiment is disabled
+            pred_label, confidence = result
+            preds.append((pred_label, confidence, "neutral", "medium"))
+    # Pad if the classifier returned fewer rows than asked for
+    preds.extend([("Unknown", 1.0, "neutral", "medium")] * (len(texts) - len(preds)))
+    return preds
+
 @bp.route('/pull', methods=['GET'])
 @jwt_required() 
 def pull_and_process():
@@ -40,57 +80,64 @@ def pull_and_process():
     try:
         limit = request.args.get('limit', 5, type=int)
         
-        service = gmail_service.get_gmail_service()
-        # Query 'in:inbox' to exclude sent/drafts
-        results = service.users().messages().list(userId='me', q='in:inbox', maxResults=limit).execute()
-        messages = results.get('messages', [])
-        if not messages:
-            return jsonify([])
-
-        processed = []
-        session = SessionLocal()
-        try:
-            for m in messages:
-                msg_id = m.get("id")
-                msg = gmail_service.get_message_full(service, msg_id)
+        with stage_seconds.time("gmail_fetch"), gmail_service.gmail_client() as service:
+            # Query 'in:inbox' to exclude sent/drafts
+            results = gmail_service.execute(
+                service.users().messages().list(userId='me', q='in:inbox', maxResults=limit), "messages.list")
+            messages = results.get('messages', [])
+            if not messages:
+                return jsonify([])
+            full_msgs = gmail_service.get_messages_batch(service, [m.get("id") for m in messages])
+        # A message imported from an archive becomes this Gmail id's row (and is upserted below)
+        adopt_archived(full_msgs)
+
+        # Parse the whole page first, then classify it in one batched call
+        fetched = []
+        for m in messages:
+            msg_id = m.get("id")
+            msg = full_msgs.get(msg_id)
+            if msg is None:
+                continue
+            with stage_seconds.time("mime_decode"):
                 subject, body = gmail_service.extract_subject_body_from_msg(msg)
+                from_addr, to_addr = extract_addresses(msg)
+            with stage_seconds.time("extract_text"):
                 combined, cleaned = parser.extract_text(subject, body)
+            fetched.append((msg_id, subject, body, combined, cleaned, from_addr, to_addr))
 
-                # Extract addresses
-                from_addr, to_addr = extract_addresses(msg)
+        with stage_seconds.time("classify"):
+            predictions = classify_texts([item[4] for item in fetched])
+            model_version = clf_module.classifier.model_fingerprint
 
-                # Classify (unpack 4 values if sentiment enabled; fallback to 2)
-                results_classify = clf_module.classifier.predict_with_confidence([cleaned])
-                if results_classify and len(results_classify) > 0:
-                    result = results_classify[0]
-                    if len(result) == 4:
-                        pred_label, confidence, sentiment, priority = result
-                    else:
-                        pred_label, confidence = result
-                        sentiment, priority = "neutral", "medium"
-                else:
-                    pred_label, confidence = "Unknown", 1.0
-                    sentiment, priority = "neutral", "medium"
-
-                # Save to DB (add sentiment/priority if columns exist)
-                rec = save_email_record(session, msg_id, subject, body, combined, cleaned, pred_label, float(confidence or 0.0))
-
-                processed.append({
-                    "message_id": msg_id,
-                    "subject": subject,
-                    "body": body,
-                    "combined_text": combined,
-                    "cleaned_text": cleaned,
-                    "predicted_label": pred_label,
-                    "confidence": float(confidence),
-                    "sentiment": sentiment,  # New: For UI badge
-                    "priority": priority,  # New: For UI badge
-                    "from": from_addr,
-                    "to": to_addr,
-                    "type": "inbox"
-                })
-        finally:
-            session.close()
+        processed = []
+        rows = []
+        for (msg_id, subject, body, combined, cleaned, from_addr, to_addr), pred in zip(fetched, predictions):
+            pred_label, confidence, sentiment, priority = pred
+            rows.append(email_row(msg_id, subject, body, combined, cleaned, pred_label, float(confidence or 0.0),
+                                  sentiment, priority, model_version, gmail_service.rfc_message_id(full_msgs[msg_id])))
+            processed.append({
+                "message_id": msg_id,
+                "subject": subject,
+                "body": body,
+                "combined_text": combined,
+                "cleaned_text": cleaned,
+                "predicted_label": pred_label,
+                "confidence": float(confidence),
+                "sentiment": sentiment,  # New: For UI badge
+                "priority": priority,  # New: For UI badge
+                "from": from_addr,
+                "to": to_addr,
+                "type": "inbox"
+            })
+
+        # Save the whole page in one transaction (upsert on message_id)
+        with stage_seconds.time("db_save"):
+            session = SessionLocal()
+            try:
+                save_email_records(session, rows)
+            finally:
+                session.close()
+        emails_processed.labels("pull").inc(len(rows))
 
         return jsonify(processed)
     
@@ -107,17 +154,21 @@ def pull_sent():
     try:
         limit = request.args.get('limit', 5, type=int)
         
-        service = gmail_service.get_gmail_service()
-        # Query sent: from:me
-        results = service.users().messages().list(userId='me', q='from:me', maxResults=limit).execute()
-        messages = results.get('messages', [])
-        if not messages:
-            return jsonify([])
+        with gmail_service.gmail_client() as service:
+            # Query sent: from:me
+            results = gmail_service.execute(
+                service.users().messages().list(userId='me', q='from:me', maxResults=limit), "messages.list")
+            messages = results.get('messages', [])
+            if not messages:
+                return jsonify([])
+            full_msgs = gmail_service.get_messages_batch(service, [m.get("id") for m in messages])
 
         processed = []
         for m in messages:
             msg_id = m.get("id")
-            msg = gmail_service.get_message_full(service, msg_id)
+            msg = full_msgs.get(msg_id)
+            if msg is None:
+                continue
             subject, body = gmail_service.extract_subject_body_from_msg(msg)
             combined, cleaned = parser.extract_text(subject, body)
 
@@ -152,7 +203,128 @@ def pull_sent():
 
 @bp.route('/health', methods=['GET'])
 def health():
-    return jsonify({"status": "ok"})
+    # Never triggers model loading: just reports what the registry has so far
+    return jsonify({
+        "status": "ok",
+        "models_ready": clf_module.classifier.is_ready(),
+        "models": registry.status(),
+        "cascade": clf_module.classifier.routing_stats(),
+        "prediction_cache": prediction_cache.stats() if prediction_cache else None,
+        "gmail_client": gmail_service.client_manager.stats(),
+        "llm_client": llm_client.stats(),
+        "draft_cache": draft_cache.stats() if draft_cache else None
+    })
+
+@bp.route('/queue', methods=['GET'])
+def queue_stats():
+    """Background sync queue: depth, lag, failures and per-stage timings."""
+    return jsonify(work_queue.stats())
+
+HISTORY_DEFAULT_LIMIT = 50
+HISTORY_MAX_LIMIT = 200
+
+def _encode_history_cursor(after) -> str:
+    timestamp, row_id = after
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode()
+
+def _decode_history_cursor(cursor: str):
+    timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(timestamp), int(row_id)
+
+@bp.route('/history', methods=['GET'])
+@jwt_required()
+def history():
+    """
+    Stored classifications from the DB, newest first (no Gmail calls, no model inference).
+    Query: limit, cursor (from the previous page's next_cursor), label, min_confidence, max_confidence,
+    since / until (ISO 8601), include (comma list of body, combined_text, cleaned_text).
+    """
+    try:
+        limit = min(max(request.args.get('limit', HISTORY_DEFAULT_LIMIT, type=int), 1), HISTORY_MAX_LIMIT)
+        cursor = request.args.get('cursor')
+        after = _decode_history_cursor(cursor) if cursor else None
+        since, until = request.args.get('since'), request.args.get('until')
+        include = [c for c in request.args.get('include', '').split(',') if c]
+        unknown = [c for c in include if c not in HISTORY_OPTIONAL_COLUMNS]
+        if unknown:
+            return jsonify({"error": f"Unknown include column(s): {', '.join(unknown)}"}), 400
+        filters = dict(
+            label=request.args.get('label'),
+            min_confidence=request.args.get('min_confidence', type=float),
+            max_confidence=request.args.get('max_confidence', type=float),
+            since=datetime.fromisoformat(since) if since else None,
+            until=datetime.fromisoformat(until) if until else None,
+        )
+    except ValueError as e:
+        return jsonify({"error": f"Bad query parameter: {e}"}), 400
+
+    session = ReadSession()
+    try:
+        rows, next_after = email_history_page(session, limit, after=after, include=include, **filters)
+    finally:
+        session.close()
+
+    for row in rows:
+        row["timestamp"] = row["timestamp"].isoformat() if row["timestamp"] else None
+    return jsonify({
+        "items": rows,
+        "count": len(rows),
+        "next_cursor": _encode_history_cursor(next_after) if next_after else None,
+    })
+
+STATS_DEFAULT_DAYS = 30
+STATS_MAX_DAYS = 366
+
+@bp.route('/stats', methods=['GET'])
+@jwt_required()
+def stats():
+    """
+    Dashboard aggregates from the rollup tables (constant time, no scan of emails):
+    totals and average confidence per label / sentiment / priority, UTC hour-of-day and weekday
+    counts, daily counts for the last `days` days, and confidence histograms per label.
+    """
+    days = min(max(request.args.get('days', STATS_DEFAULT_DAYS, type=int), 1), STATS_MAX_DAYS)
+    session = ReadSession()
+    try:
+        return jsonify(dashboard_stats(session, days=days))
+    finally:
+        session.close()
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+@bp.route('/search', methods=['GET'])
+@jwt_required()
+def search():
+    """
+    Full-text search over stored emails (subject + body), best matches first.
+    Query: q (words; `word*` for a prefix match), label, limit, page (1-based).
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Missing search query 'q'"}), 400
+    try:
+        limit = min(max(request.args.get('limit', SEARCH_DEFAULT_LIMIT, type=int), 1), SEARCH_MAX_LIMIT)
+        page = max(request.args.get('page', 1, type=int), 1)
+    except ValueError as e:
+        return jsonify({"error": f"Bad query parameter: {e}"}), 400
+
+    session = ReadSession()
+    try:
+        rows, has_more = search_emails(session, query, label=request.args.get('label'), limit=limit,
+                                       offset=(page - 1) * limit)
+    finally:
+        session.close()
+
+    for row in rows:
+        # Raw SQL returns SQLite's stored text; normalise to ISO 8601 like /history
+        row["timestamp"] = datetime.fromisoformat(row["timestamp"]).isoformat() if row["timestamp"] else None
+    return jsonify({
+        "items": rows,
+        "count": len(rows),
+        "page": page,
+        "next_page": page + 1 if has_more else None,
+    })
 
 def clean_markdown(response_text: str) -> str:
     response_text = re.sub(r'\*\*(.*?)\*\*', r'\1', response_text)
@@ -164,10 +336,79 @@ def clean_markdown(response_text: str) -> str:
     response_text = re.sub(r'\n\s*\n', '\n\n', response_text.strip())
     return response_text
 
+NON_REPLIABLE_LABELS = ['spam', 'promotions']
+NON_REPLIABLE_KEYWORDS = ['unsubscribe', 'no reply', 'auto-generated', 'do not reply']
+FALLBACK_DRAFT = "Thanks for your email. I'll get back to you soon."
+
+
+def is_repliable(email_text: str, label: str, confidence: float) -> bool:
+    return not (label in NON_REPLIABLE_LABELS or
+                confidence < 0.7 or
+                any(kw in email_text.lower() for kw in NON_REPLIABLE_KEYWORDS))
+
+
+def draft_reply(email_text: str, label: str) -> Tuple[str, str]:
+    """
+    One reply draft as (draft, source): "cache", "coalesced" (shared an identical in-flight call)
+    or "llm". LLM calls go through the shared client (pooled connections, concurrency/rate limits,
+    OpenAI -> Gemini failover), which raises LLMRateLimited instead of sleeping through a 429.
+    """
+    tone = 'professional' if label in ['business', 'education'] else 'friendly'
+    system = f"You are an email assistant. Generate a concise, {tone} reply under 100 words."
+    prompt = f"Email content:\n{email_text}\n\nReply draft:"
+
+    def generate() -> Tuple[str, str]:
+        content, provider = llm_client.generate(system, prompt, temperature=0.7)
+        return clean_markdown(content).strip(), provider
+
+    if draft_cache is None:
+        draft, source = generate()[0], "llm"
+    else:
+        draft, source = draft_cache.get_or_generate(email_text, label, tone, llm_client.model_id(),
+                                                     len(system) + len(prompt), generate)
+    return draft or FALLBACK_DRAFT, source
+
+
+def send_reply_message(message_id: str, draft_text: str, subject: str) -> str:
+    """Send a reply in the original thread via the Gmail API; returns the sent message id."""
+    with gmail_service.gmail_client() as service:
+        # Get original message for sender/reply-to
+        original_msg = gmail_service.get_message_full(service, message_id)
+    headers = original_msg.get('payload', {}).get('headers', [])
+    from_header = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'me')
+
+    # Create reply subject
+    reply_subject = f"Re: {subject}" if not subject.startswith('Re:') else subject
+
+    # Build full EmailMessage
+    msg = EmailMessage()
+    msg['Subject'] = reply_subject
+    msg['From'] = 'me'
+    msg['To'] = from_header
+    msg['In-Reply-To'] = f"<{message_id}>"
+    msg['References'] = message_id
+
+    # Set plain text body
+    msg.set_content(draft_text, subtype='plain', charset='utf-8')
+
+    # Raw string
+    raw_message = msg.as_string()
+
+    # Base64 encode
+    encoded_message = base64.urlsafe_b64encode(raw_message.encode('utf-8')).decode('utf-8')
+
+    # Send
+    with gmail_service.gmail_client() as service:
+        sent_msg = gmail_service.execute(
+            service.users().messages().send(userId='me', body={'raw': encoded_message}), "messages.send")
+    return sent_msg['id']
+
+
 @bp.route('/reply', methods=['POST'])
 def generate_reply():
     """
-    Generate AI reply draft using OpenAI API (with retry for rate limit).
+    Generate AI reply draft. When every provider is rate limited this answers 429 with
+    Retry-After right away instead of holding the worker.
     """
     try:
         data = request.json
@@ -176,73 +417,20 @@ def generate_reply():
         confidence = data.get('confidence', 0.0)
 
         # Skip bad emails
-        non_repliable_labels = ['spam', 'promotions']
-        non_repliable_keywords = ['unsubscribe', 'no reply', 'auto-generated', 'do not reply']
-
-        if (label in non_repliable_labels or
-            confidence < 0.7 or
-            any(kw in email_text.lower() for kw in non_repliable_keywords)):
+        if not is_repliable(email_text, label, confidence):
             return jsonify({'error': 'Not repliable'}), 400
 
-        # OpenAI API Key
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            return jsonify({'error': 'OpenAI API key missing'}), 500
-
-        OPENAI_URL = "https://api.openai.com/v1/chat/completions"
-
-        tone = 'professional' if label in ['business', 'education'] else 'friendly'
-
-        messages = [
-            {
-                "role": "system",
-                "content": f"You are an email assistant. Generate a concise, {tone} reply under 100 words."
-            },
-            {
-                "role": "user",
-                "content": f"Email content:\n{email_text}\n\nReply draft:"
-            }
-        ]
-
-        payload = {
-            "model": "gpt-4o-mini", 
-            "messages": messages,
-            "temperature": 0.7
-        }
-
-        # Retry for rate limit
-        max_retries = 3
-        for attempt in range(max_retries):
-            response = requests.post(
-                OPENAI_URL,
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {api_key}"
-                },
-                json=payload,
-                timeout=30
-            )
-
-            if response.status_code == 200:
-                break
-            elif 'rate_limit_exceeded' in response.text:
-                wait_time = 20 * (attempt + 1)  # Backoff
-                print(f"Rate limit hit—waiting {wait_time}s (attempt {attempt + 1}/{max_retries})")
-                time.sleep(wait_time)
-            else:
-                print("OPENAI ERROR:", response.text)
-                return jsonify({'error': 'AI service error'}), 500
-
-        if response.status_code != 200:
-            return jsonify({'error': 'AI service error after retries'}), 500
-
-        result = response.json()
-        content = result['choices'][0]['message']['content']
-        content = clean_markdown(content)
-
-        draft = content.strip() or "Thanks for your email. I'll get back to you soon."
-
-        return jsonify({'draft': draft, 'label': label})
+        try:
+            draft, source = draft_reply(email_text, label)
+        except LLMRateLimited as e:
+            retry_after = max(1, math.ceil(e.retry_after))
+            response = jsonify({'error': 'AI service busy, retry later', 'retry_after': retry_after})
+            response.headers['Retry-After'] = str(retry_after)
+            return response, 429
+        except LLMError as e:
+            return jsonify({'error': f'AI service error: {e}'}), 500
+
+        return jsonify({'draft': draft, 'label': label, 'cached': source != 'llm'})
 
     except Exception as e:
         print("ERROR:", traceback.format_exc())
@@ -262,37 +450,8 @@ def send_reply():
         if not message_id or not draft_text:
             return jsonify({'error': 'Missing message_id or draft_text'}), 400
 
-        service = gmail_service.get_gmail_service()
-
-        # Get original message for sender/reply-to
-        original_msg = gmail_service.get_message_full(service, message_id)
-        headers = original_msg.get('payload', {}).get('headers', [])
-        from_header = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'me')
-
-        # Create reply subject
-        reply_subject = f"Re: {subject}" if not subject.startswith('Re:') else subject
-
-        # Build full EmailMessage
-        msg = EmailMessage()
-        msg['Subject'] = reply_subject
-        msg['From'] = 'me'
-        msg['To'] = from_header
-        msg['In-Reply-To'] = f"<{message_id}>"
-        msg['References'] = message_id
-
-        # Set plain text body
-        msg.set_content(draft_text, subtype='plain', charset='utf-8')
-
-        # Raw string
-        raw_message = msg.as_string()
-
-        # Base64 encode
-        encoded_message = base64.urlsafe_b64encode(raw_message.encode('utf-8')).decode('utf-8')
-
-        # Send
-        sent_msg = service.users().messages().send(userId='me', body={'raw': encoded_message}).execute()
-
-        return jsonify({'success': True, 'message_id': sent_msg['id'], 'status': 'Sent'})
+        sent_id = send_reply_message(message_id, draft_text, subject)
+        return jsonify({'success': True, 'message_id': sent_id, 'status': 'Sent'})
 
     except Exception as e:
         error_msg = f"Send error: {str(e)}\n{traceback.format_exc()}"
@@ -306,24 +465,30 @@ def notifications():
     Google calls this when a new email arrives.
     """
     try:
-        envelope = request.json
+        envelope = request.get_json(silent=True)
 
-        if not envelope:
+        if not envelope or not isinstance(envelope, dict):
             return "Bad Request", 400
 
         # Pub/Sub message → base64 → decode → get historyId
-        msg = envelope.get("message", {})
+        msg = envelope.get("message") or {}
         data = msg.get("data")
 
         if data:
-            decoded = base64.b64decode(data).decode("utf-8")
-            payload = json.loads(decoded)
-
-            history_id = payload.get("historyId")
+            # Anything but a 2xx makes Pub/Sub redeliver, forever for a message that can never parse: ack it
+            try:
+                payload = json.loads(base64.b64decode(data).decode("utf-8"))
+            except (ValueError, binascii.Error) as e:
+                print("⚠️ Undecodable Gmail notification, acknowledged and dropped:", e)
+                return "OK", 200
+            history_id = payload.get("historyId") if isinstance(payload, dict) else None
+            if history_id is None:
+                print("⚠️ Gmail notification without historyId, acknowledged and dropped")
+                return "OK", 200
             print("🔔 New Gmail event. HistoryId:", history_id)
 
-            # CALL auto processor
-            process_new_emails(history_id)
+            # Only enqueue: background workers do the Gmail/ML/DB work, Pub/Sub gets its 200 now
+            work_queue.enqueue(HISTORY, SYNC_REQUESTED)
 
         return "OK", 200
 
@@ -331,97 +496,155 @@ def notifications():
         print("Notification Error:", e)
         return "Error", 500
 
-def process_new_emails(history_id):
+def process_new_emails(history_id=None):
+    """
+    Synchronous path: sync from the stored cursor → classify → save → auto-reply (with dedup).
+    The webhook no longer calls this; it enqueues into work_queue instead.
+    """
+    try:
+        msg_ids, new_history_id, source = collect_new_message_ids()
+        process_messages(msg_ids, source)
+        gmail_service.save_history_cursor(new_history_id)
+    except Exception as e:
+        print("Real-time processing error:", e)
+
+
+def collect_new_message_ids() -> Tuple[List[str], str, str]:
     """
-    Called automatically by Gmail push notifications.
-    Fetch new emails → classify → save → auto-reply (with dedup).
+    Messages added since the stored history cursor that are not in the DB yet.
+    Returns (new ids, historyId to store once they are queued/processed, source; see sync_mailbox).
     """
+    with work_queue.stage("gmail_history"), gmail_service.gmail_client() as service:
+        msg_ids, new_history_id, source = gmail_service.sync_mailbox(service)
+    if not msg_ids:
+        return [], new_history_id, source
+
+    # Dedup across runs with one bulk lookup instead of one query per message
+    session = ReadSession()
     try:
-        service = gmail_service.get_gmail_service()
+        existing = existing_message_ids(session, msg_ids)
+    finally:
+        session.close()
+    if existing:
+        print(f"⏭️ Already processed: {len(existing)} message(s)")
+    return [m for m in msg_ids if m not in existing], new_history_id, source
 
-        # Fetch history after last seen historyId
-        history = service.users().history().list(
-            userId='me',
-            startHistoryId=history_id,
-            historyTypes=['messageAdded']
-        ).execute()
 
-        if 'history' not in history:
-            return
+def process_messages(msg_ids: List[str], source: str = "history"):
+    """
+    Fetch, classify (one batch), save, push and auto-reply a list of new message ids.
+    source="resync" (old mail re-listed after the cursor expired) is only classified and saved.
+    """
+    if not msg_ids:
+        return
+    # ---- SAME LOGIC AS /pull: fetch + parse all, classify in one batch ----
+    with work_queue.stage("gmail_fetch"), gmail_service.gmail_client() as service:
+        full_msgs = gmail_service.get_messages_batch(service, msg_ids)
+    # Already imported from an archive: the stored row takes this Gmail id, nothing is sent again
+    adopted = adopt_archived(full_msgs)
+    if adopted:
+        print(f"⏭️ Already imported from an archive: {len(adopted)} message(s)")
+
+    fetched = []
+    for msg_id in msg_ids:
+        full_msg = full_msgs.get(msg_id)
+        if full_msg is None or msg_id in adopted:
+            continue
+        with work_queue.stage("mime_decode"):
+            subject, body = gmail_service.extract_subject_body_from_msg(full_msg)
+            from_addr, to_addr = extract_addresses(full_msg)
+        with work_queue.stage("extract_text"):
+            combined, cleaned = parser.extract_text(subject, body)
+        fetched.append((msg_id, subject, body, combined, cleaned, from_addr, to_addr))
+    if not fetched:
+        return
 
+    with work_queue.stage("classify"):
+        predictions = classify_texts([item[4] for item in fetched])
+        model_version = clf_module.classifier.model_fingerprint
+
+    # Save the whole batch in one transaction before anything is pushed or replied to
+    with work_queue.stage("db_save"):
         session = SessionLocal()
-        processed_ids = []  # Track to dedup within batch
-        for h in history['history']:
-            for msg in h.get('messagesAdded', []):
-                msg_id = msg['message']['id']
-                if msg_id in processed_ids:  # Dedup within batch
-                    print(f"⏭️ Skipped duplicate in batch: {msg_id}")
-                    continue
-                processed_ids.append(msg_id)
-
-                # Dedup across runs: Check if already in DB
-                existing = session.query(EmailRecord).filter_by(message_id=msg_id).first()
-                if existing:
-                    print(f"⏭️ Already processed: {msg_id}")
-                    continue
-
-                # ---- SAME LOGIC AS /pull ----
-                full_msg = gmail_service.get_message_full(service, msg_id)
-                subject, body = gmail_service.extract_subject_body_from_msg(full_msg)
-                combined, cleaned = parser.extract_text(subject, body)
-                from_addr, to_addr = extract_addresses(full_msg)
-
-                # Classify (unpack 4 values if sentiment enabled; fallback to 2)
-                results_classify = clf_module.classifier.predict_with_confidence([cleaned])
-                if results_classify and len(results_classify) > 0:
-                    result = results_classify[0]
-                    if len(result) == 4:
-                        pred_label, confidence, sentiment, priority = result
-                    else:
-                        pred_label, confidence = result
-                        sentiment, priority = "neutral", "medium"
-                else:
-                    pred_label, confidence = "Unknown", 1.0
-                    sentiment, priority = "neutral", "medium"
-
-                # Save to DB
-                save_email_record(session, msg_id, subject, body, combined, cleaned, pred_label, float(confidence))
-
-                print(f"📩 Auto-processed new mail: {subject}")
-
-                # Push to frontend (real-time UI update)
-                emit('new_email', {
-                    'message_id': msg_id,
-                    'subject': subject,
-                    'body': body[:200] + '...' if len(body) > 200 else body,  # Snippet
-                    'predicted_label': pred_label,
-                    'confidence': confidence,
-                    'sentiment': sentiment,  # New: For UI badge
-                    'priority': priority,  # New: For UI badge
-                    'from': from_addr,
-                    'to': to_addr,
-                    'type': 'inbox'
-                }, broadcast=True)
-
-                # Auto-reply for repliable
-                if pred_label in ['business', 'personal', 'education', 'ham', 'social'] and confidence > 0.7:
-                    reply_data = {
-                        'email_text': f"{subject}\n\n{body}",
-                        'label': pred_label,
-                        'confidence': confidence
-                    }
-                    draft_res = requests.post('http://localhost:8000/api/email/reply', json=reply_data).json()
-                    if 'draft' in draft_res:
-                        send_data = {
-                            'message_id': msg_id,
-                            'draft_text': draft_res['draft'],
-                            'subject': subject
-                        }
-                        send_res = requests.post('http://localhost:8000/api/email/send_reply', json=send_data).json()
-                        if send_res.get('success'):
-                            print(f"📤 Auto-replied to {subject}")
+        try:
+            save_email_records(session, [
+                email_row(msg_id, subject, body, combined, cleaned, pred[0], float(pred[1]), pred[2], pred[3],
+                          model_version, gmail_service.rfc_message_id(full_msgs[msg_id]))
+                for (msg_id, subject, body, combined, cleaned, _, _), pred in zip(fetched, predictions)
+            ])
+        finally:
+            session.close()
+    emails_processed.labels("sync" if source == "history" else source).inc(len(fetched))
+    if source == "resync":
+        print(f"🔁 Resynced {len(fetched)} message(s) without pushes or auto-replies")
+        return
+
+    for (msg_id, subject, body, combined, cleaned, from_addr, to_addr), pred in zip(fetched, predictions):
+        pred_label, confidence, sentiment, priority = pred
+        print(f"📩 Auto-processed new mail: {subject}")
+
+        # Push to frontend (real-time UI update)
+        with work_queue.stage("socketio_emit"):
+            socketio.emit('new_email', {
+                'message_id': msg_id,
+                'subject': subject,
+                'body': body[:200] + '...' if len(body) > 200 else body,  # Snippet
+                'predicted_label': pred_label,
+                'confidence': confidence,
+                'sentiment': sentiment,  # New: For UI badge
+                'priority': priority,  # New: For UI badge
+                'from': from_addr,
+                'to': to_addr,
+                'type': 'inbox'
+            })
 
-        session.close()
+        # Auto-reply for repliable (called in-process: no HTTP round trip to our own server)
+        if pred_label in ['business', 'personal', 'education', 'ham', 'social'] and confidence > 0.7:
+            email_text = f"{subject}\n\n{body}"
+            if not is_repliable(email_text, pred_label.lower(), confidence):
+                continue
+            with work_queue.stage("auto_reply"):
+                # Claimed in the DB before sending: a retried job (or another worker) skips it
+                session = SessionLocal()
+                try:
+                    if not claim_auto_reply(session, msg_id):
+                        print(f"↩️ Auto-reply already sent for {subject}")
+                        continue
+                    try:
+                        draft, _ = draft_reply(email_text, pred_label.lower())
+                        send_reply_message(msg_id, draft, subject)
+                        print(f"📤 Auto-replied to {subject}")
+                    except LLMRateLimited as e:
+                        release_auto_reply(session, msg_id)
+                        print(f"⏳ Auto-reply skipped for {subject}: {e}")
+                    except Exception as e:
+                        release_auto_reply(session, msg_id)
+                        print(f"❌ Auto-reply failed for {subject}: {e}")
+                finally:
+                    session.close()
+
+
+def sync_history_jobs(history_ids: List[str]):
+    """
+    Queue handler: any number of pending notifications become one incremental sync from the
+    stored cursor. The cursor advances only after the new ids are durably queued.
+    Payloads are SYNC_REQUESTED markers: the stored cursor, not a notification's historyId,
+    decides where the sync starts.
+    """
+    new_msg_ids, new_history_id, source = collect_new_message_ids()
+    work_queue.enqueue_messages(new_msg_ids, source)
+    gmail_service.save_history_cursor(new_history_id)
 
-    except Exception as e:
-        print("Real-time processing error:", e)
\ No newline at end of file
+
+def process_message_jobs(payloads: List[str]):
+    """Queue handler: one classifier batch assembled from one or more "messages" jobs (per source)."""
+    by_source: Dict[str, List[str]] = {}
+    for payload in payloads:
+        job = message_job(payload)
+        by_source.setdefault(job["source"], []).extend(job["ids"])
+    for source, msg_ids in by_source.items():
+        process_messages(list(dict.fromkeys(msg_ids)), source)
+
+
+work_queue.register_handler(HISTORY, sync_history_jobs)
+work_queue.register_handler(MESSAGES, process_message_jobs)
@@ -0,0 +1,13 @@
+from flask import Blueprint, Response
+
+from app.services.metrics import metrics
+# Modules whose collectors the scrape reports (registered when they are imported)
+from app.services import classifier, draft_cache, gmail_service, llm_client, prediction_cache, work_queue  # noqa: F401
+
+bp = Blueprint('metrics', __name__)
+
+
+@bp.route('/metrics', methods=['GET'])
+def scrape():
+    """Prometheus scrape target (unauthenticated, like /health): per-stage latency histograms and service counters."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,110 @@
+# backend/app/services/cascade.py
+import hashlib
+import json
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Two-stage labelling: a linear head over the shipped TF-IDF vectorizer scores every email,
+# and only emails whose top-1/top-2 probability margin is below CASCADE_MARGIN go on to the
+# zero-shot transformer. Fit a head with `python -m app.commands.cascade_eval --fit --save`.
+# The defaults are the repo's model/ directory, which is outside the backend/ Docker build context:
+# in the container, point both paths at a mounted volume.
+CASCADE_ENABLED = os.getenv("CLASSIFIER_CASCADE", "false").lower() == "true"
+CASCADE_MARGIN = float(os.getenv("CASCADE_MARGIN", 0.3))
+_MODEL_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "model"))
+VECTORIZER_PATH = os.getenv("CASCADE_VECTORIZER_PATH", os.path.join(_MODEL_DIR, "vectorizer.pkl"))
+CASCADE_HEAD_PATH = os.getenv("CASCADE_HEAD_PATH", os.path.join(_MODEL_DIR, "cascade_head.npz"))
+
+
+def missing_artifacts() -> List[str]:
+    """Cascade files that are not there, as "ENV_VAR=path" (empty when the cascade can load)."""
+    return [f"{name}={os.path.abspath(path)}" for name, path in
+            (("CASCADE_VECTORIZER_PATH", VECTORIZER_PATH), ("CASCADE_HEAD_PATH", CASCADE_HEAD_PATH))
+            if not os.path.isfile(path)]
+
+
+def load_vectorizer(path: str = VECTORIZER_PATH):
+    """The fitted TfidfVectorizer in model/ (a joblib pickle)."""
+    import joblib
+    return joblib.load(path)
+
+
+class LinearHead:
+    """
+    Multinomial linear model over sparse TF-IDF features: one weight row per label.
+    Scoring a batch is one sparse matrix product plus a softmax.
+    """
+
+    def __init__(self, labels: Sequence[str], coef: np.ndarray, intercept: np.ndarray, meta: Optional[dict] = None):
+        self.labels = list(labels)
+        self.coef = np.ascontiguousarray(coef, dtype=np.float32)
+        self.intercept = np.asarray(intercept, dtype=np.float32)
+        self.meta = meta or {}
+        self.temperature = float(self.meta.get("temperature", 1.0))  # Calibration, set by train_student
+
+    @property
+    def version(self) -> str:
+        digest = hashlib.sha1(self.coef.tobytes() + self.intercept.tobytes() + "|".join(self.labels).encode())
+        return digest.hexdigest()[:12]
+
+    @classmethod
+    def from_estimator(cls, estimator, meta: Optional[dict] = None) -> "LinearHead":
+        """Copy the weights out of a fitted scikit-learn linear classifier."""
+        coef, intercept = estimator.coef_, estimator.intercept_
+        if coef.shape[0] == 1:  # Binary estimators keep one row; expand to one per class
+            coef, intercept = np.vstack([-coef, coef]), np.concatenate([-intercept, intercept])
+        return cls([str(c) for c in estimator.classes_], coef, intercept, meta)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez_compressed(path, coef=self.coef, intercept=self.intercept, labels=np.array(self.labels),
+                            meta=np.array(json.dumps(self.meta)))
+
+    @classmethod
+    def load(cls, path: str = CASCADE_HEAD_PATH) -> "LinearHead":
+        with np.load(path, allow_pickle=False) as data:
+            return cls([str(label) for label in data["labels"]], data["coef"], data["intercept"],
+                       json.loads(str(data["meta"])))
+
+    def logits(self, features) -> np.ndarray:
+        return np.asarray(features @ self.coef.T) + self.intercept
+
+    def predict_proba(self, features) -> np.ndarray:
+        """(n, len(labels)) probabilities for a sparse (n, n_features) matrix."""
+        logits = self.logits(features) / self.temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+
+class CascadeStage:
+    """Stage one of the cascade: the vectorizer plus a head, loaded once through the model registry."""
+
+    def __init__(self, vectorizer=None, head: Optional[LinearHead] = None):
+        self.vectorizer = vectorizer if vectorizer is not None else load_vectorizer()
+        self.head = head if head is not None else LinearHead.load()
+
+    @property
+    def version(self) -> str:
+        return self.head.version
+
+    def check_labels(self, labels: Sequence[str]):
+        if set(self.head.labels) != set(labels):
+            raise ValueError(f"Cascade head was fitted for labels {self.head.labels}, classifier uses {list(labels)}; "
+                             "refit it with `python -m app.commands.cascade_eval --fit --save`")
+
+    def score(self, texts: List[str], labels: Sequence[str]) -> np.ndarray:
+        """Probabilities with columns in the order of `labels`."""
+        probs = self.head.predict_proba(self.vectorizer.transform(texts))
+        return probs[:, [self.head.labels.index(label) for label in labels]]
+
+
+def top_with_margin(probs: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per row: top-1 index, its probability and the gap to the runner-up."""
+    top = probs.argmax(axis=1)
+    if probs.shape[1] < 2:
+        return top, probs[:, 0], np.ones(len(probs))
+    best2 = np.partition(probs, -2, axis=1)[:, -2:]
+    return top, best2[:, 1], best2[:, 1] - best2[:, 0]
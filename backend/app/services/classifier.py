@@ -1,64 +1,265 @@
+import hashlib
 import os
-from typing import List, Tuple
-from transformers import pipeline
-import torch
+import threading
+from typing import Dict, List, Optional, Tuple
 import numpy as np
+from app.services.model_registry import registry
+from app.services.prediction_cache import cache_key, prediction_cache
+from app.services.inference_backend import build_pipeline, DEFAULT_INFERENCE_BACKEND
+from app.services.cascade import CASCADE_ENABLED, CASCADE_MARGIN, top_with_margin
+from app.services.metrics import metrics, flatten, model_batch_size, stage_seconds
 
 # Your groups (customize as needed)
 CANDIDATE_LABELS = [
     "business", "personal", "promotions", "spam", "education"
 ]
 
+# Emails per padded forward pass (override with CLASSIFIER_BATCH_SIZE)
+DEFAULT_BATCH_SIZE = int(os.getenv("CLASSIFIER_BATCH_SIZE", 16))
+
+# Zero-shot scoring mode:
+#   "pipeline" - BART-MNLI, one premise/hypothesis forward pass per label (reference)
+#   "student"  - linear student distilled from stored labels (app/commands/train_student.py)
+# An encode-once candidate is evaluated in benchmarks/bench_zero_shot_modes.py; it is not selectable
+# until its parity with "pipeline" has been measured on stored mail.
+ZERO_SHOT_MODES = ("pipeline", "student")
+DEFAULT_ZERO_SHOT_MODE = os.getenv("ZERO_SHOT_MODE", "pipeline")
+
+
+def length_buckets(texts: List[str], batch_size: int) -> List[List[int]]:
+    """
+    Group text indices into batches of similar length.
+    Sorting by length first means short emails are never padded up to the longest one in the call.
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i] or ""))
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def priority_from_sentiment(sentiment: str, score: float) -> str:
+    """Priority: high for confident negative, low for confident positive, else medium."""
+    if sentiment == "negative" and score > 0.7:
+        return "high"  # Urgent (red)
+    if sentiment == "positive" and score > 0.7:
+        return "low"  # Routine (green)
+    return "medium"
+
+
+def _device() -> int:
+    import torch
+    return 0 if torch.cuda.is_available() else -1  # GPU if available
+
+
+ZERO_SHOT_MODEL = "facebook/bart-large-mnli"  # Real pre-trained on massive real text
+SENTIMENT_MODEL = "cardiffnlp/twitter-roberta-base-sentiment-latest"  # Accurate for short text
+
+
+def _load_zero_shot():
+    return build_pipeline(
+        "zero-shot-classification",
+        ZERO_SHOT_MODEL,
+        backend=DEFAULT_INFERENCE_BACKEND,  # eager / quantized / onnx (INFERENCE_BACKEND)
+        device=_device(),
+        return_all_scores=True  # For confidence
+    )
+
+
+def _load_sentiment():
+    # Sentiment pipeline (RoBERTa for email-like text)
+    return build_pipeline(
+        "sentiment-analysis",
+        SENTIMENT_MODEL,
+        backend=DEFAULT_INFERENCE_BACKEND,
+        device=_device()
+    )
+
+
+def _load_cascade():
+    from app.services.cascade import CascadeStage
+    stage = CascadeStage()
+    stage.check_labels(CANDIDATE_LABELS)
+    return stage
+
+
+def _load_student():
+    from app.services.student import StudentModel
+    student = StudentModel.load()
+    student.check_labels(CANDIDATE_LABELS)
+    return student
+
+
+# Models are built on first use (or warm_up), never at import time
+registry.register("zero_shot", _load_zero_shot)
+registry.register("sentiment", _load_sentiment)
+registry.register("cascade", _load_cascade)
+registry.register("student", _load_student)
+
+
+def label_set_version(labels: List[str]) -> str:
+    """Short, order-sensitive fingerprint of the candidate label set."""
+    return hashlib.sha1("|".join(labels).encode("utf-8")).hexdigest()[:12]
+
+
 class EmailClassifier:
-    def __init__(self):
-        self.classifier = pipeline(
-            "zero-shot-classification",
-            model="facebook/bart-large-mnli",  # Real pre-trained on massive real text
-            device=0 if torch.cuda.is_available() else -1,  # GPU if available
-            return_all_scores=True  # For confidence
-        )
-        # New: Sentiment pipeline (RoBERTa for email-like text)
-        self.sentiment = pipeline(
-            "sentiment-analysis",
-            model="cardiffnlp/twitter-roberta-base-sentiment-latest",  # Accurate for short text
-            device=0 if torch.cuda.is_available() else -1
-        )
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE, zero_shot_mode: str = DEFAULT_ZERO_SHOT_MODE,
+                 cache=prediction_cache, cascade: bool = CASCADE_ENABLED, cascade_margin: float = CASCADE_MARGIN):
+        if zero_shot_mode not in ZERO_SHOT_MODES:
+            raise ValueError(f"Unknown ZERO_SHOT_MODE '{zero_shot_mode}', expected one of {ZERO_SHOT_MODES}")
+        self.batch_size = max(1, int(batch_size))
+        self.zero_shot_mode = zero_shot_mode
+        self.cache = cache
+        self.cascade = cascade
+        self.cascade_margin = cascade_margin
+        self._routing_lock = threading.Lock()
+        self.routing = {"stage1": 0, "escalated": 0}  # Emails labelled by each cascade stage
+
+    @property
+    def model_version(self) -> str:
+        """Identifies everything that can change a prediction: models, runtime, mode and label set."""
+        if self.zero_shot_mode == "student":
+            zero_shot = f"student:{self.student.version}"
+        else:
+            zero_shot = ZERO_SHOT_MODEL
+        version = f"{zero_shot}|{SENTIMENT_MODEL}|{DEFAULT_INFERENCE_BACKEND}|labels:{label_set_version(CANDIDATE_LABELS)}"
+        if self.cascade:
+            version += f"|cascade:{self.cascade_stage.version}@{self.cascade_margin}"
+        return version
+
+    @property
+    def model_fingerprint(self) -> str:
+        """Short digest of model_version, stored on each email row (emails.model_version)."""
+        return hashlib.sha1(self.model_version.encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def classifier(self):
+        return registry.get("zero_shot")
+
+    @property
+    def sentiment(self):
+        return registry.get("sentiment")
+
+    @property
+    def cascade_stage(self):
+        return registry.get("cascade")
+
+    @property
+    def student(self):
+        return registry.get("student")
+
+    def required_models(self) -> List[str]:
+        zero_shot = "student" if self.zero_shot_mode == "student" else "zero_shot"
+        return [zero_shot, "sentiment"] + (["cascade"] if self.cascade else [])
+
+    def missing_artifacts(self) -> List[str]:
+        """Trained files the configured modes need but cannot find, as "ENV_VAR=path"."""
+        from app.services import cascade, student
+        missing = student.missing_artifacts() if self.zero_shot_mode == "student" else []
+        return missing + (cascade.missing_artifacts() if self.cascade else [])
+
+    def routing_stats(self) -> Dict:
+        with self._routing_lock:
+            routed = self.routing["stage1"] + self.routing["escalated"]
+            return dict(self.routing, enabled=self.cascade, margin=self.cascade_margin,
+                        escalation_rate=round(self.routing["escalated"] / routed, 4) if routed else 0.0)
+
+    def is_ready(self) -> bool:
+        return registry.is_ready(self.required_models())
+
+    def warm_up(self, background: bool = False):
+        """Load this classifier's models now instead of on the first request."""
+        return registry.warm_up(self.required_models(), background=background)
 
     def predict(self, texts: List[str]) -> List[str]:
         if not texts:
             return ["Unknown"] * len(texts)
-        results = self.classifier(texts, CANDIDATE_LABELS)
-        return [r['labels'][0] for r in results]  # Top label
+        return [label for label, _, _, _ in self.predict_with_confidence(texts)]  # Top label
 
     def predict_with_confidence(self, texts: List[str]) -> List[Tuple[str, float, str, str]]:
         """
-        Returns (label, confidence, sentiment, priority).
+        Returns (label, confidence, sentiment, priority) in the same order as texts.
         Sentiment: positive/neutral/negative.
         Priority: low/medium/high (high for negative, low for positive).
+        Cached predictions are returned without touching the models; the remaining unique texts are
+        length-bucketed and each bucket runs through both models as one padded batch. In cascade mode
+        the linear stage labels all of them at once and only the uncertain ones reach the transformer.
         """
         if not texts:
             return [("Unknown", 1.0, "neutral", "medium")] * len(texts)
-        results = self.classifier(texts, CANDIDATE_LABELS)
+        texts = [t or "" for t in texts]
+
+        version = self.model_version
+        keys = [cache_key(t, version) for t in texts]
+        known = self.cache.get_many(keys) if self.cache is not None else {}
+
+        # Identical texts within the call are classified once
+        pending = list(dict.fromkeys(t for t, k in zip(texts, keys) if k not in known))
+        labelled = self._cascade(pending) if self.cascade and pending else None
+        fresh = {}
+        for bucket in length_buckets(pending, self.batch_size):
+            chunk = [pending[i] for i in bucket]
+            zero_shot = [labelled[i] for i in bucket] if labelled is not None else None
+            for text, pred in zip(chunk, self._predict_batch(chunk, zero_shot)):
+                fresh[cache_key(text, version)] = pred
+        if fresh and self.cache is not None:
+            self.cache.put_many(fresh)
+        known.update(fresh)
+
+        return [known[k] for k in keys]
+
+    def _predict_batch(self, texts: List[str],
+                       zero_shot: Optional[List[Tuple[str, float]]] = None) -> List[Tuple[str, float, str, str]]:
+        """Classify one bucket: a single padded zero-shot pass and a single padded sentiment pass."""
+        if zero_shot is None:
+            zero_shot = self._zero_shot(texts)
+        model_batch_size.labels("sentiment").observe(len(texts))
+        with stage_seconds.time("sentiment_inference"):
+            sent_results = self.sentiment(texts, batch_size=len(texts), truncation=True)
+
         preds = []
-        for r in results:
-            label = r['labels'][0]
-            confidence = max(r['scores'])  # Max score across labels
-
-            # New: Sentiment analysis
-            sent_result = self.sentiment(texts[results.index(r)])[0]  # Match text
-            sentiment = sent_result['label'].lower()  # positive/neutral/negative
-            score = sent_result['score']
-
-            # New: Priority scoring (custom logic)
-            priority = "medium"
-            if sentiment == "negative" and score > 0.7:
-                priority = "high"  # Urgent (red)
-            elif sentiment == "positive" and score > 0.7:
-                priority = "low"  # Routine (green)
-
-            preds.append((label, confidence, sentiment, priority))
+        for (label, confidence), s in zip(zero_shot, sent_results):
+            sentiment = s['label'].lower()  # positive/neutral/negative
+            preds.append((label, confidence, sentiment, priority_from_sentiment(sentiment, s['score'])))
         return preds
 
+    def _cascade(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """
+        (label, confidence) per text: the linear stage scores the whole list in one sparse product;
+        texts whose top-1/top-2 margin is under cascade_margin are re-labelled by the transformer.
+        """
+        model_batch_size.labels("cascade").observe(len(texts))
+        with stage_seconds.time("cascade_inference"):
+            probs = self.cascade_stage.score(texts, CANDIDATE_LABELS)
+        top, confidence, margin = top_with_margin(probs)
+        results = [(CANDIDATE_LABELS[j], float(c)) for j, c in zip(top, confidence)]
+        uncertain = np.flatnonzero(margin < self.cascade_margin)
+        if len(uncertain):
+            hard = [texts[i] for i in uncertain]
+            for bucket in length_buckets(hard, self.batch_size):
+                for k, result in zip(bucket, self._zero_shot([hard[k] for k in bucket])):
+                    results[uncertain[k]] = result
+        with self._routing_lock:
+            self.routing["stage1"] += len(texts) - len(uncertain)
+            self.routing["escalated"] += len(uncertain)
+        return results
+
+    def _zero_shot(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Top (label, confidence) per text using the configured zero-shot mode."""
+        model_batch_size.labels(self.zero_shot_mode).observe(len(texts))
+        if self.zero_shot_mode == "student":
+            with stage_seconds.time("zero_shot_inference"):
+                probs = self.student.score(texts, CANDIDATE_LABELS)
+            top = probs.argmax(axis=1)
+            return [(CANDIDATE_LABELS[j], float(probs[i, j])) for i, j in enumerate(top)]
+
+        # Zero-shot expands every text into one pair per label, so size the batch to hold them all
+        with stage_seconds.time("zero_shot_inference"):
+            results = self.classifier(texts, CANDIDATE_LABELS, batch_size=len(texts) * len(CANDIDATE_LABELS))
+        if isinstance(results, dict):  # Pipeline unwraps single-item lists
+            results = [results]
+        # Max score across labels
+        return [(r['labels'][0], float(np.max(r['scores']))) for r in results]
+
 
-# Default instance
-classifier = EmailClassifier()
\ No newline at end of file
+# Default instance (cheap: models load lazily through the registry)
+classifier = EmailClassifier()
+metrics.collect("cascade_routed_total", "Emails labelled by the cascade's linear stage vs escalated", "counter",
+                ("stage",), lambda: flatten(classifier.routing_stats(), ("stage1", "escalated")))
@@ -0,0 +1,235 @@
+# backend/app/services/draft_cache.py
+import hashlib
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.database.db import SessionLocal, ReadSession, ReplyDraftEntry
+from app.services.metrics import metrics, flatten
+
+DRAFT_CACHE_ENABLED = os.getenv("DRAFT_CACHE_ENABLED", "true").lower() == "true"
+DRAFT_CACHE_TTL = int(os.getenv("DRAFT_CACHE_TTL", 7 * 24 * 3600))  # Seconds since the draft was generated
+DRAFT_CACHE_MAX_ROWS = int(os.getenv("DRAFT_CACHE_MAX_ROWS", 5000))  # Least recently used go first
+# USD per million tokens (gpt-4o-mini list prices), only used for the "saved_usd" estimate
+LLM_INPUT_PRICE_PER_M = float(os.getenv("LLM_INPUT_PRICE_PER_M", 0.15))
+LLM_OUTPUT_PRICE_PER_M = float(os.getenv("LLM_OUTPUT_PRICE_PER_M", 0.60))
+CHARS_PER_TOKEN = 4
+PRUNE_EVERY_WRITES = 100
+# A request waiting on an identical in-flight call gives up after this and calls the LLM itself
+FOLLOWER_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 30)) * 2
+
+_ZERO_WIDTH = re.compile("[\u200b-\u200d\ufeff]")
+_QUOTED_LINE = re.compile(r"^[ \t]*>.*$", re.MULTILINE)
+_WROTE_LINE = re.compile(r"^[ \t]*on .{0,200} wrote:[ \t]*$", re.MULTILINE | re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_email_text(text: str) -> str:
+    """Drop what doesn't change the reply: quoted history, zero-width chars, case and spacing."""
+    text = _ZERO_WIDTH.sub("", text or "")
+    text = _WROTE_LINE.sub("", _QUOTED_LINE.sub("", text))
+    return _WHITESPACE.sub(" ", text).strip().casefold()
+
+
+def draft_key(email_text: str, label: str, tone: str, model: str) -> str:
+    normalized = normalize_email_text(email_text)
+    return hashlib.sha256(f"{model}\0{label}\0{tone}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+def estimated_cost(prompt_chars: int, draft_chars: int) -> float:
+    return (prompt_chars * LLM_INPUT_PRICE_PER_M + draft_chars * LLM_OUTPUT_PRICE_PER_M) / CHARS_PER_TOKEN / 1e6
+
+
+class _Flight:
+    """One LLM call that identical concurrent requests wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.draft: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+
+class DraftCache:
+    """
+    Reply drafts keyed by (model, label, tone, normalized email text), kept in the app's SQLite DB
+    with a TTL and LRU eviction. Concurrent identical requests collapse into one LLM call
+    (single-flight); the others wait for its draft or its error.
+    """
+
+    def __init__(self, ttl_seconds: int = DRAFT_CACHE_TTL, max_rows: int = DRAFT_CACHE_MAX_ROWS,
+                 session_factory=SessionLocal, read_session_factory=ReadSession):
+        self.ttl_seconds = ttl_seconds
+        self.max_rows = max_rows
+        self.session_factory = session_factory
+        self.read_session_factory = read_session_factory
+        self._inflight: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        self.counters = {
+            "hits": 0,
+            "coalesced": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "db_errors": 0,
+            "saved_seconds": 0.0,
+            "saved_usd": 0.0,
+        }
+
+    def get_or_generate(self, email_text: str, label: str, tone: str, model: str, prompt_chars: int,
+                        generate: Callable[[], Tuple[str, str]]) -> Tuple[str, str]:
+        """
+        (draft, source) where source is "cache", "coalesced" or "llm". `generate` makes the LLM call
+        and returns (draft, provider); its exceptions reach every request waiting on it.
+        """
+        key = draft_key(email_text, label, tone, model)
+        cached = self._get(key, prompt_chars)
+        if cached is not None:
+            return cached, "cache"
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+        if not leader:
+            if flight.done.wait(FOLLOWER_TIMEOUT):
+                if flight.error is not None:
+                    raise flight.error
+                self._count_saved("coalesced", prompt_chars, flight.draft, 0.0)
+                return flight.draft, "coalesced"
+            draft, _ = generate()
+            return draft, "llm"
+
+        try:
+            cached = self._get(key, prompt_chars)  # Another leader may have stored it since our lookup
+            if cached is not None:
+                flight.draft = cached
+                return cached, "cache"
+            with self._lock:
+                self.counters["misses"] += 1
+            start = time.perf_counter()
+            draft, provider = generate()
+            seconds = time.perf_counter() - start
+            if draft:
+                self._put(key, draft, provider, prompt_chars, seconds)
+            flight.draft = draft
+            return draft, "llm"
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            served = self.counters["hits"] + self.counters["coalesced"]
+            lookups = served + self.counters["misses"]
+            return dict(
+                self.counters,
+                saved_seconds=round(self.counters["saved_seconds"], 1),
+                saved_usd=round(self.counters["saved_usd"], 6),
+                in_flight=len(self._inflight),
+                max_rows=self.max_rows,
+                hit_rate=round(served / lookups, 4) if lookups else 0.0,
+            )
+
+    def _count_saved(self, counter: str, prompt_chars: int, draft: str, seconds: float):
+        with self._lock:
+            self.counters[counter] += 1
+            self.counters["saved_seconds"] += seconds
+            self.counters["saved_usd"] += estimated_cost(prompt_chars, len(draft or ""))
+
+    def _get(self, key: str, prompt_chars: int) -> Optional[str]:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+        session = self.read_session_factory()
+        try:
+            row = session.execute(
+                select(ReplyDraftEntry.draft, ReplyDraftEntry.generation_seconds)
+                .where(ReplyDraftEntry.key == key, ReplyDraftEntry.created_at >= cutoff)
+            ).first()
+        except Exception as e:  # Cache must never break reply generation
+            self.counters["db_errors"] += 1
+            print("Draft cache read error:", e)
+            return None
+        finally:
+            session.close()
+        if row is None:
+            return None
+        self._touch(key)
+        self._count_saved("hits", prompt_chars, row.draft, row.generation_seconds)
+        return row.draft
+
+    def _touch(self, key: str):
+        session = self.session_factory()
+        try:
+            session.execute(
+                update(ReplyDraftEntry).where(ReplyDraftEntry.key == key)
+                .values(last_used_at=datetime.utcnow(), hits=ReplyDraftEntry.hits + 1)
+            )
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.counters["db_errors"] += 1
+            print("Draft cache write error:", e)
+        finally:
+            session.close()
+
+    def _put(self, key: str, draft: str, provider: str, prompt_chars: int, seconds: float):
+        now = datetime.utcnow()
+        values = {"key": key, "draft": draft, "provider": provider, "prompt_chars": prompt_chars,
+                  "generation_seconds": seconds, "hits": 0, "created_at": now, "last_used_at": now}
+        stmt = sqlite_insert(ReplyDraftEntry).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ReplyDraftEntry.key],
+            set_={c: stmt.excluded[c] for c in values if c != "key"},
+        )
+        session = self.session_factory()
+        try:
+            session.execute(stmt)
+            with self._lock:
+                self._writes_since_prune += 1
+                prune = self._writes_since_prune >= PRUNE_EVERY_WRITES
+                if prune:
+                    self._writes_since_prune = 0
+            if prune:
+                self._prune(session)
+            session.commit()
+            with self._lock:
+                self.counters["stores"] += 1
+        except Exception as e:
+            session.rollback()
+            self.counters["db_errors"] += 1
+            print("Draft cache write error:", e)
+        finally:
+            session.close()
+
+    def _prune(self, session):
+        """Expired drafts first, then the least recently used beyond max_rows."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+        evicted = session.execute(delete(ReplyDraftEntry).where(ReplyDraftEntry.created_at < cutoff)).rowcount or 0
+        excess = session.execute(select(func.count()).select_from(ReplyDraftEntry)).scalar() - self.max_rows
+        if excess > 0:
+            lru = select(ReplyDraftEntry.key).order_by(ReplyDraftEntry.last_used_at).limit(excess)
+            evicted += session.execute(delete(ReplyDraftEntry).where(ReplyDraftEntry.key.in_(lru))).rowcount or 0
+        with self._lock:
+            self.counters["evictions"] += evicted
+
+
+# Default instance used by /reply and auto-replies (None when disabled)
+draft_cache = DraftCache() if DRAFT_CACHE_ENABLED else None
+if draft_cache is not None:
+    metrics.collect("draft_cache_total", "Reply draft lookups (hits / coalesced / misses), stores and evictions",
+                    "counter", ("event",),
+                    lambda: flatten(draft_cache.stats(), ("hits", "coalesced", "misses", "stores", "evictions",
+                                                          "db_errors")))
+    metrics.collect("draft_cache_hit_ratio", "Share of reply drafts served without an LLM call", "gauge", (),
+                    lambda: {(): draft_cache.stats()["hit_rate"]})
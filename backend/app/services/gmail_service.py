@@ -2,13 +2,27 @@ import os
 import json
 import pickle
 import base64
-import re
-from typing import List, Dict, Tuple
+import codecs
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from googleapiclient.discovery import build
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
+
+from app.database.db import ARCHIVE_KEY_PREFIX, SessionLocal, ReadSession, get_sync_cursor, set_sync_cursor
+from app.services.metrics import metrics, flatten, gmail_calls, gmail_errors
+from app.utils.html_text import iter_html_text
 
 # Env mode (dev/prod)
 ENV = os.getenv("ENV", "dev")
@@ -19,7 +33,39 @@ SCOPES = [
     'https://www.googleapis.com/auth/gmail.send'
 ]
 
-def get_gmail_service():
+# Mailbox the sync cursor belongs to ("me" = the authorized user)
+GMAIL_USER_ID = os.getenv("GMAIL_USER_ID", "me")
+# Upper bound on messages re-listed when the history cursor has expired
+FULL_RESYNC_LIMIT = int(os.getenv("GMAIL_FULL_RESYNC_LIMIT", 100))
+
+# Gmail batch endpoint; sub-requests per batch (Gmail allows 100, more than 50 tends to hit rate limits)
+GMAIL_BATCH_URI = os.getenv("GMAIL_BATCH_URI", "https://gmail.googleapis.com/batch/gmail/v1")
+GMAIL_BATCH_SIZE = int(os.getenv("GMAIL_BATCH_SIZE", 50))
+GMAIL_RETRIES = 3
+# Partial response: only what extract_subject_body_from_msg / extract_addresses read
+# (top-level headers and inline body data, four MIME levels deep; no labels, sizes, attachment ids, ...)
+_PART_FIELDS = "mimeType,filename,body/data"
+MESSAGE_FIELDS = (
+    "id,snippet,"
+    "payload(mimeType,headers(name,value),body/data,"
+    f"parts({_PART_FIELDS},parts({_PART_FIELDS},parts({_PART_FIELDS},parts({_PART_FIELDS})))))"
+)
+
+# Visible characters kept from an HTML-only body (the parser only ever uses the first few hundred)
+HTML_BODY_MAX_CHARS = int(os.getenv("HTML_BODY_MAX_CHARS", 20000))
+BASE64_CHUNK_CHARS = 16384  # Multiple of 4, so every slice decodes on its own
+
+# Pooled Gmail clients: max concurrent clients, seconds to wait for a free one,
+# and how long before expiry the access token is refreshed proactively
+GMAIL_POOL_SIZE = int(os.getenv("GMAIL_POOL_SIZE", 4))
+GMAIL_POOL_TIMEOUT = float(os.getenv("GMAIL_POOL_TIMEOUT", 30))
+TOKEN_REFRESH_MARGIN = timedelta(seconds=int(os.getenv("GMAIL_TOKEN_REFRESH_MARGIN", 300)))
+GMAIL_HTTP_TIMEOUT = 60
+
+TOKEN_PATH = os.path.join(os.path.dirname(__file__), "token.pickle")
+
+
+def _load_credentials():
     creds = None
 
     if ENV == "prod":
@@ -36,12 +82,8 @@ def get_gmail_service():
             scopes=SCOPES
         )
 
-        if creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-
     else:
         # 🧪 Local development: OAuth flow + files
-        TOKEN_PATH = os.path.join(os.path.dirname(__file__), "token.pickle")
         CREDENTIALS_PATH = os.getenv(
             'GOOGLE_CREDENTIALS_JSON',
             os.path.join(os.path.dirname(__file__), "..", "routers", "credentials.json")
@@ -58,30 +100,310 @@ def get_gmail_service():
             with open(TOKEN_PATH, "rb") as f:
                 creds = pickle.load(f)
 
-        if not creds or not getattr(creds, "valid", False):
-            if creds and getattr(creds, "expired", False) and getattr(creds, "refresh_token", None):
-                creds.refresh(Request())
+        if not creds or not (getattr(creds, "valid", False) or getattr(creds, "refresh_token", None)):
+            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_PATH, SCOPES)
+            creds = flow.run_local_server(port=0)
+            _save_token(creds)
+
+    return creds
+
+
+def _save_token(creds):
+    if ENV == "prod":
+        return
+    # Save token locally
+    os.makedirs(os.path.dirname(TOKEN_PATH), exist_ok=True)
+    with open(TOKEN_PATH, "wb") as f:
+        pickle.dump(creds, f)
+
+
+class GmailPoolTimeout(RuntimeError):
+    """Every pooled Gmail client stayed checked out for GMAIL_POOL_TIMEOUT seconds."""
+
+
+class GmailClientManager:
+    """
+    Process-wide Gmail client manager.
+    Credentials are loaded once and refreshed only when close to expiry; the discovery document is
+    parsed once; authorized service objects (each with its own keep-alive httplib2 transport,
+    which is not thread-safe) are handed out from a bounded pool.
+    """
+
+    def __init__(self, pool_size: int = GMAIL_POOL_SIZE, refresh_margin: timedelta = TOKEN_REFRESH_MARGIN):
+        self.pool_size = max(1, pool_size)
+        self.refresh_margin = refresh_margin
+        self._creds = None
+        self._creds_lock = threading.Lock()
+        self._discovery_doc = None
+        self._idle = queue.LifoQueue()  # LIFO: reuse the warmest connection first
+        self._created = 0
+        self._pool_lock = threading.Lock()
+        self._local = threading.local()
+        self.metrics = {
+            "token_refreshes": 0,
+            "token_refresh_errors": 0,
+            "credential_loads": 0,
+            "builds": 0,
+            "build_seconds_total": 0.0,
+            "checkouts": 0,
+            "checkout_wait_seconds_total": 0.0,
+        }
+
+    def credentials(self):
+        """Shared credentials, refreshed under a lock only when expired or about to expire."""
+        with self._creds_lock:
+            if self._creds is None:
+                self._creds = _load_credentials()
+                self.metrics["credential_loads"] += 1
+            creds = self._creds
+            # No expiry means the token does not expire: only refresh once it is rejected as invalid
+            expiry = getattr(creds, "expiry", None)
+            expiring = expiry is not None and expiry - datetime.utcnow() < self.refresh_margin
+            if (creds.expired or not creds.valid or expiring) and creds.refresh_token:
+                try:
+                    creds.refresh(Request())
+                    self.metrics["token_refreshes"] += 1
+                    _save_token(creds)
+                except Exception:
+                    self.metrics["token_refresh_errors"] += 1
+                    raise
+            return creds
+
+    def _build(self):
+        start = time.perf_counter()
+        if self._discovery_doc is None:
+            self._discovery_doc = discovery_cache.get_static_doc("gmail", "v1")
+        http = AuthorizedHttp(self.credentials(), http=httplib2.Http(timeout=GMAIL_HTTP_TIMEOUT))
+        service = build_from_document(self._discovery_doc, http=http)
+        with self._pool_lock:
+            self.metrics["builds"] += 1
+            self.metrics["build_seconds_total"] += time.perf_counter() - start
+        return service
+
+    @contextmanager
+    def client(self):
+        """Check out a pooled Gmail service for the duration of the block."""
+        start = time.perf_counter()
+        service = None
+        try:
+            service = self._idle.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                can_build = self._created < self.pool_size
+                if can_build:
+                    self._created += 1
+            if can_build:
+                try:
+                    service = self._build()
+                except Exception:
+                    with self._pool_lock:
+                        self._created -= 1
+                    raise
             else:
-                flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_PATH, SCOPES)
-                creds = flow.run_local_server(port=0)
+                try:
+                    service = self._idle.get(timeout=GMAIL_POOL_TIMEOUT)
+                except queue.Empty:
+                    raise GmailPoolTimeout(
+                        f"No Gmail client free after {GMAIL_POOL_TIMEOUT:g}s "
+                        f"(all {self.pool_size} checked out; raise GMAIL_POOL_SIZE?)") from None
+        # From here on the service always goes back to the pool, even if the token refresh fails
+        try:
+            self.credentials()  # Cheap unless the token is near expiry
+            with self._pool_lock:
+                self.metrics["checkouts"] += 1
+                self.metrics["checkout_wait_seconds_total"] += time.perf_counter() - start
+            yield service
+        finally:
+            self._idle.put(service)
+
+    def thread_service(self):
+        """One long-lived service per thread, for callers that cannot use the client() block."""
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = self._build()
+            self._local.service = service
+        else:
+            self.credentials()
+        return service
+
+    def stats(self) -> Dict:
+        with self._pool_lock:
+            return dict(self.metrics, pool_size=self.pool_size, created=self._created, idle=self._idle.qsize())
+
+
+# Default instance shared by the whole process
+client_manager = GmailClientManager()
+
+
+def _pool_seconds() -> Dict[tuple, float]:
+    stats = client_manager.stats()
+    return {("build",): stats["build_seconds_total"], ("checkout_wait",): stats["checkout_wait_seconds_total"]}
+
+
+metrics.collect("gmail_client_pool_events_total", "Gmail client pool checkouts, client builds and token refreshes",
+                "counter", ("event",),
+                lambda: flatten(client_manager.stats(), ("checkouts", "builds", "credential_loads", "token_refreshes",
+                                                         "token_refresh_errors")))
+metrics.collect("gmail_client_pool_seconds_total", "Time spent building Gmail clients and waiting for a free one",
+                "counter", ("phase",), _pool_seconds)
+metrics.collect("gmail_client_pool_clients", "Gmail clients by state (pool_size is the limit)", "gauge", ("state",),
+                lambda: flatten(client_manager.stats(), ("pool_size", "created", "idle")))
+
+
+def execute(request, call: str, **kwargs):
+    """request.execute(**kwargs), counted in /metrics per Gmail API call (and per failure)."""
+    gmail_calls.labels(call).inc()
+    try:
+        return request.execute(**kwargs)
+    except Exception:
+        gmail_errors.labels(call).inc()
+        raise
 
-            # Save token locally
-            os.makedirs(os.path.dirname(TOKEN_PATH), exist_ok=True)
-            with open(TOKEN_PATH, "wb") as f:
-                pickle.dump(creds, f)
 
-    service = build('gmail', 'v1', credentials=creds)
-    return service
+def gmail_client():
+    """Preferred way to talk to Gmail: `with gmail_client() as service: ...`"""
+    return client_manager.client()
+
+
+def get_gmail_service():
+    """Backwards-compatible accessor: a cached per-thread service (no rebuild per call)."""
+    return client_manager.thread_service()
 
 
 def list_recent_emails(limit: int = 10) -> List[Dict]:
-    service = get_gmail_service()
-    resp = service.users().messages().list(userId='me', maxResults=limit).execute()
+    with gmail_client() as service:
+        resp = execute(service.users().messages().list(userId='me', maxResults=limit), "messages.list")
     return resp.get('messages', [])
 
 
+def list_history_message_ids(service, start_history_id: str, user_id: str = GMAIL_USER_ID,
+                             label_id: str = "INBOX") -> Tuple[List[str], str]:
+    """
+    All messages added to label_id since start_history_id, following every history page.
+    Returns (message ids in arrival order, latest historyId seen).
+    """
+    msg_ids = []
+    latest = str(start_history_id)
+    page_token = None
+    while True:
+        kwargs = dict(userId=user_id, startHistoryId=start_history_id, historyTypes=['messageAdded'], labelId=label_id)
+        if page_token:
+            kwargs["pageToken"] = page_token
+        resp = execute(service.users().history().list(**kwargs), "history.list")
+        for h in resp.get('history', []):
+            for added in h.get('messagesAdded', []):
+                msg_ids.append(added['message']['id'])
+        latest = str(resp.get('historyId', latest))
+        page_token = resp.get('nextPageToken')
+        if not page_token:
+            break
+    return list(dict.fromkeys(msg_ids)), latest
+
+
+def current_history_id(service, user_id: str = GMAIL_USER_ID) -> str:
+    """The mailbox's latest historyId (a starting cursor that covers nothing already received)."""
+    return str(execute(service.users().getProfile(userId=user_id), "getProfile")['historyId'])
+
+
+def full_resync_message_ids(service, limit: int = FULL_RESYNC_LIMIT, user_id: str = GMAIL_USER_ID) -> Tuple[List[str], str]:
+    """
+    Bounded resync after the cursor expired: the newest `limit` inbox messages.
+    The profile historyId is read first, so anything arriving during the listing is picked up next sync.
+    """
+    history_id = current_history_id(service, user_id)
+    msg_ids = []
+    page_token = None
+    while len(msg_ids) < limit:
+        kwargs = dict(userId=user_id, q='in:inbox', maxResults=min(500, limit - len(msg_ids)))
+        if page_token:
+            kwargs["pageToken"] = page_token
+        resp = execute(service.users().messages().list(**kwargs), "messages.list")
+        msg_ids.extend(m['id'] for m in resp.get('messages', []))
+        page_token = resp.get('nextPageToken')
+        if not page_token:
+            break
+    return msg_ids, history_id
+
+
+def sync_mailbox(service, user_id: str = GMAIL_USER_ID) -> Tuple[List[str], str, str]:
+    """
+    Incremental sync from the stored cursor.
+    Returns (candidate message ids, historyId to store once they are safely queued/processed, source).
+    source is "history" for mail that arrived after the cursor, or "resync" when the cursor expired
+    (404) and the newest inbox messages were re-listed instead: those are old mail to store and
+    classify, not new arrivals to push or auto-reply to. Without a cursor (first run) the cursor
+    starts at the current historyId and nothing is returned; /pull covers earlier mail.
+    """
+    session = ReadSession()
+    try:
+        cursor = get_sync_cursor(session, user_id)
+    finally:
+        session.close()
+
+    if not cursor:
+        history_id = current_history_id(service, user_id)
+        print(f"ℹ️ No Gmail sync cursor yet—starting from historyId {history_id}")
+        return [], history_id, "history"
+    try:
+        return (*list_history_message_ids(service, cursor, user_id=user_id), "history")
+    except HttpError as e:
+        if getattr(e.resp, "status", None) != 404:
+            raise
+        print(f"⚠️ Gmail history cursor {cursor} expired—bounded full resync (no pushes or auto-replies)")
+        return (*full_resync_message_ids(service, user_id=user_id), "resync")
+
+
+def save_history_cursor(history_id: str, user_id: str = GMAIL_USER_ID):
+    if not history_id:
+        return
+    session = SessionLocal()
+    try:
+        set_sync_cursor(session, user_id, history_id)
+    finally:
+        session.close()
+
+
 def get_message_full(service, msg_id: str) -> Dict:
-    return service.users().messages().get(userId='me', id=msg_id, format='full').execute()
+    return execute(service.users().messages().get(userId='me', id=msg_id, format='full'), "messages.get")
+
+
+def get_messages_batch(service, msg_ids: List[str], fields: str = MESSAGE_FIELDS,
+                       batch_size: int = GMAIL_BATCH_SIZE, batch_uri: str = GMAIL_BATCH_URI) -> Dict[str, Dict]:
+    """
+    Fetch many messages through Gmail batch HTTP requests (one round trip per batch_size ids),
+    asking only for `fields`. Sub-requests that fail are retried one by one with backoff.
+    Returns {message_id: message}; ids that still fail are left out.
+    """
+    msg_ids = list(dict.fromkeys(msg_ids))
+    results: Dict[str, Dict] = {}
+    failed: List[str] = []
+
+    def _callback(request_id, response, exception):
+        if exception is not None:
+            gmail_errors.labels("messages.get").inc()
+            failed.append(request_id)
+        else:
+            results[request_id] = response
+
+    for i in range(0, len(msg_ids), batch_size):
+        chunk = msg_ids[i:i + batch_size]
+        batch = BatchHttpRequest(callback=_callback, batch_uri=batch_uri)
+        for msg_id in chunk:
+            batch.add(
+                service.users().messages().get(userId='me', id=msg_id, format='full', fields=fields),
+                request_id=msg_id
+            )
+        gmail_calls.labels("messages.get").inc(len(chunk))
+        execute(batch, "batch")
+
+    for msg_id in failed:
+        try:
+            results[msg_id] = execute(service.users().messages().get(
+                userId='me', id=msg_id, format='full', fields=fields
+            ), "messages.get", num_retries=GMAIL_RETRIES)  # Exponential backoff on 429/5xx
+        except HttpError as e:
+            print(f"⚠️ Could not fetch message {msg_id}: {e}")
+    return results
 
 
 def _get_header(headers: list, name: str) -> str:
@@ -91,6 +413,12 @@ def _get_header(headers: list, name: str) -> str:
     return ""
 
 
+def rfc_message_id(msg: Dict) -> Optional[str]:
+    """The Message-ID header, which matches the same message imported from an mbox/.eml archive."""
+    value = _get_header(msg.get("payload", {}).get("headers", []), "Message-ID").strip()
+    return value[:256 - len(ARCHIVE_KEY_PREFIX)] or None
+
+
 def decode_base64_data(data: str) -> str:
     if not data:
         return ""
@@ -100,23 +428,52 @@ def decode_base64_data(data: str) -> str:
         return ""
 
 
+def iter_base64_text(data: str, chunk_chars: int = BASE64_CHUNK_CHARS) -> Iterator[str]:
+    """Decode Gmail's url-safe base64 body data slice by slice, so a consumer can stop early."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    for i in range(0, len(data or ""), chunk_chars):
+        try:
+            raw = base64.urlsafe_b64decode(data[i:i + chunk_chars].encode("UTF-8"))
+        except Exception:
+            return
+        yield decoder.decode(raw)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def _iter_parts(part: Dict) -> Iterator[Dict]:
+    """Depth-first walk over a MIME tree, through multipart/* at any depth; attachments are skipped."""
+    if part.get("filename"):
+        return
+    yield part
+    for child in part.get("parts", []) or []:
+        yield from _iter_parts(child)
+
+
 def extract_subject_body_from_msg(msg: Dict) -> Tuple[str, str]:
     payload = msg.get("payload", {})
     headers = payload.get("headers", [])
     subject = _get_header(headers, "Subject")
 
+    # First text/plain part anywhere in the tree wins; otherwise the first text/html one
+    plain = html = None
+    for part in _iter_parts(payload):
+        data = part.get("body", {}).get("data")
+        if not data:
+            continue
+        mime_type = part.get("mimeType", "")
+        if mime_type == "text/html":
+            html = html or data
+        elif mime_type == "text/plain" or part is payload:
+            plain = data
+            break
+
     body = ""
-    if payload.get("body", {}).get("data"):
-        body = decode_base64_data(payload["body"]["data"])
-    else:
-        for part in payload.get("parts", []) or []:
-            mime_type = part.get("mimeType", "")
-            if mime_type == "text/plain":
-                body = decode_base64_data(part.get("body", {}).get("data", ""))
-                break
-            if mime_type == "text/html" and not body:
-                html = decode_base64_data(part.get("body", {}).get("data", ""))
-                body = re.sub("<[^<]+?>", "", html)
+    if plain:
+        body = decode_base64_data(plain)
+    elif html:
+        body = "".join(iter_html_text(iter_base64_text(html), HTML_BODY_MAX_CHARS))
 
     if not body:
         body = msg.get("snippet", "")
@@ -125,7 +482,6 @@ def extract_subject_body_from_msg(msg: Dict) -> Tuple[str, str]:
 
 
 def enable_watch():
-    service = get_gmail_service()
     topic = os.getenv("PUBSUB_TOPIC")
     print("DEBUG: Loaded PUBSUB_TOPIC from .env:", topic)
 
@@ -139,6 +495,7 @@ def enable_watch():
         "labelFilterAction": "include"
     }
 
-    response = service.users().watch(userId="me", body=request_body).execute()
+    with gmail_client() as service:
+        response = execute(service.users().watch(userId="me", body=request_body), "watch")
     print("🔔 Gmail push notifications active for:", topic)
     print("Watch Response:", response)
@@ -0,0 +1,61 @@
+# backend/app/services/inference_backend.py
+import os
+
+# Inference runtime for the transformer pipelines:
+#   "eager"     - fp32 PyTorch (reference)
+#   "quantized" - PyTorch with dynamic int8 quantization of every nn.Linear (CPU)
+#   "onnx"      - exported ONNX graph on ONNX Runtime (needs optimum[onnxruntime])
+INFERENCE_BACKENDS = ("eager", "quantized", "onnx")
+DEFAULT_INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager")
+
+# Exported ONNX graphs are cached here so the export only happens once per model
+ONNX_CACHE_DIR = os.getenv(
+    "ONNX_CACHE_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "onnx")
+)
+
+# Parity contract against "eager", checked by benchmarks/bench_inference_backends.py
+PARITY_MIN_LABEL_AGREEMENT = 0.95
+PARITY_MAX_MEAN_SCORE_DELTA = 0.03
+
+
+def _load_onnx_model(model_name: str):
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+    except ImportError:
+        raise RuntimeError(
+            "INFERENCE_BACKEND=onnx needs optimum with ONNX Runtime. "
+            "Install with: pip install 'optimum[onnxruntime]'"
+        )
+
+    export_dir = os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "__"))
+    if os.path.exists(os.path.join(export_dir, "model.onnx")):
+        return ORTModelForSequenceClassification.from_pretrained(export_dir)
+
+    model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+    os.makedirs(export_dir, exist_ok=True)
+    model.save_pretrained(export_dir)
+    return model
+
+
+def build_pipeline(task: str, model_name: str, backend: str = DEFAULT_INFERENCE_BACKEND, device: int = -1, **kwargs):
+    """Build a transformers pipeline for task/model on the requested inference backend."""
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown INFERENCE_BACKEND '{backend}', expected one of {INFERENCE_BACKENDS}")
+
+    from transformers import pipeline
+    if backend == "eager":
+        return pipeline(task, model=model_name, device=device, **kwargs)
+
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    if backend == "quantized":
+        import torch
+        from transformers import AutoModelForSequenceClassification
+        model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        # int8 dynamic quantization kernels are CPU only
+        return pipeline(task, model=model, tokenizer=tokenizer, device=-1, **kwargs)
+
+    return pipeline(task, model=_load_onnx_model(model_name), tokenizer=tokenizer, **kwargs)
@@ -0,0 +1,322 @@
+# backend/app/services/llm_client.py
+import email.utils
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.services.metrics import metrics, flatten
+
+# Preference order; a rate-limited or failing provider hands the call to the next one
+LLM_PROVIDERS = [p.strip() for p in os.getenv("LLM_PROVIDERS", "openai,gemini").split(",") if p.strip()]
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))  # In-flight calls, all providers
+LLM_RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", 60))  # Token bucket refill rate
+LLM_BURST = int(os.getenv("LLM_BURST", 10))  # Token bucket capacity
+# Longest a caller waits for a concurrency slot or a token before getting LLMRateLimited instead
+LLM_MAX_WAIT = float(os.getenv("LLM_MAX_WAIT", 2.0))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 30))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", 10))  # Keep-alive connections per provider host
+LLM_DEFAULT_COOLDOWN = float(os.getenv("LLM_DEFAULT_COOLDOWN", 20))  # 429/503 without Retry-After
+LLM_MAX_COOLDOWN = 300.0
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+
+class LLMError(Exception):
+    """No provider produced a reply."""
+
+
+class LLMRateLimited(LLMError):
+    """Every provider is cooling down or the local limits are saturated; retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after: float, message: str = "LLM rate limited"):
+        super().__init__(f"{message} (retry after {retry_after:.0f}s)")
+        self.retry_after = retry_after
+
+
+def parse_retry_after(headers, default: float = LLM_DEFAULT_COOLDOWN) -> float:
+    """Seconds to wait from Retry-After (delta or HTTP date) or OpenAI's retry-after-ms."""
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return min(max(float(value) / 1000, 0.0), LLM_MAX_COOLDOWN)
+        except ValueError:
+            pass
+    value = headers.get("Retry-After")
+    if not value:
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return default
+    return min(max(seconds, 0.0), LLM_MAX_COOLDOWN)
+
+
+class TokenBucket:
+    """Outbound request budget shared by every provider."""
+
+    def __init__(self, rate_per_minute: float = LLM_RATE_PER_MINUTE, capacity: int = LLM_BURST):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float) -> float:
+        """
+        Take one token. Returns how long the caller must wait before using it (0 when one is free);
+        raises LLMRateLimited without taking it if that would be longer than max_wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0
+            if wait > max_wait:
+                raise LLMRateLimited(wait, "LLM request budget exhausted")
+            self._tokens -= 1  # May go negative: later callers queue behind this reservation
+            return wait
+
+    def refund(self):
+        """Give back a reserved token that was never used."""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+
+class Provider:
+    """One chat backend reached over plain HTTPS: request building, response parsing, cooldown state."""
+
+    name = ""
+    key_env = ""
+    model = ""
+
+    def __init__(self):
+        self.cooldown_until = 0.0
+
+    def api_key(self) -> Optional[str]:
+        return os.getenv(self.key_env)  # Read per call: .env may be loaded after import
+
+    def build(self, system: str, user: str, temperature: float) -> Tuple[str, Dict, Dict]:
+        raise NotImplementedError
+
+    def parse(self, data: Dict) -> str:
+        raise NotImplementedError
+
+
+class OpenAIProvider(Provider):
+    name = "openai"
+    key_env = "OPENAI_API_KEY"
+    model = OPENAI_MODEL
+
+    def build(self, system, user, temperature):
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": user})
+        headers = {"Authorization": f"Bearer {self.api_key()}"}
+        payload = {"model": self.model, "messages": messages, "temperature": temperature}
+        return f"{OPENAI_BASE_URL}/chat/completions", headers, payload
+
+    def parse(self, data):
+        return data["choices"][0]["message"]["content"]
+
+
+class GeminiProvider(Provider):
+    name = "gemini"
+    key_env = "GEMINI_API_KEY"
+    model = GEMINI_MODEL
+
+    def build(self, system, user, temperature):
+        payload = {
+            "contents": [{"role": "user", "parts": [{"text": user}]}],
+            "generationConfig": {"temperature": temperature},
+        }
+        if system:
+            payload["systemInstruction"] = {"parts": [{"text": system}]}
+        headers = {"x-goog-api-key": self.api_key()}
+        return f"{GEMINI_BASE_URL}/models/{self.model}:generateContent", headers, payload
+
+    def parse(self, data):
+        return "".join(part.get("text", "") for part in data["candidates"][0]["content"]["parts"])
+
+
+PROVIDER_CLASSES = {cls.name: cls for cls in (OpenAIProvider, GeminiProvider)}
+
+
+class LLMClient:
+    """
+    Process-wide client for reply generation.
+
+    One keep-alive requests.Session (pooled per host) serves every call; a semaphore bounds the
+    calls in flight and a token bucket bounds the request rate. A 429/503 puts that provider in
+    cooldown for its Retry-After and the call fails over to the next provider. Nothing ever sleeps
+    through a cooldown: when no provider is available the caller gets LLMRateLimited with the
+    shortest remaining wait, so request and worker threads stay free.
+    """
+
+    def __init__(self, providers: Sequence[str] = LLM_PROVIDERS, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 rate_per_minute: float = LLM_RATE_PER_MINUTE, burst: int = LLM_BURST,
+                 max_wait: float = LLM_MAX_WAIT, timeout: float = LLM_TIMEOUT, pool_size: int = LLM_POOL_SIZE):
+        unknown = [p for p in providers if p not in PROVIDER_CLASSES]
+        if unknown:
+            raise ValueError(f"Unknown LLM provider(s): {', '.join(unknown)}")
+        self.providers: List[Provider] = [PROVIDER_CLASSES[p]() for p in providers]
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(1, len(self.providers)), pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.metrics = {
+            "calls": 0,
+            "rejected_busy": 0,
+            "rejected_rate_limited": 0,
+            "failovers": 0,
+            "request_seconds_total": 0.0,
+        }
+        self._provider_metrics = {p.name: {"ok": 0, "rate_limited": 0, "errors": 0} for p in self.providers}
+
+    def _count(self, name: str, provider: Optional[str] = None, seconds: float = 0.0):
+        if provider:
+            llm_request_seconds.labels(provider).observe(seconds)
+        with self._lock:
+            if provider:
+                self._provider_metrics[provider][name] += 1
+            else:
+                self.metrics[name] += 1
+            self.metrics["request_seconds_total"] += seconds
+
+    def generate(self, system: str, user: str, temperature: float = 0.7,
+                 providers: Optional[Sequence[str]] = None) -> Tuple[str, str]:
+        """
+        One completion as (text, provider name). Raises LLMRateLimited when it should be retried
+        later and LLMError when no configured provider could answer.
+        """
+        candidates = [p for p in self.providers
+                      if (providers is None or p.name in providers) and p.api_key()]
+        if not candidates:
+            raise LLMError("No LLM provider configured (set OPENAI_API_KEY or GEMINI_API_KEY)")
+
+        now = time.monotonic()
+        available = [p for p in candidates if p.cooldown_until <= now]
+        if not available:
+            self._count("rejected_rate_limited")
+            raise LLMRateLimited(min(p.cooldown_until for p in candidates) - now, "All LLM providers cooling down")
+
+        # Wait for the rate budget before taking a concurrency slot, so a throttled caller never
+        # holds a slot idle; the slot wait gets what is left of max_wait
+        try:
+            wait = self.bucket.reserve(self.max_wait)
+        except LLMRateLimited:
+            self._count("rejected_rate_limited")
+            raise
+        if wait:
+            time.sleep(wait)  # Bounded by max_wait
+        if not self._slots.acquire(timeout=max(0.0, self.max_wait - wait)):
+            self.bucket.refund()
+            self._count("rejected_busy")
+            raise LLMRateLimited(1.0, "Too many LLM calls in flight")
+        try:
+            with self._lock:
+                self._in_flight += 1
+                self.metrics["calls"] += 1
+            try:
+                return self._call(available, system, user, temperature)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+        finally:
+            self._slots.release()
+
+    def _call(self, available: List[Provider], system: str, user: str, temperature: float) -> Tuple[str, str]:
+        errors, limited = [], []
+        for index, provider in enumerate(available):
+            if index:
+                self._count("failovers")
+            url, headers, payload = provider.build(system, user, temperature)
+            start = time.perf_counter()
+            try:
+                response = self._session.post(url, headers=headers, json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                self._count("errors", provider.name, time.perf_counter() - start)
+                errors.append(f"{provider.name}: {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            if response.status_code in (429, 503):
+                cooldown = parse_retry_after(response.headers)
+                now = time.monotonic()
+                if provider.cooldown_until <= now:  # Log once, not for every call already in flight
+                    print(f"⏳ {provider.name} rate limited, cooling down {cooldown:.0f}s")
+                provider.cooldown_until = max(provider.cooldown_until, now + cooldown)
+                self._count("rate_limited", provider.name, elapsed)
+                limited.append(provider)
+                continue
+            if response.status_code != 200:
+                self._count("errors", provider.name, elapsed)
+                errors.append(f"{provider.name}: HTTP {response.status_code} {response.text[:200]}")
+                continue
+            try:
+                text = provider.parse(response.json())
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                self._count("errors", provider.name, elapsed)
+                errors.append(f"{provider.name}: unexpected response ({e})")
+                continue
+            self._count("ok", provider.name, elapsed)
+            return text, provider.name
+
+        if limited:
+            # Worth retrying once the first cooldown ends, even if another provider errored
+            raise LLMRateLimited(min(p.cooldown_until for p in limited) - time.monotonic(),
+                                 "All LLM providers rate limited")
+        print("❌ LLM call failed:", "; ".join(errors))
+        raise LLMError("; ".join(errors))
+
+    def model_id(self) -> str:
+        """The provider/model chain answering calls, e.g. "openai/gpt-4o-mini,gemini/gemini-1.5-flash"."""
+        return ",".join(f"{p.name}/{p.model}" for p in self.providers)
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            return dict(
+                self.metrics,
+                in_flight=self._in_flight,
+                max_concurrency=self.max_concurrency,
+                providers={
+                    p.name: dict(self._provider_metrics[p.name], configured=bool(p.api_key()),
+                                 cooldown_seconds=round(max(0.0, p.cooldown_until - now), 1))
+                    for p in self.providers
+                },
+            )
+
+
+llm_request_seconds = metrics.histogram("llm_request_seconds", "LLM HTTP request time per provider", ("provider",))
+
+# Default instance shared by the whole process
+llm_client = LLMClient()
+
+
+def _llm_requests() -> Dict[tuple, float]:
+    return {(name, outcome): n for name, counts in llm_client.stats()["providers"].items()
+            for outcome, n in counts.items() if outcome in ("ok", "rate_limited", "errors")}
+
+
+metrics.collect("llm_requests_total", "LLM provider requests by outcome (ok / rate_limited / errors)", "counter",
+                ("provider", "outcome"), _llm_requests)
+metrics.collect("llm_client_calls_total", "generate() calls admitted, rejected (busy / rate limited) and failed over",
+                "counter", ("event",),
+                lambda: flatten(llm_client.stats(), ("calls", "rejected_busy", "rejected_rate_limited", "failovers")))
+metrics.collect("llm_in_flight", "LLM calls currently running", "gauge", (),
+                lambda: {(): llm_client.stats()["in_flight"]})
@@ -0,0 +1,184 @@
+# backend/app/services/mail_archive.py
+"""
+Local mailbox archives (Google Takeout .mbox exports, .eml dumps) read without the Gmail API.
+
+An mbox file is memory-mapped and split on its "From " separator lines without copying it into
+Python: iter_spans yields (path, start, end) byte ranges, and a message is only read and parsed
+when its range reaches parse_spans (in a worker process, see app/commands/ingest_archive.py).
+Subject/body extraction follows gmail_service.extract_subject_body_from_msg: the first text/plain
+part anywhere in the MIME tree, otherwise the visible text of the first text/html part;
+attachments are skipped.
+"""
+import hashlib
+import mmap
+import os
+import re
+from datetime import datetime, timezone
+from email import policy
+from email.header import decode_header, make_header
+from email.message import Message
+from email.parser import BytesParser
+from email.utils import parsedate_to_datetime
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.database.db import ARCHIVE_KEY_PREFIX
+from app.services import parser
+from app.services.gmail_service import HTML_BODY_MAX_CHARS
+from app.utils.html_text import HTML_CHUNK_CHARS, iter_html_text
+
+MBOX_SUFFIXES = (".mbox", ".mbx")
+EML_SUFFIX = ".eml"
+# Bytes of one message handed to the MIME parser; the rest (in practice attachments) is dropped
+ARCHIVE_MAX_MESSAGE_BYTES = int(os.getenv("ARCHIVE_MAX_MESSAGE_BYTES", 8 * 1024 * 1024))
+
+Span = Tuple[str, int, int]  # (file, start, end) of one raw message
+# (message_id, subject, body, combined_text, cleaned_text, sent_at, rfc_message_id)
+ParsedEmail = Tuple[str, str, str, str, str, Optional[datetime], Optional[str]]
+
+_SEPARATOR = b"\nFrom "
+_FOLD_RE = re.compile(r"\r?\n[ \t]+")  # Folded header continuation lines
+# compat32: the default policy's header registry parses every header it touches and costs
+# several times the rest of the extraction; only Subject needs decoding (RFC 2047)
+_parser = BytesParser(policy=policy.compat32)
+
+
+def is_mbox(path: str) -> bool:
+    if path.lower().endswith(MBOX_SUFFIXES):
+        return True
+    with open(path, "rb") as f:
+        return f.read(5) == b"From "
+
+
+def iter_archive_files(paths: Iterable[str]) -> Iterator[str]:
+    """Files to ingest: given files as-is, directories walked for .mbox and .eml files (sorted)."""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(MBOX_SUFFIXES + (EML_SUFFIX,)):
+                    yield os.path.join(root, name)
+
+
+def iter_spans(path: str) -> Iterator[Span]:
+    """Byte range of every message in an mbox (or the whole file for a single .eml)."""
+    size = os.path.getsize(path)
+    if not size:
+        return
+    if not is_mbox(path):
+        yield path, 0, size
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mm, "madvise"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)  # Read-ahead, and pages behind the scan can go
+        if mm[:5] == b"From ":
+            start = 0
+        else:
+            start = mm.find(_SEPARATOR) + 1
+            if not start:
+                return
+        while start < size:
+            found = mm.find(_SEPARATOR, start)
+            end = size if found < 0 else found + 1
+            yield path, start, end
+            start = end
+
+
+def _iter_parts(part: Message) -> Iterator[Message]:
+    """Depth-first walk over a MIME tree; attachments (parts with a filename) are skipped."""
+    if part.get_filename():
+        return
+    yield part
+    if part.is_multipart():
+        for child in part.get_payload():
+            yield from _iter_parts(child)
+
+
+def _header_text(value) -> str:
+    if value is None:
+        return ""
+    try:
+        return str(make_header(decode_header(_FOLD_RE.sub(" ", str(value)))))
+    except (LookupError, ValueError, UnicodeError):  # Bad charset or encoded-word: keep it raw
+        return str(value)
+
+
+def _part_text(part: Message, payload: bytes) -> str:
+    try:
+        return payload.decode(part.get_content_charset() or "utf-8", errors="ignore")
+    except LookupError:  # Unknown charset name
+        return payload.decode("utf-8", errors="ignore")
+
+
+def extract_subject_body(msg: Message) -> Tuple[str, str]:
+    """(subject, body) of a parsed RFC 822 message, by the same rules as the Gmail API path."""
+    subject = _header_text(msg.get("Subject"))
+    plain = html = None
+    for part in _iter_parts(msg):
+        if part.is_multipart():
+            continue
+        payload = part.get_payload(decode=True)
+        if not payload:
+            continue
+        content_type = part.get_content_type()
+        if content_type == "text/html":
+            html = html or _part_text(part, payload)
+        elif content_type == "text/plain" or part is msg:
+            plain = _part_text(part, payload)
+            break
+
+    body = ""
+    if plain:
+        body = plain
+    elif html:
+        chunks = (html[i:i + HTML_CHUNK_CHARS] for i in range(0, len(html), HTML_CHUNK_CHARS))
+        body = "".join(iter_html_text(chunks, HTML_BODY_MAX_CHARS))
+    return subject, body
+
+
+def _sent_at(msg: Message) -> Optional[datetime]:
+    """Date header as naive UTC (how timestamps are stored), or None if missing/unparseable."""
+    try:
+        sent = parsedate_to_datetime(str(msg["Date"]))
+    except (TypeError, ValueError, IndexError):
+        return None
+    if sent.tzinfo is not None:
+        sent = sent.astimezone(timezone.utc).replace(tzinfo=None)
+    return sent
+
+
+def parse_message(raw: bytes) -> ParsedEmail:
+    """One raw message to the fields save_email_records needs (text through parser.extract_text)."""
+    if raw.startswith(b"From "):  # mbox separator line
+        raw = raw[raw.find(b"\n") + 1:]
+    msg = _parser.parsebytes(raw[:ARCHIVE_MAX_MESSAGE_BYTES])
+    subject, body = extract_subject_body(msg)
+    # Keyed as archive:<Message-ID> (never a Gmail id), so re-imports stay idempotent; messages
+    # without a Message-ID are keyed by content. The bare header links the row to its Gmail copy.
+    rfc_message_id = str(msg.get("Message-ID", "") or "").strip()[:256 - len(ARCHIVE_KEY_PREFIX)] or None
+    message_id = ARCHIVE_KEY_PREFIX + (rfc_message_id or f"<sha1-{hashlib.sha1(raw).hexdigest()}@archive>")
+    combined, cleaned = parser.extract_text(subject, body)
+    return message_id, subject, body, combined, cleaned, _sent_at(msg), rfc_message_id
+
+
+def parse_spans(spans: Sequence[Span]) -> Tuple[List[ParsedEmail], int]:
+    """Read and parse a batch of messages; returns (parsed, number that failed to parse)."""
+    parsed, failed = [], 0
+    handles = {}
+    try:
+        for path, start, end in spans:
+            f = handles.get(path)
+            if f is None:
+                f = handles[path] = open(path, "rb")
+            f.seek(start)
+            raw = f.read(min(end - start, ARCHIVE_MAX_MESSAGE_BYTES + 1024))  # + room for the separator line
+            try:
+                parsed.append(parse_message(raw))
+            except Exception:
+                failed += 1
+    finally:
+        for f in handles.values():
+            f.close()
+    return parsed, failed
@@ -0,0 +1,235 @@
+# backend/app/services/metrics.py
+"""
+Process metrics in the Prometheus text format, served by GET /metrics (app/routers/metrics_router.py).
+
+Hot-path instruments are plain Python objects: a labelled series is looked up once per call and
+updated under its own uncontended lock, so a counter increment or histogram observation costs
+about a microsecond (see benchmarks/bench_metrics.py). State that services already count
+(caches, LLM client, Gmail pool, queue depth) is not duplicated. It is read by collector
+functions only when /metrics is scraped.
+"""
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Seconds: sub-millisecond parsing up to multi-second Gmail / model calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _CounterSeries:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramSeries:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last slot: above the largest bound
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class _Timer:
+    """`with histogram.time(label):` observes the block's wall time in seconds."""
+    __slots__ = ("series", "start")
+
+    def __init__(self, series: _HistogramSeries):
+        self.series = series
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.series.observe(time.perf_counter() - self.start)
+
+
+class _Family:
+    kind = "untyped"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+
+    def _new_series(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            with self._lock:
+                series = self._series.setdefault(values, self._new_series())
+        return series
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def _new_series(self):
+        return _CounterSeries()
+
+    def inc(self, *values: str, amount: float = 1.0):
+        self.labels(*values).inc(amount)
+
+    def samples(self):
+        return [("", _format_labels(self.labelnames, values), series.value)
+                for values, series in list(self._series.items())]
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_series(self):
+        return _HistogramSeries(self.buckets)
+
+    def observe(self, *values: str, value: float):
+        self.labels(*values).observe(value)
+
+    def time(self, *values: str) -> _Timer:
+        return _Timer(self.labels(*values))
+
+    def samples(self):
+        out = []
+        for values, series in list(self._series.items()):
+            counts, total = series.snapshot()
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                out.append(("_bucket", _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"'),
+                            cumulative))
+            out.append(("_sum", _format_labels(self.labelnames, values), total))
+            out.append(("_count", _format_labels(self.labelnames, values), cumulative))
+        return out
+
+
+class Collected(_Family):
+    """A counter or gauge whose values come from `collect()` ({label values: value}) at scrape time."""
+
+    def __init__(self, name: str, doc: str, kind: str, labelnames: Sequence[str],
+                 collect: Callable[[], Dict[LabelValues, float]]):
+        super().__init__(name, doc, labelnames)
+        self.kind = kind
+        self.collect = collect
+
+    def samples(self):
+        return [("", _format_labels(self.labelnames, values), value)
+                for values, value in self.collect().items() if value is not None]
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = "email_"):
+        self.prefix = prefix
+        self._families: Dict[str, _Family] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, family: _Family) -> _Family:
+        family.name = self.prefix + family.name
+        with self._lock:
+            if family.name in self._families:
+                raise ValueError(f"Metric {family.name} is already registered")
+            self._families[family.name] = family
+        return family
+
+    def counter(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, doc, labelnames))
+
+    def histogram(self, name: str, doc: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, doc, labelnames, buckets))
+
+    def collect(self, name: str, doc: str, kind: str, labelnames: Sequence[str],
+                collect: Callable[[], Dict[LabelValues, float]]) -> Collected:
+        return self._register(Collected(name, doc, kind, labelnames, collect))
+
+    def render(self) -> str:
+        """Every family in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        with self._lock:
+            families = list(self._families.values())
+        for family in families:
+            try:
+                samples = family.samples()
+            except Exception as e:  # One broken collector must not take the whole scrape down
+                print(f"⚠️ Metric {family.name} not collected: {e}")
+                continue
+            lines.append(f"# HELP {family.name} {family.doc}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{family.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def flatten(stats: Dict, keys: Optional[Sequence[str]] = None) -> Dict[LabelValues, float]:
+    """{(key,): value} from a service's stats() dict, for single-label collectors."""
+    return {(k,): float(v) for k, v in stats.items()
+            if (keys is None or k in keys) and isinstance(v, (int, float)) and not isinstance(v, bool)}
+
+
+# Default instance shared by the whole process
+metrics = MetricsRegistry()
+
+# Pipeline instruments shared by /pull, the sync queue and the classifier
+stage_seconds = metrics.histogram(
+    "stage_seconds", "Wall time of one processing stage (per email for mime_decode/extract_text, else per batch)",
+    ("stage",))
+model_batch_size = metrics.histogram("model_batch_size", "Texts per model call", ("model",), BATCH_SIZE_BUCKETS)
+# Exported as email_processed_total: the registry prefix is the namespace, names must not repeat it
+emails_processed = metrics.counter("processed_total", "Emails classified and stored", ("source",))
+gmail_calls = metrics.counter("gmail_api_calls_total", "Gmail API requests (batch sub-requests count once each)",
+                              ("call",))
+gmail_errors = metrics.counter("gmail_api_errors_total", "Gmail API requests that failed", ("call",))
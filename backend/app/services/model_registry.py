@@ -0,0 +1,93 @@
+# backend/app/services/model_registry.py
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Model lifecycle states reported by /api/email/health
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+READY = "ready"
+ERROR = "error"
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of lazily loaded models.
+    Each model is built by its factory on first get() (or by warm_up) and the single
+    loaded copy is shared by every thread.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._status: Dict[str, str] = {}
+        self._errors: Dict[str, str] = {}
+        self._load_seconds: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        with self._lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+            self._status.setdefault(name, NOT_LOADED)
+
+    def get(self, name: str) -> Any:
+        model = self._models.get(name)
+        if model is not None:  # Fast path: already loaded, no locking
+            return model
+        if name not in self._factories:
+            raise KeyError(f"Model '{name}' is not registered")
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is None:  # Only the first caller builds it; the rest wait on the lock
+                self._status[name] = LOADING
+                start = time.perf_counter()
+                try:
+                    model = self._factories[name]()
+                except Exception as e:
+                    self._status[name] = ERROR
+                    self._errors[name] = str(e)
+                    raise
+                self._load_seconds[name] = round(time.perf_counter() - start, 3)
+                self._models[name] = model
+                self._status[name] = READY
+                self._errors.pop(name, None)
+        return model
+
+    def warm_up(self, names: Optional[Iterable[str]] = None, background: bool = False) -> Optional[threading.Thread]:
+        """Load the given models (default: all registered) now, optionally in a daemon thread."""
+        names = list(names) if names is not None else list(self._factories)
+
+        def _load():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"Model warm-up failed for {name}: {e}")
+
+        if not background:
+            _load()
+            return None
+        thread = threading.Thread(target=_load, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self, names: Optional[Iterable[str]] = None) -> bool:
+        names = list(names) if names is not None else list(self._factories)
+        return all(self._status.get(name) == READY for name in names)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        for name in list(self._factories):
+            entry = {"status": self._status.get(name, NOT_LOADED)}
+            if name in self._load_seconds:
+                entry["load_seconds"] = self._load_seconds[name]
+            if name in self._errors:
+                entry["error"] = self._errors[name]
+            report[name] = entry
+        return report
+
+
+# Default instance shared by the whole process
+registry = ModelRegistry()
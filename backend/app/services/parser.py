@@ -1,12 +1,132 @@
 # backend/app/services/parser.py
-from typing import Tuple
-from app.utils.preprocee import clean_text
+import os
 import re
-from difflib import SequenceMatcher  # For dedup similarity
-import nltk
+from itertools import chain
+from typing import Iterable, Iterator, List, Tuple
+
+from app.utils.preprocee import clean_text
+from app.utils.near_dup import NearDuplicateFilter, DEDUP_SIMILARITY_THRESHOLD
+from app.utils.html_text import iter_html_text, looks_like_html
+
+DISPLAY_MAX_CHARS = 500  # Body text kept for display
+ML_MAX_CHARS = 300  # Cleaned text handed to the classifier
+PARSE_CHUNK_CHARS = int(os.getenv("PARSE_CHUNK_CHARS", 16384))  # Body is read in slices of this size
+# A tag or token longer than this is cut anyway so one pathological run can't grow the buffer unbounded
+MAX_CARRY_CHARS = 16 * PARSE_CHUNK_CHARS
+
+# UTM parameters go before tags (a tag can hide inside a parameter value)
+_UTM_RE = re.compile(r'\?utm_[^&\s]*&?')
+_TAG_RE = re.compile(r'<[^>]+>')
+_SPACE_RE = re.compile(r'\s+')
+_CUT_CHARS = (' ', '\n', '\t', '\r')
+_URL_RE = re.compile(r'(https?://[^\s]+)')
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+# Main content ends at the first footer marker
+_FOOTER_RE = re.compile(r'(Unsubscribe|©|All rights reserved|support@|View on|Learn more)', re.IGNORECASE)
+
+
+def _short_url(m: re.Match) -> str:
+    url = m.group(1)
+    return f"[{url[:50]}...]" if len(url) > 50 else url
+
+
+def _body_chunks(body: str, size: int = PARSE_CHUNK_CHARS) -> Iterator[str]:
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+
+def _clean(text: str) -> str:
+    text = _TAG_RE.sub('', _UTM_RE.sub('', text))
+    return _URL_RE.sub(_short_url, _SPACE_RE.sub(' ', text))
+
+
+def _clean_pieces(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Strip UTM/HTML, collapse whitespace and shorten URLs chunk by chunk.
+    Chunks are only cut at whitespace outside any tag, so no pattern ever straddles a cut.
+    """
+    carry = ""
+    space_before = False
+    for chunk in chain(chunks, [None]):  # None flushes the carry
+        if chunk is None:
+            buf, cut = carry, len(carry)
+        else:
+            buf = carry + chunk
+            # UTM parameters never contain whitespace, so they can go before looking for tags
+            # (a '>' inside a parameter doesn't close anything)
+            ws = max(buf.rfind(c) for c in _CUT_CHARS)
+            if ws > 0:
+                buf = _UTM_RE.sub('', buf[:ws]) + buf[ws:]
+            # Cut at the last whitespace that is past every complete tag and before any unclosed '<'
+            last_close = buf.rfind('>') + 1
+            open_tag = buf.find('<', last_close)
+            end = open_tag if open_tag != -1 else len(buf)
+            cut = max(buf.rfind(c, last_close, end) for c in _CUT_CHARS)
+            if cut <= 0:
+                if len(buf) < MAX_CARRY_CHARS:
+                    carry = buf
+                    continue
+                cut = len(buf)
+        carry = buf[cut:]
+        piece = _clean(buf[:cut])
+        if space_before and piece.startswith(' '):  # Whitespace run split across the cut
+            piece = piece[1:]
+        if piece:
+            space_before = piece.endswith(' ')
+            yield piece
+
+
+def _sentences(pieces: Iterable[str], max_sentence_chars: int) -> Iterator[str]:
+    """
+    Split the cleaned stream into sentences, holding back the trailing partial one.
+    A partial sentence that outgrows max_sentence_chars is yielded cut there and ends the stream.
+    """
+    pending = ""
+    for piece in pieces:
+        pending = (pending + piece).lstrip()
+        parts = _SENTENCE_RE.split(pending)
+        pending = parts.pop()
+        yield from parts
+        if len(pending) > max_sentence_chars:
+            yield pending[:max_sentence_chars]
+            return
+    pending = pending.strip()
+    if pending:
+        yield pending
+
+
+def clean_body_text(body: str, max_chars: int = DISPLAY_MAX_CHARS) -> str:
+    """
+    Display text for a body: visible text only, no UTM, short URLs, near-duplicate sentences dropped,
+    cut at the first footer marker and at max_chars. Stops reading the body once that budget is full.
+    """
+    dedup = NearDuplicateFilter(DEDUP_SIMILARITY_THRESHOLD)
+    kept: List[str] = []
+    length = -1  # Running length of ' '.join(kept)
+    # A sentence this long can't near-duplicate anything kept (kept text is <= max_chars) and fills
+    # the budget on its own, so the rest of it never needs to be read
+    threshold = max(DEDUP_SIMILARITY_THRESHOLD, 0.1)
+    max_sentence_chars = int(max_chars * max(2.0, 2.0 / threshold)) + 1
+    chunks = _body_chunks(body)
+    if looks_like_html(body):  # Raw HTML (not rendered upstream): keep only the visible text
+        chunks = iter_html_text(chunks)
+    for sentence in _sentences(_clean_pieces(chunks), max_sentence_chars):
+        if not dedup.add(sentence):
+            continue
+        footer = _FOOTER_RE.search(sentence)
+        if footer:
+            kept.append(sentence[:footer.start()])
+            break
+        kept.append(sentence)
+        length += len(sentence) + 1
+        if length > max_chars:
+            break
+
+    text = ' '.join(kept)
+    if len(text) > max_chars:
+        text = text[:max_chars] + "..."
+    return text
 
-# Ensure punkt tokenizer is available
-nltk.download('punkt', quiet=True)
 
 def extract_text(subject: str, body: str) -> Tuple[str, str]:
     """
@@ -18,31 +138,9 @@ def extract_text(subject: str, body: str) -> Tuple[str, str]:
     if body is None:
         body = ""
 
-    # Strip UTM, HTML, extra spaces (as before)
-    clean_body = re.sub(r'\?utm_[^&\s]*&?', '', body)
-    clean_body = re.sub(r'\?utm_[^&\s]*$', '', clean_body)
-    clean_body = re.sub(r'<[^>]+>', '', clean_body)
-    clean_body = re.sub(r'\s+', ' ', clean_body).strip()
-    
-    # Truncate long URLs
-    clean_body = re.sub(r'(https?://[^\s]+)', lambda m: f"[{m.group(1)[:50]}...]" if len(m.group(1)) > 50 else m.group(1), clean_body)
-    
-    # Deduplicate: Split to sentences, remove similar (>70% match)
-    sentences = re.split(r'(?<=[.!?])\s+', clean_body)
-    unique_sentences = []
-    for sent in sentences:
-        if not any(SequenceMatcher(None, sent, u).ratio() > 0.7 for u in unique_sentences):
-            unique_sentences.append(sent)
-    clean_body = ' '.join(unique_sentences)
-    
-    # Limit length for display (keep main content, cut footers like 'Unsubscribe')
-    clean_body = re.sub(r'(Unsubscribe|©|All rights reserved|support@|View on|Learn more).*', '', clean_body, flags=re.IGNORECASE | re.DOTALL)
-    if len(clean_body) > 500:
-        clean_body = clean_body[:500] + "..."
-    
-    combined = f"{subject}\n\n{clean_body}"
-    cleaned = clean_text(combined)  # ML version (tokenized, but now shorter input)
-    if len(cleaned) > 300:  # Limit ML text too for efficiency
-        cleaned = cleaned[:300] + "..."
-    
-    return combined, cleaned
\ No newline at end of file
+    combined = f"{subject}\n\n{clean_body_text(body)}"
+    cleaned = clean_text(combined, max_chars=ML_MAX_CHARS)  # ML version, stops once the budget is full
+    if len(cleaned) > ML_MAX_CHARS:
+        cleaned = cleaned[:ML_MAX_CHARS] + "..."
+
+    return combined, cleaned
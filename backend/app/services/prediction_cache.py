@@ -0,0 +1,192 @@
+# backend/app/services/prediction_cache.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.database.db import SessionLocal, ReadSession, PredictionCacheEntry
+from app.services.metrics import metrics, flatten
+
+Prediction = Tuple[str, float, str, str]  # (label, confidence, sentiment, priority)
+
+PREDICTION_CACHE_ENABLED = os.getenv("PREDICTION_CACHE_ENABLED", "true").lower() == "true"
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", 10000))  # In-process LRU entries
+PREDICTION_CACHE_TTL = int(os.getenv("PREDICTION_CACHE_TTL", 7 * 24 * 3600))  # Seconds, both tiers
+PREDICTION_CACHE_PERSIST = os.getenv("PREDICTION_CACHE_PERSIST", "true").lower() == "true"
+PREDICTION_CACHE_DB_MAX_ROWS = int(os.getenv("PREDICTION_CACHE_DB_MAX_ROWS", 200000))
+# Prune the SQLite tier once every this many writes instead of on every write
+PRUNE_EVERY_WRITES = 500
+
+
+def cache_key(text: str, version: str) -> str:
+    """Hash of the cleaned text plus the model / label-set version it was classified with."""
+    return hashlib.sha256(f"{version}\0{text}".encode("utf-8")).hexdigest()
+
+
+class PredictionCache:
+    """
+    Two-tier cache of classifier outputs: an in-process LRU in front of a table in the app's SQLite DB.
+    A hit in either tier skips model inference entirely.
+    """
+
+    def __init__(self, max_entries: int = PREDICTION_CACHE_SIZE, ttl_seconds: int = PREDICTION_CACHE_TTL,
+                 persist: bool = PREDICTION_CACHE_PERSIST, db_max_rows: int = PREDICTION_CACHE_DB_MAX_ROWS,
+                 session_factory=SessionLocal, read_session_factory=ReadSession):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist = persist
+        self.db_max_rows = db_max_rows
+        self.session_factory = session_factory
+        self.read_session_factory = read_session_factory
+        self._entries: "OrderedDict[str, Tuple[Prediction, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        self.counters = {
+            "memory_hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "expired": 0,
+            "db_evictions": 0,
+            "db_errors": 0,
+        }
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Prediction]:
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, Prediction] = {}
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                value, stored_at = entry
+                if now - stored_at > self.ttl_seconds:
+                    del self._entries[key]
+                    self.counters["expired"] += 1
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = value
+            self.counters["memory_hits"] += len(found)
+
+        missing = [k for k in keys if k not in found]
+        if missing and self.persist:
+            from_db = self._db_get(missing)
+            if from_db:
+                self._memory_put(from_db)
+                found.update(from_db)
+                with self._lock:
+                    self.counters["db_hits"] += len(from_db)
+
+        with self._lock:
+            self.counters["misses"] += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, Prediction]):
+        if not items:
+            return
+        self._memory_put(items)
+        if self.persist:
+            self._db_put(items)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.counters["memory_hits"] + self.counters["db_hits"] + self.counters["misses"]
+            hits = self.counters["memory_hits"] + self.counters["db_hits"]
+            return dict(
+                self.counters,
+                entries=len(self._entries),
+                max_entries=self.max_entries,
+                hit_rate=round(hits / lookups, 4) if lookups else 0.0,
+            )
+
+    def _memory_put(self, items: Dict[str, Prediction]):
+        now = time.time()
+        with self._lock:
+            for key, value in items.items():
+                self._entries[key] = (tuple(value), now)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["memory_evictions"] += 1
+
+    def _db_get(self, keys) -> Dict[str, Prediction]:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+        session = self.read_session_factory()
+        try:
+            found = {}
+            for i in range(0, len(keys), 500):  # Stay under SQLite's bound-parameter limit
+                rows = session.execute(
+                    select(PredictionCacheEntry).where(
+                        PredictionCacheEntry.key.in_(keys[i:i + 500]),
+                        PredictionCacheEntry.created_at >= cutoff,
+                    )
+                ).scalars()
+                for row in rows:
+                    found[row.key] = (row.label, row.confidence, row.sentiment, row.priority)
+            return found
+        except Exception as e:  # Cache must never break classification
+            self.counters["db_errors"] += 1
+            print("Prediction cache read error:", e)
+            return {}
+        finally:
+            session.close()
+
+    def _db_put(self, items: Dict[str, Prediction]):
+        now = datetime.utcnow()
+        rows = [
+            {"key": k, "label": v[0], "confidence": float(v[1]), "sentiment": v[2], "priority": v[3], "created_at": now}
+            for k, v in items.items()
+        ]
+        stmt = sqlite_insert(PredictionCacheEntry)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PredictionCacheEntry.key],
+            set_={c: stmt.excluded[c] for c in ("label", "confidence", "sentiment", "priority", "created_at")},
+        )
+        session = self.session_factory()
+        try:
+            session.execute(stmt, rows)
+            self._writes_since_prune += len(rows)
+            if self._writes_since_prune >= PRUNE_EVERY_WRITES:
+                self._writes_since_prune = 0
+                self._db_prune(session)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.counters["db_errors"] += 1
+            print("Prediction cache write error:", e)
+        finally:
+            session.close()
+
+    def _db_prune(self, session):
+        """Age-based then size-based eviction of the SQLite tier."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+        expired = session.execute(delete(PredictionCacheEntry).where(PredictionCacheEntry.created_at < cutoff))
+        evicted = expired.rowcount or 0
+        excess = session.execute(select(func.count()).select_from(PredictionCacheEntry)).scalar() - self.db_max_rows
+        if excess > 0:
+            oldest = select(PredictionCacheEntry.key).order_by(PredictionCacheEntry.created_at).limit(excess)
+            result = session.execute(delete(PredictionCacheEntry).where(PredictionCacheEntry.key.in_(oldest)))
+            evicted += result.rowcount or 0
+        self.counters["db_evictions"] += evicted
+
+
+# Default instance used by the classifier (None when disabled)
+prediction_cache = PredictionCache() if PREDICTION_CACHE_ENABLED else None
+if prediction_cache is not None:
+    metrics.collect("prediction_cache_total", "Prediction cache lookups (memory_hits / db_hits / misses) and evictions",
+                    "counter", ("event",),
+                    lambda: flatten(prediction_cache.stats(), ("memory_hits", "db_hits", "misses", "expired",
+                                                               "memory_evictions", "db_evictions", "db_errors")))
+    metrics.collect("prediction_cache_hit_ratio", "Share of prediction lookups served from the cache", "gauge", (),
+                    lambda: {(): prediction_cache.stats()["hit_rate"]})
@@ -0,0 +1,264 @@
+# backend/app/services/retention.py
+"""
+Retention and compaction for the emails table.
+
+Policy, by email age:
+  - younger than RETENTION_FULL_DAYS: everything (body + combined_text compressed at rest)
+  - up to RETENTION_DETAIL_DAYS: subject, cleaned_text, label and confidence; body and
+    combined_text are dropped and the search index keeps the cleaned text
+  - older: the row is deleted and only counted in the dashboard rollups (app/database/rollups.py)
+A value of 0 keeps that tier forever.
+
+Every step works in chunks of RETENTION_CHUNK rows, one short write transaction each, and checks
+the stop flag between chunks, so a run can be interrupted at any point without losing work and
+never holds the writer connection long enough to stall a sync. Compaction then returns free pages
+to the filesystem with incremental VACUUM and truncates the WAL.
+"""
+import os
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, delete, func, or_, select, tuple_, update
+
+from app.database import fts, rollups
+from app.database.compression import COMPRESS_MIN_BYTES
+from app.database.db import (
+    DB_FILE, SessionLocal, engine, EmailRecord, ArchivedRollup, get_checkpoint, set_checkpoint,
+)
+
+RETENTION_FULL_DAYS = int(os.getenv("RETENTION_FULL_DAYS", 90))
+RETENTION_DETAIL_DAYS = int(os.getenv("RETENTION_DETAIL_DAYS", 365))
+RETENTION_CHUNK = int(os.getenv("RETENTION_CHUNK", 500))
+RETENTION_PAUSE = float(os.getenv("RETENTION_PAUSE", 0.05))  # Seconds between chunks (lets syncs write)
+RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", 24))  # 0 = no scheduler
+RETENTION_START_DELAY = int(os.getenv("RETENTION_START_DELAY", 600))  # First run after startup
+VACUUM_CHUNK_PAGES = int(os.getenv("VACUUM_CHUNK_PAGES", 1024))
+
+COMPRESS_CHECKPOINT = "retention_compress"
+
+
+def _file_bytes() -> int:
+    return sum(os.path.getsize(p) for p in (DB_FILE, DB_FILE + "-wal") if os.path.exists(p))
+
+
+class RetentionJob:
+    """Runs the retention policy and compaction, on demand (CLI) or on a schedule (app.main)."""
+
+    def __init__(self, session_factory=SessionLocal, db_engine=engine):
+        self.session_factory = session_factory
+        self.engine = db_engine
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()  # One run at a time
+        self.last_report: Dict = {}
+
+    # ---- scheduling ----
+
+    def start(self, interval_hours: float = RETENTION_INTERVAL_HOURS):
+        if self._thread or interval_hours <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(interval_hours,), name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _loop(self, interval_hours: float):
+        if self._stop.wait(RETENTION_START_DELAY):
+            return
+        while not self._stop.is_set():
+            try:
+                self.run()
+            except Exception:
+                print("Retention job error:", traceback.format_exc())
+            self._stop.wait(interval_hours * 3600)
+
+    def _pause(self) -> bool:
+        """Sleep between chunks; False once a stop was requested."""
+        return not self._stop.wait(RETENTION_PAUSE) if RETENTION_PAUSE else not self._stop.is_set()
+
+    # ---- the job ----
+
+    def run(self, now: Optional[datetime] = None, compact: bool = True) -> Dict:
+        """One full pass. Returns (and keeps in last_report) what was done and the bytes reclaimed."""
+        with self._lock:
+            now = now or datetime.utcnow()
+            size_before = _file_bytes()
+            start = time.perf_counter()
+            # Oldest tier first, so rows about to be deleted aren't pruned (or compressed) on the way
+            report = {"archived": self.archive(now - timedelta(days=RETENTION_DETAIL_DAYS))
+                      if RETENTION_DETAIL_DAYS > 0 else 0}
+            report["bodies_pruned"] = (self.prune_bodies(now - timedelta(days=RETENTION_FULL_DAYS))
+                                       if RETENTION_FULL_DAYS > 0 else 0)
+            report["compressed"] = self.compress_legacy()
+            if compact:
+                report.update(self.compact())
+            report["bytes_before"] = size_before
+            report["bytes_after"] = _file_bytes()
+            report["bytes_reclaimed"] = max(0, size_before - report["bytes_after"])
+            report["seconds"] = round(time.perf_counter() - start, 3)
+            report["interrupted"] = self._stop.is_set()
+            self.last_report = report
+        print(f"🧹 Retention: {report['compressed']} compressed, {report['bodies_pruned']} bodies pruned, "
+              f"{report['archived']} archived, {report['bytes_reclaimed']} bytes reclaimed")
+        return report
+
+    def compress_legacy(self) -> int:
+        """Rewrite rows stored before compression existed (plain TEXT bodies) in compressed form."""
+        table = EmailRecord.__table__
+        stmt = (
+            update(table).where(table.c.id == bindparam("row_id"))
+            .values(body=bindparam("new_body"), combined_text=bindparam("new_combined"))
+        )
+        stored_plain = or_(
+            (func.typeof(table.c.body) == "text") & (func.length(table.c.body) >= COMPRESS_MIN_BYTES),
+            (func.typeof(table.c.combined_text) == "text") & (func.length(table.c.combined_text) >= COMPRESS_MIN_BYTES),
+        )
+        done = 0
+        session = self.session_factory()
+        try:
+            position = get_checkpoint(session, COMPRESS_CHECKPOINT)
+            while True:
+                rows = session.execute(
+                    select(table.c.id, table.c.body, table.c.combined_text)
+                    .where(table.c.id > position, stored_plain)
+                    .order_by(table.c.id).limit(RETENTION_CHUNK)
+                ).all()
+                if not rows:
+                    break
+                session.execute(stmt, [{"row_id": r.id, "new_body": r.body, "new_combined": r.combined_text} for r in rows])
+                position = rows[-1].id
+                set_checkpoint(session, COMPRESS_CHECKPOINT, position)  # New rows are compressed on write
+                session.commit()
+                done += len(rows)
+                if not self._pause():
+                    break
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        return done
+
+    def prune_bodies(self, cutoff: datetime) -> int:
+        """Drop body + combined_text for emails older than cutoff; search falls back to cleaned_text."""
+        table = EmailRecord.__table__
+        done = 0
+        after = None
+        session = self.session_factory()
+        try:
+            while True:
+                query = (
+                    select(table.c.id, table.c.timestamp, table.c.subject, table.c.cleaned_text)
+                    .where(table.c.timestamp < cutoff)
+                    .where(or_(table.c.body.is_not(None), table.c.combined_text.is_not(None)))
+                )
+                if after:
+                    query = query.where(tuple_(table.c.timestamp, table.c.id) > after)
+                rows = session.execute(query.order_by(table.c.timestamp, table.c.id).limit(RETENTION_CHUNK)).all()
+                if not rows:
+                    break
+                ids = [r.id for r in rows]
+                session.execute(update(table).where(table.c.id.in_(ids)).values(body=None, combined_text=None))
+                fts.index_emails(session, [fts.fts_row(r.id, r.subject, r.cleaned_text) for r in rows])
+                session.commit()
+                after = (rows[-1].timestamp, rows[-1].id)
+                done += len(rows)
+                if not self._pause():
+                    break
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        return done
+
+    def archive(self, cutoff: datetime) -> int:
+        """
+        Delete emails older than cutoff (FTS rows go by trigger). They stay counted in email_rollups;
+        their share is recorded in email_rollups_archived so a rebuild keeps them.
+        """
+        table = EmailRecord.__table__
+        done = 0
+        session = self.session_factory()
+        try:
+            while True:
+                rows = session.execute(
+                    select(table.c.id, table.c.predicted_label, table.c.sentiment, table.c.priority,
+                           table.c.confidence, table.c.timestamp)
+                    .where(table.c.timestamp < cutoff)
+                    .order_by(table.c.timestamp, table.c.id).limit(RETENTION_CHUNK)
+                ).all()
+                if not rows:
+                    break
+                deltas = {}
+                for r in rows:
+                    rollups.add_email(deltas, 1, *r[1:])
+                rollups.apply(session, deltas, model=ArchivedRollup)
+                session.execute(delete(table).where(table.c.id.in_([r.id for r in rows])))
+                session.commit()
+                done += len(rows)
+                if not self._pause():
+                    break
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        return done
+
+    def _raw(self, *statements: str, script: bool = False):
+        """Run PRAGMAs on the writer connection, holding it only for this call; returns the last row."""
+        with self.engine.connect() as conn:
+            raw = conn.connection.driver_connection
+            row = None
+            for sql in statements:
+                if script:
+                    raw.executescript(sql)  # Steps the statement to completion; execute() frees a single page
+                else:
+                    row = raw.execute(sql).fetchone()
+            return row
+
+    def compact(self) -> Dict:
+        """
+        Return free pages to the filesystem, VACUUM_CHUNK_PAGES at a time, then truncate the WAL.
+        Needs auto_vacuum=INCREMENTAL (default for new DBs; older files: enable_incremental_vacuum).
+        """
+        page_size = self._raw("PRAGMA page_size")[0]
+        free_before = self._raw("PRAGMA freelist_count")[0]
+        incremental = self._raw("PRAGMA auto_vacuum")[0] == 2
+        if incremental:
+            while not self._stop.is_set() and self._raw("PRAGMA freelist_count")[0] > 0:
+                self._raw(f"PRAGMA incremental_vacuum({VACUUM_CHUNK_PAGES});", script=True)
+                self._raw("PRAGMA wal_checkpoint(PASSIVE)")
+                self._pause()
+        elif free_before:
+            print("🧹 auto_vacuum is off for this DB file: free pages are reused but not returned to the "
+                  "filesystem. Run `python -m app.commands.retention --enable-incremental-vacuum` once.")
+        self._raw("PRAGMA wal_checkpoint(TRUNCATE)")
+        free_after = self._raw("PRAGMA freelist_count")[0]
+        return {
+            "incremental_vacuum": incremental,
+            "pages_freed": free_before - free_after if incremental else 0,
+            "free_pages_left": free_after,
+            "page_size": page_size,
+        }
+
+    def enable_incremental_vacuum(self) -> int:
+        """One-off full VACUUM that switches an existing file to auto_vacuum=INCREMENTAL. Blocks writers."""
+        before = _file_bytes()
+        self._raw("PRAGMA auto_vacuum = INCREMENTAL")
+        self._raw("VACUUM;", script=True)
+        self._raw("PRAGMA wal_checkpoint(TRUNCATE)")
+        return max(0, before - _file_bytes())
+
+
+# Default instance (scheduler started by app.main)
+retention_job = RetentionJob()
@@ -0,0 +1,81 @@
+# backend/app/services/student.py
+import json
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.services.cascade import LinearHead
+
+# Students distilled from the zero-shot labels in the emails table by
+# `python -m app.commands.train_student`; each run writes model/students/<version>/ and LATEST.
+# model/ is outside the backend/ Docker build context: in the container, set STUDENTS_DIR to a volume.
+_MODEL_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "model"))
+STUDENTS_DIR = os.getenv("STUDENTS_DIR", os.path.join(_MODEL_DIR, "students"))
+STUDENT_MODEL_PATH = os.getenv("STUDENT_MODEL_PATH")  # A version directory; default: the LATEST one
+
+HEAD_FILE = "student.npz"
+METRICS_FILE = "metrics.json"
+LATEST_FILE = "LATEST"
+
+# Hashed word/bigram features need no vocabulary pass, so training streams the table once per epoch
+DEFAULT_FEATURES = {"n_features": 2 ** 18, "ngram_range": [1, 2]}
+
+
+def build_features(config: Dict):
+    """The stateless vectorizer a student was trained with (same config at serve time)."""
+    from sklearn.feature_extraction.text import HashingVectorizer
+    return HashingVectorizer(n_features=int(config["n_features"]), ngram_range=tuple(config["ngram_range"]),
+                             alternate_sign=False, norm="l2", dtype=np.float32)
+
+
+def latest_version_dir(students_dir: str = STUDENTS_DIR) -> str:
+    pointer = os.path.join(students_dir, LATEST_FILE)
+    if not os.path.exists(pointer):
+        raise FileNotFoundError(f"No trained student in {students_dir}; run `python -m app.commands.train_student`")
+    with open(pointer) as f:
+        return os.path.join(students_dir, f.read().strip())
+
+
+def missing_artifacts() -> List[str]:
+    """What ZERO_SHOT_MODE=student would fail to load, as "ENV_VAR=path" (empty when it can load)."""
+    if STUDENT_MODEL_PATH:
+        head = os.path.join(STUDENT_MODEL_PATH, HEAD_FILE)
+        return [] if os.path.isfile(head) else [f"STUDENT_MODEL_PATH={os.path.abspath(head)}"]
+    pointer = os.path.join(STUDENTS_DIR, LATEST_FILE)
+    return [] if os.path.isfile(pointer) else [f"STUDENTS_DIR={os.path.abspath(pointer)}"]
+
+
+class StudentModel:
+    """A trained student: hashed features plus a linear head, scoring a whole batch at once."""
+
+    def __init__(self, head: LinearHead, version: str):
+        self.head = head
+        self.version = version
+        self.features = build_features(head.meta["features"])
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "StudentModel":
+        path = path or STUDENT_MODEL_PATH or latest_version_dir()
+        return cls(LinearHead.load(os.path.join(path, HEAD_FILE)), os.path.basename(os.path.normpath(path)))
+
+    def save(self, students_dir: str, metrics: Dict) -> str:
+        """Write <students_dir>/<version>/ (head + metrics) and point LATEST at it."""
+        path = os.path.join(students_dir, self.version)
+        os.makedirs(path, exist_ok=True)
+        self.head.save(os.path.join(path, HEAD_FILE))
+        with open(os.path.join(path, METRICS_FILE), "w") as f:
+            json.dump(metrics, f, indent=2)
+        with open(os.path.join(students_dir, LATEST_FILE), "w") as f:
+            f.write(self.version)
+        return path
+
+    def check_labels(self, labels: Sequence[str]):
+        if set(self.head.labels) != set(labels):
+            raise ValueError(f"Student {self.version} was trained for labels {self.head.labels}, "
+                             f"classifier uses {list(labels)}; retrain with `python -m app.commands.train_student`")
+
+    def score(self, texts: List[str], labels: Sequence[str]) -> np.ndarray:
+        """Probabilities with columns in the order of `labels`."""
+        probs = self.head.predict_proba(self.features.transform(texts))
+        return probs[:, [self.head.labels.index(label) for label in labels]]
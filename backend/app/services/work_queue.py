@@ -0,0 +1,348 @@
+# backend/app/services/work_queue.py
+import json
+import os
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import delete, func, or_, select, update
+
+from app.database.db import SessionLocal, ReadSession, SyncJob
+from app.services.metrics import metrics, stage_seconds
+
+SYNC_WORKERS = int(os.getenv("SYNC_WORKERS", 2))  # Bounded pool size
+SYNC_MAX_ATTEMPTS = int(os.getenv("SYNC_MAX_ATTEMPTS", 3))
+SYNC_MESSAGE_BATCH = int(os.getenv("SYNC_MESSAGE_BATCH", 32))  # Message ids per classifier batch
+POLL_SECONDS = 2.0
+# Finished jobs are kept this long for inspection, then purged while workers are idle
+DONE_RETENTION_SECONDS = int(os.getenv("SYNC_DONE_RETENTION", 24 * 3600))
+PURGE_INTERVAL_SECONDS = 600
+# A job 'running' for longer than this is presumed orphaned (its process died) and is requeued;
+# keep it well above the slowest batch (classification + auto-replies)
+SYNC_LEASE_SECONDS = int(os.getenv("SYNC_LEASE_SECONDS", 1800))
+
+HISTORY = "history"
+MESSAGES = "messages"
+SYNC_REQUESTED = "sync"  # Payload of a history job: syncs always start from the stored cursor
+
+
+def message_job(payload: str) -> Dict:
+    """Decode a "messages" payload: {"source": ..., "ids": [...]}. Older jobs are a bare list of ids."""
+    job = json.loads(payload)
+    return {"source": "history", "ids": job} if isinstance(job, list) else job
+
+
+class _StageTimer:
+    """`with work_queue.stage(name):`; a plain class, since it wraps every email in a batch."""
+    __slots__ = ("queue", "name", "start")
+
+    def __init__(self, queue: "WorkQueue", name: str):
+        self.queue = queue
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.queue.record_stage(self.name, time.perf_counter() - self.start)
+
+
+class WorkQueue:
+    """
+    SQLite-backed job queue drained by a bounded pool of worker threads.
+
+    "history" jobs (one per Pub/Sub notification) are coalesced: a worker claims every pending
+    one at once and runs a single incremental sync, and only one history sync runs at a time.
+    The sync enqueues "messages" jobs, which workers claim up to SYNC_MESSAGE_BATCH ids at a time
+    so the classifier sees full batches.
+
+    Claims are made under SQLite's write lock (BEGIN IMMEDIATE), so any number of processes
+    (gunicorn workers) can share the queue. A claim is a lease: jobs still 'running' after
+    SYNC_LEASE_SECONDS are requeued, and a worker whose lease was taken over cannot finish them.
+    """
+
+    def __init__(self, workers: int = SYNC_WORKERS, session_factory=SessionLocal, read_session_factory=ReadSession):
+        self.workers = max(1, workers)
+        self.session_factory = session_factory
+        self.read_session_factory = read_session_factory
+        self._handlers: Dict[str, Callable[[List[str]], None]] = {}
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._claim_lock = threading.Lock()  # Claims in this process queue here instead of on SQLite's lock
+        self._stats_lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._counters = {"enqueued": 0, "completed": 0, "errors": 0, "coalesced": 0}
+        self._last_purge = 0.0
+
+    # ---- producer side ----
+
+    def register_handler(self, kind: str, handler: Callable[[List[str]], None]):
+        self._handlers[kind] = handler
+
+    def enqueue(self, kind: str, payload: str) -> int:
+        session = self.session_factory()
+        try:
+            job = SyncJob(kind=kind, payload=payload, status="pending")
+            session.add(job)
+            session.commit()
+            job_id = job.id
+        finally:
+            session.close()
+        with self._stats_lock:
+            self._counters["enqueued"] += 1
+        self._wake.set()
+        return job_id
+
+    def enqueue_messages(self, msg_ids: List[str], source: str = "history"):
+        """Queue message ids in classifier-sized jobs; `source` travels with them (see message_job)."""
+        for i in range(0, len(msg_ids), SYNC_MESSAGE_BATCH):
+            self.enqueue(MESSAGES, json.dumps({"source": source, "ids": msg_ids[i:i + SYNC_MESSAGE_BATCH]}))
+
+    # ---- worker side ----
+
+    def start(self):
+        if self._threads:
+            return
+        self._requeue_stale()
+        self._stop.clear()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker_loop, name=f"sync-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def drain(self):
+        """Process everything pending in the calling thread (CLI / tests)."""
+        while self._run_once():
+            pass
+
+    def stage(self, name: str) -> "_StageTimer":
+        """Time one pipeline stage; aggregated per stage in stats() and exported to /metrics."""
+        return _StageTimer(self, name)
+
+    def record_stage(self, name: str, seconds: float):
+        stage_seconds.labels(name).observe(seconds)
+        with self._stats_lock:
+            s = self._stages.get(name)
+            if s is None:
+                s = self._stages[name] = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            s["count"] += 1
+            s["total_seconds"] += seconds
+            if seconds > s["max_seconds"]:
+                s["max_seconds"] = seconds
+            s["last_seconds"] = seconds
+
+    def stats(self) -> Dict:
+        session = self.read_session_factory()
+        try:
+            by_status = dict(session.execute(
+                select(SyncJob.status, func.count()).group_by(SyncJob.status)
+            ).all())
+            by_kind = dict(session.execute(
+                select(SyncJob.kind, func.count()).where(SyncJob.status == "pending").group_by(SyncJob.kind)
+            ).all())
+            oldest = session.execute(
+                select(func.min(SyncJob.enqueued_at)).where(SyncJob.status == "pending")
+            ).scalar()
+        finally:
+            session.close()
+        with self._stats_lock:
+            stages = {
+                name: dict(s, avg_seconds=s["total_seconds"] / s["count"]) for name, s in self._stages.items()
+            }
+            counters = dict(self._counters)
+        return {
+            "depth": by_status.get("pending", 0),
+            "pending_by_kind": by_kind,
+            "running": by_status.get("running", 0),
+            "failed": by_status.get("failed", 0),
+            "lag_seconds": (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0,
+            "workers": len(self._threads),
+            "counters": counters,
+            "stages": stages,
+        }
+
+    def job_counts(self) -> Dict[tuple, int]:
+        """{(kind, status): jobs} in one grouped query (for /metrics)."""
+        session = self.read_session_factory()
+        try:
+            return {(kind, status): n for kind, status, n in session.execute(
+                select(SyncJob.kind, SyncJob.status, func.count()).group_by(SyncJob.kind, SyncJob.status)
+            )}
+        finally:
+            session.close()
+
+    def counters(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._counters)
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                worked = self._run_once()
+            except Exception:
+                print("Sync worker error:", traceback.format_exc())
+                worked = False
+            if not worked:
+                if time.time() - self._last_purge > PURGE_INTERVAL_SECONDS:
+                    self._purge_finished()
+                    self._requeue_stale()
+                self._wake.wait(POLL_SECONDS)
+                self._wake.clear()
+
+    def _run_once(self) -> bool:
+        claimed = self._claim()
+        if not claimed:
+            return False
+        kind, started, jobs = claimed
+        try:
+            self._handlers[kind]([payload for _, payload in jobs])
+        except Exception as e:
+            print(f"Sync job ({kind}) failed:", e)
+            self._finish([job_id for job_id, _ in jobs], started, error=str(e))
+        else:
+            self._finish([job_id for job_id, _ in jobs], started)
+        return True
+
+    def _claim(self) -> Optional[tuple]:
+        """
+        Atomically mark a coalesced history set or a batch of message jobs as running.
+        Returns (kind, started_at, [(id, payload)]); started_at identifies this claim in _finish.
+        """
+        with self._claim_lock:
+            session = self.session_factory()
+            try:
+                # Write lock before the SELECT: no other process can claim the same rows in between
+                session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+                now = datetime.utcnow()
+                rows = []
+                kind = None
+                if HISTORY in self._handlers and not self._history_running(session, now):
+                    rows = session.execute(
+                        select(SyncJob.id, SyncJob.payload)
+                        .where(SyncJob.status == "pending", SyncJob.kind == HISTORY)
+                        .order_by(SyncJob.id)
+                    ).all()
+                    kind = HISTORY
+                if not rows and MESSAGES in self._handlers:
+                    pending = session.execute(
+                        select(SyncJob.id, SyncJob.payload)
+                        .where(SyncJob.status == "pending", SyncJob.kind == MESSAGES)
+                        .order_by(SyncJob.id)
+                        .limit(SYNC_MESSAGE_BATCH)
+                    ).all()
+                    total = 0
+                    for row in pending:  # Fill one classifier batch
+                        size = len(message_job(row.payload)["ids"])
+                        if rows and total + size > SYNC_MESSAGE_BATCH:
+                            break
+                        rows.append(row)
+                        total += size
+                    kind = MESSAGES
+                if not rows:
+                    session.rollback()
+                    return None
+
+                ids = [r.id for r in rows]
+                claimed = session.execute(
+                    update(SyncJob).where(SyncJob.id.in_(ids), SyncJob.status == "pending").values(
+                        status="running", started_at=now, attempts=SyncJob.attempts + 1
+                    )
+                ).rowcount
+                if claimed != len(ids):  # Someone else got there first: leave all of them to it
+                    session.rollback()
+                    return None
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+            with self._stats_lock:
+                self._counters["coalesced"] += len(rows) - 1
+            return kind, now, [(r.id, r.payload) for r in rows]
+
+    @staticmethod
+    def _history_running(session, now: datetime) -> bool:
+        """Whether any process holds a live lease on a history sync (they must not overlap)."""
+        return session.execute(
+            select(SyncJob.id).where(SyncJob.kind == HISTORY, SyncJob.status == "running",
+                                     SyncJob.started_at >= now - timedelta(seconds=SYNC_LEASE_SECONDS)).limit(1)
+        ).first() is not None
+
+    def _finish(self, ids: List[int], started: datetime, error: Optional[str] = None):
+        """Close out a claim; jobs whose lease expired and were claimed again are left to the new owner."""
+        session = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            mine = (SyncJob.id.in_(ids), SyncJob.status == "running", SyncJob.started_at == started)
+            if error is None:
+                session.execute(update(SyncJob).where(*mine).values(status="done", finished_at=now, error=None))
+            else:
+                # Retry until SYNC_MAX_ATTEMPTS, then park as failed
+                session.execute(
+                    update(SyncJob).where(*mine, SyncJob.attempts < SYNC_MAX_ATTEMPTS)
+                    .values(status="pending", error=error)
+                )
+                session.execute(
+                    update(SyncJob).where(*mine, SyncJob.attempts >= SYNC_MAX_ATTEMPTS)
+                    .values(status="failed", finished_at=now, error=error)
+                )
+            session.commit()
+        finally:
+            session.close()
+        with self._stats_lock:
+            self._counters["completed" if error is None else "errors"] += len(ids)
+        if error is not None:
+            self._wake.set()
+
+    def _purge_finished(self):
+        self._last_purge = time.time()
+        cutoff = datetime.utcnow() - timedelta(seconds=DONE_RETENTION_SECONDS)
+        session = self.session_factory()
+        try:
+            session.execute(delete(SyncJob).where(SyncJob.status == "done", SyncJob.finished_at < cutoff))
+            session.commit()
+        except Exception as e:
+            print("Sync queue purge error:", e)
+        finally:
+            session.close()
+
+    def _requeue_stale(self):
+        """Jobs whose lease expired (their process crashed) go back to pending; live claims are left alone."""
+        cutoff = datetime.utcnow() - timedelta(seconds=SYNC_LEASE_SECONDS)
+        session = self.session_factory()
+        try:
+            requeued = session.execute(
+                update(SyncJob).where(SyncJob.status == "running",
+                                      or_(SyncJob.started_at < cutoff, SyncJob.started_at.is_(None)))
+                .values(status="pending")
+            ).rowcount
+            session.commit()
+        except Exception as e:
+            print("Sync queue requeue error:", e)
+            requeued = 0
+        finally:
+            session.close()
+        if requeued:
+            print(f"♻️ Requeued {requeued} sync job(s) whose lease expired")
+            self._wake.set()
+
+
+# Default instance (handlers are registered by email_router, workers started by app.main)
+work_queue = WorkQueue()
+
+metrics.collect("queue_jobs", "Sync jobs by kind and status (status=pending is the queue depth)", "gauge",
+                ("kind", "status"), work_queue.job_counts)
+metrics.collect("queue_events_total", "Sync jobs enqueued / completed / failed attempts / coalesced", "counter",
+                ("event",), lambda: {(k,): v for k, v in work_queue.counters().items()})
@@ -0,0 +1,101 @@
+# backend/app/utils/html_text.py
+import re
+from html.parser import HTMLParser
+from typing import Iterable, Iterator, List, Optional
+
+# Elements whose content is never shown to the reader
+HIDDEN_TAGS = {"head", "title", "style", "script", "noscript", "template", "svg", "math", "iframe", "object", "xml"}
+# Elements rendered on their own line; they become a space so words on either side don't run together
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "footer", "form",
+    "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol", "p", "pre",
+    "section", "table", "td", "th", "tr", "ul",
+}
+HTML_CHUNK_CHARS = 16384
+
+_SPACE_RE = re.compile(r'\s+')
+_HTML_HINT_RE = re.compile(r'<(!doctype|html|head|body|div|p|table|span|br|style|a\s)\b', re.IGNORECASE)
+
+
+def looks_like_html(text: str, sniff_chars: int = 4096) -> bool:
+    """True if the start of text contains markup a mail client would render as HTML."""
+    return bool(_HTML_HINT_RE.search(text, 0, sniff_chars))
+
+
+class _VisibleTextParser(HTMLParser):
+    """Collects visible text: hidden elements dropped, entities decoded, whitespace collapsed to single spaces."""
+
+    def __init__(self, max_chars: Optional[int] = None):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.pieces: List[str] = []
+        self.visible_chars = 0
+        self.hidden_depth = 0
+        self.done = False
+        self._space_pending = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in HIDDEN_TAGS:
+            self.hidden_depth += 1
+        elif tag == "body":
+            self.hidden_depth = 0  # An unclosed <head> must not hide the whole message
+        elif tag in BLOCK_TAGS:
+            self._space_pending = True
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self._space_pending = True
+
+    def handle_endtag(self, tag):
+        if tag in HIDDEN_TAGS:
+            self.hidden_depth = max(0, self.hidden_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self._space_pending = True
+
+    def handle_data(self, data):
+        if self.done or self.hidden_depth:
+            return
+        words = data.split()
+        if not words:
+            self._space_pending = self._space_pending or bool(data)
+            return
+        text = ' '.join(words)
+        # Text can arrive split mid-word across feeds, so only add a space where the source had one
+        if self.visible_chars and (self._space_pending or data[0].isspace()):
+            text = ' ' + text
+        self._space_pending = data[-1].isspace()
+        if self.max_chars is not None and self.visible_chars + len(text) >= self.max_chars:
+            text = text[:self.max_chars - self.visible_chars]
+            self.done = True
+        self.pieces.append(text)
+        self.visible_chars += len(text)
+
+    def take(self) -> str:
+        text = ''.join(self.pieces)
+        self.pieces = []
+        return text
+
+
+def iter_html_text(chunks: Iterable[str], max_chars: Optional[int] = None) -> Iterator[str]:
+    """
+    Convert HTML arriving in chunks to visible text, yielding text as it is found.
+    Stops reading input as soon as max_chars visible characters have been produced.
+    """
+    parser = _VisibleTextParser(max_chars)
+    for chunk in chunks:
+        parser.feed(chunk)
+        text = parser.take()
+        if text:
+            yield text
+        if parser.done:
+            return
+    parser.close()
+    text = parser.take()
+    if text:
+        yield text
+
+
+def html_to_text(html: str, max_chars: Optional[int] = None, chunk_chars: int = HTML_CHUNK_CHARS) -> str:
+    """Visible text of an HTML document, at most max_chars characters."""
+    chunks = (html[i:i + chunk_chars] for i in range(0, len(html), chunk_chars))
+    return ''.join(iter_html_text(chunks, max_chars))
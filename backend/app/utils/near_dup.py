@@ -0,0 +1,141 @@
+# backend/app/utils/near_dup.py
+import os
+import zlib
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# Same rule parser.extract_text always used: drop a sentence when ratio() > threshold against a kept one
+DEDUP_SIMILARITY_THRESHOLD = float(os.getenv("DEDUP_SIMILARITY_THRESHOLD", 0.7))
+
+SHINGLE_SIZE = 3  # Character n-grams
+LSH_BANDS = 20
+LSH_ROWS = 2  # 40 MinHash values per sentence
+MAX_CANDIDATES = 8  # Exact checks per sentence, so the worst case stays linear
+# Below this length a sentence has too few shingles for LSH to find its near-duplicates reliably,
+# so pairs involving one are always checked exactly (only those whose lengths allow a match)
+SHORT_SENTENCE_CHARS = int(os.getenv("DEDUP_SHORT_SENTENCE_CHARS", 64))
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(1234)
+_A = _rng.randint(1, _PRIME, size=(LSH_BANDS * LSH_ROWS, 1)).astype(np.uint64)
+_B = _rng.randint(0, _PRIME, size=(LSH_BANDS * LSH_ROWS, 1)).astype(np.uint64)
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    # crc32, not hash(): str hashes are salted per process, and cleaned_text must not depend on the process
+    return np.fromiter((zlib.crc32(s.encode("utf-8")) & _PRIME for s in shingles), dtype=np.uint64,
+                       count=len(shingles))
+
+
+def _char_counts(text: str) -> np.ndarray:
+    """Per-character counts (every non-ASCII character shares one slot, which only loosens the bound)."""
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    return np.bincount(np.minimum(codes, 128), minlength=129)
+
+
+def _band_keys(text: str) -> List[Tuple[int, bytes]]:
+    """MinHash signature split into LSH bands; sentences sharing any band become candidates."""
+    signature = ((_A * _shingle_hashes(text)[None, :] + _B) % _PRIME).min(axis=1)
+    return [(b, signature[b * LSH_ROWS:(b + 1) * LSH_ROWS].tobytes()) for b in range(LSH_BANDS)]
+
+
+class NearDuplicateFilter:
+    """
+    Streaming near-duplicate detector for sentences.
+
+    MinHash/LSH over character shingles finds a handful of candidate matches per sentence in
+    constant time; only those candidates are checked with the exact SequenceMatcher rule, so a
+    body with n sentences costs O(n) instead of O(n²) ratio() calls. Pairs where either sentence
+    is shorter than SHORT_SENTENCE_CHARS are always checked exactly. Long sentences can still
+    miss a near-duplicate the all-pairs rule would find (LSH recall is below 100%), so on long
+    bodies a few extra sentences may be kept; see benchmarks/bench_sentence_dedup.py.
+    """
+
+    def __init__(self, threshold: float = DEDUP_SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.kept: List[str] = []
+        # One matcher per kept sentence, as seq2: SequenceMatcher indexes seq2 once (b2j, character
+        # counts), so each comparison only swaps in the new sentence with set_seq1
+        self._matchers: List[SequenceMatcher] = []
+        self._exact: Dict[str, int] = {}
+        # ratio() > t needs len(shorter) / len(longer) > t / (2 - t), so only kept sentences up to
+        # _short_reach characters can ever match a short one; those are indexed by length
+        self._length_ratio = min(max(self.threshold, 0.0), 1.0) / (2.0 - min(max(self.threshold, 0.0), 1.0))
+        self._short_reach = int(SHORT_SENTENCE_CHARS / self._length_ratio) if self._length_ratio else 0
+        self._by_length: Dict[int, List[int]] = defaultdict(list)
+        self._counts: Dict[int, np.ndarray] = {}  # _char_counts of the sentences in _by_length
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+
+    def _is_similar(self, sentence: str, idx: int) -> bool:
+        """SequenceMatcher(None, sentence, kept[idx]).ratio() > threshold."""
+        kept = self.kept[idx]
+        # ratio() <= 2*min/(len_a+len_b), so very different lengths can never pass
+        total = len(sentence) + len(kept)
+        if total and 2.0 * min(len(sentence), len(kept)) / total <= self.threshold:
+            return False
+        sm = self._matchers[idx]
+        sm.set_seq1(sentence)
+        # quick_ratio() is a cheap upper bound on ratio(); only exact-check what can still pass
+        return sm.quick_ratio() > self.threshold and sm.ratio() > self.threshold
+
+    def _short_pairs(self, sentence: str) -> List[int]:
+        """Kept sentences that could still match this one, where one of the two is short."""
+        if not self._by_length or not self._length_ratio:
+            return []
+        length = len(sentence)
+        low = int(length * self._length_ratio)
+        if length < SHORT_SENTENCE_CHARS:  # Short: anything within the length window
+            high = min(int(length / self._length_ratio) + 1, self._short_reach)
+        else:  # Long: only the short kept sentences
+            high = SHORT_SENTENCE_CHARS - 1
+        pairs = [idx for n in range(low, high + 1) for idx in self._by_length.get(n, ())]
+        if len(pairs) < 2:
+            return pairs
+        # quick_ratio() for all of them at once: 2 * shared characters / total length bounds ratio()
+        shared = np.minimum(np.stack([self._counts[idx] for idx in pairs]), _char_counts(sentence)).sum(axis=1)
+        totals = np.array([len(self.kept[idx]) for idx in pairs]) + length
+        return [idx for idx, bound in zip(pairs, 2.0 * shared / totals) if bound > self.threshold]
+
+    def add(self, sentence: str) -> bool:
+        """Keep sentence unless it near-duplicates one already kept. Returns True if kept."""
+        if sentence in self._exact:
+            return False
+        keys = _band_keys(sentence)
+        hits: Dict[int, int] = defaultdict(int)
+        for key in keys:
+            for idx in self._buckets.get(key, ()):
+                hits[idx] += 1
+        # Most shared bands first: those are the likeliest matches
+        candidates = sorted(hits, key=hits.get, reverse=True)[:MAX_CANDIDATES]
+        for idx in candidates:
+            if self._is_similar(sentence, idx):
+                return False
+        for idx in self._short_pairs(sentence):
+            if idx not in candidates and self._is_similar(sentence, idx):
+                return False
+
+        idx = len(self.kept)
+        self.kept.append(sentence)
+        self._matchers.append(SequenceMatcher(None, "", sentence))
+        self._exact[sentence] = idx
+        if len(sentence) <= self._short_reach:
+            self._by_length[len(sentence)].append(idx)
+            self._counts[idx] = _char_counts(sentence)
+        for key in keys:
+            self._buckets[key].append(idx)
+        return True
+
+
+def dedupe_sentences(sentences: Iterable[str], threshold: float = DEDUP_SIMILARITY_THRESHOLD) -> List[str]:
+    """Drop sentences that are near-duplicates (ratio > threshold) of an earlier kept sentence."""
+    f = NearDuplicateFilter(threshold)
+    for sent in sentences:
+        f.add(sent)
+    return f.kept
@@ -1,30 +1,51 @@
 # backend/app/utils/preprocess.py
 import re
+from typing import Optional
+
 import nltk
 from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
 
-# Auto-download if missing (runs once)
-nltk.download('punkt', quiet=True)
-nltk.download('stopwords', quiet=True)
+try:
+    stop_words = set(stopwords.words('english'))
+except LookupError:  # Download only when missing, not on every import
+    nltk.download('stopwords', quiet=True)
+    stop_words = set(stopwords.words('english'))
+
+# URLs, then emails, then HTML tags; kept as separate passes because they can overlap
+_NOISE_RES = (re.compile(r"http\S+|www\.\S+"), re.compile(r"\S+@\S+"), re.compile(r"<[^>]+>"))
+# After the letters-only filter, word_tokenize's tokens are exactly the runs of a-z ...
+_WORD_RE = re.compile(r"[a-z]+")
+# ... except the Treebank contractions it splits even without punctuation
+_TREEBANK_SPLITS = {
+    "cannot": ("can", "not"),
+    "gimme": ("gim", "me"),
+    "gonna": ("gon", "na"),
+    "gotta": ("got", "ta"),
+    "lemme": ("lem", "me"),
+    "wanna": ("wan", "na"),
+}
+
+
+def _keep(token: str) -> bool:
+    return len(token) > 2 and token not in stop_words
 
-stop_words = set(stopwords.words('english'))
 
-def clean_text(text: str) -> str:
-    """Full cleaning: lower, remove urls/emails/HTML, tokenize, stopwords, min len 3."""
-    text = str(text)
-    text = text.lower()
-    # Remove URLs
-    text = re.sub(r"http\S+|www\.\S+", " ", text)
-    # Remove emails
-    text = re.sub(r"\S+@\S+", " ", text)
-    # Remove HTML tags
-    text = re.sub(r"<[^>]+>", " ", text)
-    # Keep only letters + spaces
-    text = re.sub(r"[^a-z\s]", " ", text)
-    # Collapse whitespace
-    text = re.sub(r"\s+", " ", text).strip()
-    # Tokenize and filter
-    tokens = word_tokenize(text)
-    tokens = [token for token in tokens if token not in stop_words and len(token) > 2]
-    return ' '.join(tokens)
\ No newline at end of file
+def clean_text(text: str, max_chars: Optional[int] = None) -> str:
+    """
+    Full cleaning: lower, remove urls/emails/HTML, tokenize, stopwords, min len 3.
+    With max_chars, stops tokenizing once the output is longer than max_chars.
+    """
+    text = str(text).lower()
+    for pattern in _NOISE_RES:
+        text = pattern.sub(" ", text)
+    tokens = []
+    length = -1  # Running length of ' '.join(tokens)
+    for match in _WORD_RE.finditer(text):
+        word = match.group()
+        for token in _TREEBANK_SPLITS.get(word, (word,)):
+            if _keep(token):
+                tokens.append(token)
+                length += len(token) + 1
+        if max_chars is not None and length > max_chars:
+            break
+    return ' '.join(tokens)
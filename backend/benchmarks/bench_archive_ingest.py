@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+Offline mbox ingestion: parse throughput per worker count and parent memory vs archive size.
+
+Writes synthetic Takeout-style mbox files: plain, HTML-only, multipart/alternative with a PDF
+attachment, RFC 2047 encoded subjects, and some messages without a Message-ID. For each size and
+worker count it runs the ingest_archive parse stage (mmap span scan, worker parsing,
+parser.extract_text) and reports messages/s and the parent's peak Python heap (tracemalloc). The
+heap should not grow with the archive. With 0 workers the parsing itself is traced, which makes
+that row's rate a few times slower than untraced. It also checks that every message came through
+and that a few planted messages were extracted like the Gmail path would. --classify also runs
+the full import (classification + save) into a temp DB.
+
+Usage: python benchmarks/bench_archive_ingest.py [--sizes 5000,50000] [--workers 0,2,4] [--classify]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from email.message import EmailMessage
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# Spawned parser processes inherit the parent's DB through the environment
+if "EMAILS_DB_FILE" not in os.environ:
+    _tmp = tempfile.mkdtemp(prefix="bench_archive_")
+    os.environ["EMAILS_DB_FILE"] = os.path.join(_tmp, "emails.db")
+
+WORDS = ("meeting agenda invoice project deadline dinner weekend sale discount offer winner prize "
+         "course lecture exam report review client family party coupon").split()
+ATTACHMENT = os.urandom(48 * 1024)
+
+
+def make_message(i: int, rng) -> EmailMessage:
+    msg = EmailMessage()
+    kind = i % 4
+    text = " ".join(rng.choices(WORDS, k=rng.randint(20, 200)))
+    msg["Subject"] = f"Réunion {i} – {rng.choice(WORDS)}" if kind == 3 else f"Message {i} {rng.choice(WORDS)}"
+    msg["From"] = "sender@example.com"
+    msg["To"] = "me@example.com"
+    msg["Date"] = format_datetime(datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i))
+    if i % 50 != 7:
+        msg["Message-ID"] = f"<bench-{i}@example.com>"
+    if kind == 1:
+        msg.set_content(f"<html><body><p>{text}</p><style>.x{{}}</style></body></html>", subtype="html")
+    else:
+        msg.set_content(text)
+        if kind == 2:
+            msg.add_alternative(f"<p>{text}</p>", subtype="html")
+            msg.add_attachment(ATTACHMENT, maintype="application", subtype="pdf", filename="report.pdf")
+    return msg
+
+
+def write_mbox(path: str, n: int, seed: int = 5):
+    rng = random.Random(seed)
+    with open(path, "wb") as f:
+        for i in range(n):
+            f.write(b"From 1234567890@xxx Mon Jan 01 00:00:00 +0000 2024\n")
+            f.write(make_message(i, rng).as_bytes().replace(b"\r\n", b"\n"))
+            f.write(b"\n")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="5000,50000")
+    ap.add_argument("--workers", default="0,2,4")
+    ap.add_argument("--classify", action="store_true", help="Also run the full import into a temp DB")
+    args = ap.parse_args()
+
+    from app.commands.ingest_archive import ingest, iter_parsed
+    tmp = os.path.dirname(os.environ["EMAILS_DB_FILE"])
+    ok = True
+    heaps = {}
+    print(f"{'messages':>9} {'MB':>7} {'workers':>8} {'messages/s':>11} {'heap MB':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        path = os.path.join(tmp, f"takeout-{size}.mbox")
+        write_mbox(path, size)
+        megabytes = os.path.getsize(path) / 1e6
+        for workers in (int(w) for w in args.workers.split(",")):
+            tracemalloc.start()
+            start = time.perf_counter()
+            seen, failed, planted = 0, 0, {}
+            for parsed, bad in iter_parsed([path], workers):
+                seen += len(parsed)
+                failed += bad
+                for item in parsed:
+                    if item[6] in ("<bench-0@example.com>", "<bench-1@example.com>", "<bench-2@example.com>",
+                                   "<bench-3@example.com>"):
+                        planted[item[6]] = item
+            rate = (seen + failed) / (time.perf_counter() - start)
+            heap = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+            heaps.setdefault(workers, []).append(heap)
+            ok &= seen == size and failed == 0
+            plain, html, attached, encoded = (planted.get(f"<bench-{k}@example.com>") for k in range(4))
+            ok &= bool(plain and html and attached and encoded)
+            if ok:
+                ok &= "<" not in html[2] and ".x{" not in html[2] and html[2].strip() != ""  # Visible text only
+                ok &= "report.pdf" not in attached[2] and "%PDF" not in attached[2] and len(attached[2]) < 4000
+                ok &= encoded[1].startswith("Réunion 3") and plain[5] == datetime(2024, 1, 1)
+            print(f"{size:>9} {megabytes:>7.0f} {workers:>8} {rate:>11.0f} {heap:>8.1f}")
+    for workers, values in heaps.items():
+        ok &= max(values) < 2 * min(values) + 5  # Flat as the archive grows
+
+    if args.classify:
+        from app.database.db import init_db
+        init_db()
+        path = os.path.join(tmp, f"takeout-{args.sizes.split(',')[0]}.mbox")
+        report = ingest([path], workers=max(int(w) for w in args.workers.split(",")))
+        print(f"full import: {report['messages_per_second']:.0f} messages/s, {report['saved']} saved")
+        again = ingest([path], workers=0)
+        ok &= report["failed"] == 0 and again["saved"] == 0  # Re-running skips stored messages
+    print("checks:", "ok" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Throughput of EmailClassifier.predict_with_confidence at different batch sizes (CPU only).
+
+Usage: python benchmarks/bench_classifier_batch.py [--emails 128] [--batch-sizes 1,8,32,128]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Force CPU before torch is imported
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+SAMPLE_SENTENCES = [
+    "meeting agenda review team call tomorrow",
+    "limited time offer get premium upgrade today",
+    "security alert verify account now suspended",
+    "assignment deadline extended course materials uploaded",
+    "dinner saturday family birthday celebration",
+    "quarterly report attached please review numbers before friday",
+    "exclusive deal black friday sale ends midnight",
+]
+
+
+def make_corpus(n: int, seed: int = 7):
+    """Mixed short and long emails so length bucketing has something to do."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n):
+        repeats = rng.choice([1, 1, 2, 4, 8])
+        corpus.append(" ".join(rng.choice(SAMPLE_SENTENCES) for _ in range(repeats)))
+    return corpus
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--emails", type=int, default=128)
+    ap.add_argument("--batch-sizes", default="1,8,32,128")
+    args = ap.parse_args()
+
+    from app.services.classifier import EmailClassifier
+
+    clf = EmailClassifier()
+    corpus = make_corpus(args.emails)
+    clf.predict_with_confidence(corpus[:2])  # Warm-up
+
+    print(f"{'batch':>6} {'emails':>7} {'seconds':>9} {'emails/sec':>11}")
+    for bs in [int(b) for b in args.batch_sizes.split(",")]:
+        clf.batch_size = bs
+        start = time.perf_counter()
+        clf.predict_with_confidence(corpus)
+        elapsed = time.perf_counter() - start
+        print(f"{bs:>6} {len(corpus):>7} {elapsed:>9.2f} {len(corpus) / elapsed:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
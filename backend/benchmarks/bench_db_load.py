@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""
+SQLite load test: the legacy engine (QueuePool 20+30, pre_ping, rollback journal, one pool for
+everything) against the sqlite_config profile (WAL + pragmas, one writer connection, reader pool).
+
+Simulates the DB side of concurrent /pull calls (existence lookup, 20-row upsert, recent-page read)
+alongside Pub/Sub notification bursts (enqueue a history job, read queue depth), and reports
+throughput and p50/p99 latency for reads and writes, plus "database is locked" errors.
+
+Usage: python benchmarks/bench_db_load.py [--seconds 10] [--pull-clients 8] [--burst-threads 16]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+_tmp = tempfile.mkdtemp(prefix="bench_load_")
+os.environ["EMAILS_DB_FILE"] = os.path.join(_tmp, "unused.db")
+
+
+def legacy_engines(url: str):
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import QueuePool
+    engine = create_engine(url, poolclass=QueuePool, pool_size=20, max_overflow=30, pool_timeout=60,
+                           pool_pre_ping=True)
+    return engine, engine
+
+
+def tuned_engines(url: str):
+    from app.database.sqlite_config import build_engines
+    return build_engines(url)
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def timed(self, kind: str, fn):
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            with self.lock:
+                self.errors[f"{kind}: {type(e).__name__}"] += 1
+            return
+        with self.lock:
+            self.latencies[kind].append(time.perf_counter() - start)
+
+
+def pull_client(stop, rec, write_session, read_session, client: int):
+    from sqlalchemy import select
+    from app.database.db import EmailRecord, email_row, existing_message_ids, save_email_records
+    rng = random.Random(client)
+    n = 0
+    while not stop.is_set():
+        ids = [f"c{client}-{rng.randint(0, n + 20):07d}" for _ in range(20)]
+
+        def lookup():
+            s = read_session()
+            try:
+                existing_message_ids(s, ids)
+            finally:
+                s.close()
+
+        def upsert():
+            s = write_session()
+            try:
+                save_email_records(s, [email_row(m, "Subject", "body " * 80, "combined", "cleaned", "business", 0.9)
+                                       for m in ids])
+            finally:
+                s.close()
+
+        def page():
+            s = read_session()
+            try:
+                s.execute(select(EmailRecord.id, EmailRecord.subject).order_by(EmailRecord.id.desc()).limit(20)).all()
+            finally:
+                s.close()
+
+        rec.timed("read", lookup)
+        rec.timed("write", upsert)
+        rec.timed("read", page)
+        n += 20
+
+
+def notification_burst(stop, rec, write_session, read_session):
+    from sqlalchemy import func, select
+    from app.database.db import SyncJob
+
+    def enqueue():
+        s = write_session()
+        try:
+            s.add(SyncJob(kind="history", payload="123", status="pending"))
+            s.commit()
+        finally:
+            s.close()
+
+    def depth():
+        s = read_session()
+        try:
+            s.execute(select(SyncJob.kind, func.count()).where(SyncJob.status == "pending").group_by(SyncJob.kind)).all()
+        finally:
+            s.close()
+
+    while not stop.is_set():
+        rec.timed("write", enqueue)
+        rec.timed("read", depth)
+        time.sleep(random.random() * 0.01)  # Bursty, not a tight loop
+
+
+def pct(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_profile(name, make_engines, args):
+    from sqlalchemy.orm import sessionmaker
+    from app.database.db import Base
+
+    url = f"sqlite:///{os.path.join(_tmp, name + '.db')}"
+    writer, reader = make_engines(url)
+    Base.metadata.create_all(writer)
+    write_session = sessionmaker(bind=writer)
+    read_session = sessionmaker(bind=reader)
+
+    rec = Recorder()
+    stop = threading.Event()
+    threads = [threading.Thread(target=pull_client, args=(stop, rec, write_session, read_session, i))
+               for i in range(args.pull_clients)]
+    threads += [threading.Thread(target=notification_burst, args=(stop, rec, write_session, read_session))
+                for _ in range(args.burst_threads)]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    writer.dispose()
+    reader.dispose()
+
+    for kind in ("read", "write"):
+        lat = rec.latencies[kind]
+        print(f"{name:>8} {kind:>6} {len(lat) / args.seconds:>9.0f} {pct(lat, 0.5) * 1000:>9.2f} "
+              f"{pct(lat, 0.99) * 1000:>9.2f} {max(lat, default=0) * 1000:>9.1f}")
+    for err, count in sorted(rec.errors.items()):
+        print(f"{name:>8}  error  {err} x{count}")
+    return rec
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--pull-clients", type=int, default=8)
+    ap.add_argument("--burst-threads", type=int, default=16)
+    args = ap.parse_args()
+
+    print(f"{'profile':>8} {'op':>6} {'ops/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    run_profile("legacy", legacy_engines, args)
+    tuned = run_profile("tuned", tuned_engines, args)
+    sys.exit(0 if not tuned.errors else 1)
+
+
+if __name__ == "__main__":
+    main()
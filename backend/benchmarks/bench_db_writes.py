@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+Email persistence throughput: the old per-row save (add + commit + refresh per email) against
+save_email_records (one upsert transaction per batch), for batches of 1, 100 and 10k emails.
+Also times the "which ids already exist" check: one query per id vs existing_message_ids.
+
+Runs on a throwaway SQLite file (EMAILS_DB_FILE), never on data/emails.db.
+
+Usage: python benchmarks/bench_db_writes.py [--batches 1,100,10000] [--rows 10000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+_tmp = tempfile.mkdtemp(prefix="bench_db_")
+os.environ["EMAILS_DB_FILE"] = os.path.join(_tmp, "emails.db")
+
+
+def make_rows(prefix: str, n: int):
+    from app.database.db import email_row
+    body = "Quarterly report attached, please review before Friday's meeting. " * 8
+    return [
+        email_row(f"{prefix}-{i:06d}", f"Subject {i}", body, f"Subject {i}\n\n{body}", "quarterly report review",
+                  "business", 0.91)
+        for i in range(n)
+    ]
+
+
+def old_save_email_record(session, row):
+    """db.save_email_record before the bulk API: one transaction (and fsync) per email."""
+    from app.database.db import EmailRecord
+    rec = EmailRecord(**row)
+    session.add(rec)
+    session.commit()
+    session.refresh(rec)
+    return rec
+
+
+def run(label: str, rows, batch: int, save_batch) -> float:
+    from app.database.db import SessionLocal
+    session = SessionLocal()
+    try:
+        start = time.perf_counter()
+        for i in range(0, len(rows), batch):
+            save_batch(session, rows[i:i + batch])
+        elapsed = time.perf_counter() - start
+    finally:
+        session.close()
+    rate = len(rows) / elapsed
+    print(f"{batch:>8} {label:>10} {len(rows):>8} {elapsed:>9.3f} {rate:>12.0f}")
+    return rate
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batches", default="1,100,10000")
+    ap.add_argument("--rows", type=int, default=10000, help="Emails written per batch size (at least one batch)")
+    ap.add_argument("--per-row-cap", type=int, default=2000,
+                    help="Emails for the slow per-row path (it gets slower as the session grows)")
+    args = ap.parse_args()
+
+    from app.database.db import SessionLocal, init_db, save_email_records, existing_message_ids, EmailRecord
+    init_db()
+
+    print(f"{'batch':>8} {'impl':>10} {'rows':>8} {'seconds':>9} {'inserts/s':>12}")
+    for batch in (int(b) for b in args.batches.split(",")):
+        n = max(batch, args.rows)
+        old_n = min(n, args.per_row_cap)  # Per-row cost doesn't depend on batch size, only on row count
+        old = run("per-row", make_rows(f"old{batch}", old_n), batch,
+                  lambda s, chunk: [old_save_email_record(s, r) for r in chunk])
+        new = run("bulk", make_rows(f"new{batch}", n), batch, save_email_records)
+        print(f"{'':>8} {'speedup':>10} x{new / old:.1f}")
+
+    # Re-saving the same batch must update in place, not duplicate
+    session = SessionLocal()
+    try:
+        again = make_rows("new100", 100)
+        save_email_records(session, again)
+        dupes = session.query(EmailRecord).filter(EmailRecord.message_id == "new100-000000").count()
+
+        ids = [r["message_id"] for r in make_rows("new100", 5000)]
+        start = time.perf_counter()
+        per_id = sum(1 for m in ids if session.query(EmailRecord.id).filter_by(message_id=m).first())
+        t_per_id = time.perf_counter() - start
+        start = time.perf_counter()
+        bulk = len(existing_message_ids(session, ids))
+        t_bulk = time.perf_counter() - start
+    finally:
+        session.close()
+    print(f"exists check for {len(ids)} ids: per-id {t_per_id * 1000:.1f} ms, bulk {t_bulk * 1000:.1f} ms "
+          f"(found {per_id} / {bulk})")
+    print(f"rows for a re-saved message_id: {dupes}")
+    sys.exit(0 if dupes == 1 and per_id == bulk else 1)
+
+
+if __name__ == "__main__":
+    main()
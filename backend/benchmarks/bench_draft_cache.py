@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+"""
+Reply-draft cache against a local stub LLM (fixed latency, counts calls).
+
+Replays a /reply workload where most requests repeat an earlier email (dashboard retries,
+automated senders, re-formatted or re-quoted copies) from a pool of worker threads, once
+without the cache and once through DraftCache, then fires a burst of identical concurrent
+requests to check single-flight. Reports LLM calls made, hit rate, latency and the estimated
+cost saved.
+
+Usage: python benchmarks/bench_draft_cache.py [--requests 400] [--unique 60] [--workers 8]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+_tmp = tempfile.mkdtemp(prefix="bench_draft_cache_")
+os.environ["EMAILS_DB_FILE"] = os.path.join(_tmp, "emails.db")
+
+STUB_CALLS = [0]
+STUB_LATENCY = [0.3]
+STUB_LOCK = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with STUB_LOCK:
+            STUB_CALLS[0] += 1
+        time.sleep(STUB_LATENCY[0])
+        data = json.dumps({"choices": [{"message": {"content": "Thanks, I'll review it and reply by Friday."}}]})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data.encode())
+
+
+def variant(rng, text: str) -> str:
+    """The same email as it reaches /reply again: re-wrapped, re-cased or with quoted history."""
+    choice = rng.randrange(4)
+    if choice == 1:
+        return "  " + text.replace(" ", "\n", 3).upper()
+    if choice == 2:
+        return f"{text}\n\nOn Mon, Jan 6, 2025 at 9:00 AM Alice <a@example.com> wrote:\n> earlier thread\n> more"
+    return text
+
+
+def workload(n: int, unique: int, rng):
+    emails = [f"Hi, can we move the quarterly review for project {i} to Thursday? Agenda attached."
+              for i in range(unique)]
+    items = []
+    for i in range(n):
+        base = emails[i] if i < unique else rng.choice(emails)  # Every email shows up at least once
+        items.append((variant(rng, base), rng.choice(("business", "personal"))))
+    rng.shuffle(items)
+    return items
+
+
+def replay(items, workers: int, draft_fn):
+    latencies = []
+    lock = threading.Lock()
+
+    def one(item):
+        start = time.perf_counter()
+        draft_fn(*item)
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    STUB_CALLS[0] = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(one, items))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {"wall": wall, "calls": STUB_CALLS[0], "p50": latencies[len(latencies) // 2] * 1000,
+            "p90": latencies[int(len(latencies) * 0.9)] * 1000}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=400)
+    ap.add_argument("--unique", type=int, default=60)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--latency-ms", type=float, default=300)
+    args = ap.parse_args()
+
+    STUB_LATENCY[0] = args.latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update(OPENAI_BASE_URL=f"http://127.0.0.1:{server.server_address[1]}/v1", OPENAI_API_KEY="stub")
+
+    from app.database.db import init_db
+    from app.services.draft_cache import DraftCache, normalize_email_text
+    from app.services.llm_client import LLMClient
+    init_db()
+
+    client = LLMClient(providers=["openai"], max_concurrency=args.workers, rate_per_minute=1e6, burst=args.workers)
+    cache = DraftCache()
+
+    def uncached(email_text, label):
+        return client.generate("You are an email assistant.", email_text)[0]
+
+    def cached(email_text, label):
+        tone = "professional" if label == "business" else "friendly"
+        return cache.get_or_generate(email_text, label, tone, client.model_id(), len(email_text),
+                                     lambda: client.generate("You are an email assistant.", email_text))[0]
+
+    items = workload(args.requests, args.unique, random.Random(5))
+    expected_calls = len({(normalize_email_text(text), label) for text, label in items})
+    before = replay(items, args.workers, uncached)
+    after = replay(items, args.workers, cached)
+    stats = cache.stats()
+
+    print(f"{args.requests} /reply requests, {args.unique} distinct emails, {args.workers} workers, "
+          f"{args.latency_ms:.0f} ms LLM latency")
+    print(f"{'':>9} {'LLM calls':>9} {'wall s':>7} {'p50 ms':>8} {'p90 ms':>8}")
+    for name, r in (("no cache", before), ("cache", after)):
+        print(f"{name:>9} {r['calls']:>9} {r['wall']:>7.2f} {r['p50']:>8.1f} {r['p90']:>8.1f}")
+    print(f"hit rate {stats['hit_rate']:.1%} (hits {stats['hits']}, coalesced {stats['coalesced']}, "
+          f"misses {stats['misses']}), saved ~${stats['saved_usd']:.5f} and {stats['saved_seconds']:.0f}s of LLM time")
+
+    # Single-flight: a burst of identical requests while nothing is cached yet
+    STUB_CALLS[0] = 0
+    burst = [("Brand new email nobody has seen, please confirm the delivery date.", "business")] * 20
+    with ThreadPoolExecutor(20) as pool:
+        drafts = list(pool.map(lambda item: cached(*item), burst))
+    burst_calls = STUB_CALLS[0]
+    print(f"burst of 20 identical concurrent requests: {burst_calls} LLM call, "
+          f"{cache.stats()['coalesced'] - stats['coalesced']} coalesced")
+    server.shutdown()
+
+    ok = (after["calls"] == expected_calls and burst_calls == 1 and len(set(drafts)) == 1
+          and before["calls"] == args.requests)
+    print("checks:", "ok" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
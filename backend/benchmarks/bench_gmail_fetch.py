@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+"""
+Round trips and bytes for pulling N messages: per-message format=full gets vs batched partial fetches.
+
+Runs against a local fake Gmail HTTP server (messages.get + the batch endpoint, with `fields`
+partial responses and optional injected 429s on batch sub-requests), so no credentials are needed.
+
+Usage: python benchmarks/bench_gmail_fetch.py [--messages 100] [--fail-rate 0.05]
+"""
+import argparse
+import base64
+import email
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def _b64(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")
+
+
+def make_message(i: int, rng: random.Random) -> dict:
+    """Roughly the shape Gmail returns for format=full: many headers, plain + html + attachment."""
+    plain = " ".join(rng.choice(["meeting", "invoice", "offer", "team", "update", "review"]) for _ in range(300))
+    html = "<html><body>" + "".join(f"<p style='color:#333'>{plain[j:j + 80]}</p>" for j in range(0, len(plain), 80)) + "</body></html>"
+    headers = [{"name": "Received", "value": f"from mx{k}.example.com by mx.google.com; {time.ctime()}"} for k in range(12)]
+    headers += [
+        {"name": "Subject", "value": f"Message {i}"},
+        {"name": "From", "value": "Sender <sender@example.com>"},
+        {"name": "To", "value": "me@example.com"},
+        {"name": "DKIM-Signature", "value": "v=1; a=rsa-sha256; " + "x" * 400},
+    ]
+    return {
+        "id": f"m{i:04d}", "threadId": f"t{i:04d}", "labelIds": ["INBOX", "UNREAD", "CATEGORY_UPDATES"],
+        "snippet": plain[:120], "historyId": str(1000 + i), "internalDate": "1700000000000", "sizeEstimate": 48000,
+        "payload": {
+            "partId": "", "mimeType": "multipart/mixed", "filename": "", "headers": headers, "body": {"size": 0},
+            "parts": [
+                {"partId": "0", "mimeType": "multipart/alternative", "filename": "", "headers": [], "body": {"size": 0},
+                 "parts": [
+                     {"partId": "0.0", "mimeType": "text/plain", "filename": "", "headers": [],
+                      "body": {"size": len(plain), "data": _b64(plain)}},
+                     {"partId": "0.1", "mimeType": "text/html", "filename": "", "headers": [],
+                      "body": {"size": len(html), "data": _b64(html)}},
+                 ]},
+                {"partId": "1", "mimeType": "application/pdf", "filename": "report.pdf",
+                 "headers": [{"name": "Content-Type", "value": "application/pdf"}],
+                 "body": {"size": 250000, "attachmentId": "ANGjdJ" + "a" * 300}},
+            ],
+        },
+    }
+
+
+def parse_fields(spec: str) -> dict:
+    """Parse Google partial-response syntax (a,b(c,d),e/f) into {name: subtree or None}."""
+    def parse(s, pos):
+        tree, name = {}, ""
+        while pos < len(s):
+            ch = s[pos]
+            if ch == ",":
+                if name:
+                    _add(tree, name, None)
+                name = ""
+            elif ch == "(":
+                sub, pos = parse(s, pos + 1)
+                _add(tree, name, sub)
+                name = ""
+            elif ch == ")":
+                if name:
+                    _add(tree, name, None)
+                return tree, pos
+            else:
+                name += ch
+            pos += 1
+        if name:
+            _add(tree, name, None)
+        return tree, pos
+
+    def _add(tree, path, sub):
+        head, _, rest = path.partition("/")
+        if rest:
+            node = tree.setdefault(head, {}) or {}
+            tree[head] = node
+            _add(node, rest, sub)
+        else:
+            tree[head] = sub
+
+    return parse(spec, 0)[0]
+
+
+def apply_fields(obj, tree):
+    if tree is None:
+        return obj
+    if isinstance(obj, list):
+        return [apply_fields(x, tree) for x in obj]
+    if isinstance(obj, dict):
+        return {k: apply_fields(obj[k], sub) for k, sub in tree.items() if k in obj}
+    return obj
+
+
+class FakeGmail:
+    def __init__(self, n: int, fail_rate: float, seed: int = 3):
+        rng = random.Random(seed)
+        self.messages = {m["id"]: m for m in (make_message(i, rng) for i in range(n))}
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed + 1)
+        self.round_trips = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.lock = threading.Lock()
+
+    def reset(self):
+        self.round_trips = self.bytes_in = self.bytes_out = 0
+
+    def get_message(self, path: str, query: dict, in_batch: bool):
+        msg_id = path.rstrip("/").split("/")[-1]
+        msg = self.messages.get(msg_id)
+        if msg is None:
+            return 404, {"error": {"code": 404, "message": "Not Found"}}
+        if in_batch and self.rng.random() < self.fail_rate:
+            return 429, {"error": {"code": 429, "message": "Rate Limit Exceeded"}}
+        if "fields" in query:
+            msg = apply_fields(msg, parse_fields(query["fields"][0]))
+        return 200, msg
+
+
+def make_handler(fake: FakeGmail):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            with fake.lock:
+                fake.bytes_out += len(body)
+
+        def do_GET(self):
+            with fake.lock:
+                fake.round_trips += 1
+            url = urlparse(self.path)
+            status, payload = fake.get_message(url.path, parse_qs(url.query), in_batch=False)
+            self._send(status, json.dumps(payload).encode(), "application/json")
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            raw = self.rfile.read(length)
+            with fake.lock:
+                fake.round_trips += 1
+                fake.bytes_in += length
+            envelope = email.message_from_bytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + raw
+            )
+            boundary = "batch_fake_boundary"
+            out = []
+            for part in envelope.get_payload():
+                request_line = part.get_payload().lstrip().splitlines()[0]
+                _, target, _ = request_line.split(" ", 2)
+                url = urlparse(target)
+                status, payload = fake.get_message(url.path, parse_qs(url.query), in_batch=True)
+                body = json.dumps(payload)
+                content_id = part["Content-ID"].replace("<", "<response-", 1)
+                out.append(
+                    f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n{body}\r\n"
+                )
+            out.append(f"--{boundary}--\r\n")
+            self._send(200, "".join(out).encode(), f"multipart/mixed; boundary={boundary}")
+
+    return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=100)
+    ap.add_argument("--fail-rate", type=float, default=0.05, help="Share of batch sub-requests answered with 429")
+    args = ap.parse_args()
+
+    import httplib2
+    from googleapiclient.discovery import build
+    from app.services import gmail_service
+
+    fake = FakeGmail(args.messages, args.fail_rate)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(fake))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}/"
+    service = build("gmail", "v1", http=httplib2.Http(), static_discovery=True,
+                    client_options={"api_endpoint": base})
+    ids = sorted(fake.messages)
+
+    fake.reset()
+    start = time.perf_counter()
+    before = {m: gmail_service.get_message_full(service, m) for m in ids}
+    t_before = time.perf_counter() - start
+    rt_before, up_before, down_before = fake.round_trips, fake.bytes_in, fake.bytes_out
+
+    fake.reset()
+    start = time.perf_counter()
+    after = gmail_service.get_messages_batch(service, ids, batch_uri=base + "batch/gmail/v1")
+    t_after = time.perf_counter() - start
+    rt_after, up_after, down_after = fake.round_trips, fake.bytes_in, fake.bytes_out
+    server.shutdown()
+
+    same = all(
+        gmail_service.extract_subject_body_from_msg(before[m]) == gmail_service.extract_subject_body_from_msg(after[m])
+        for m in ids
+    )
+    print(f"{'mode':>18} {'round trips':>12} {'bytes up':>10} {'bytes down':>11} {'seconds':>8}")
+    print(f"{'per-message full':>18} {rt_before:>12} {up_before:>10} {down_before:>11} {t_before:>8.3f}")
+    print(f"{'batched partial':>18} {rt_after:>12} {up_after:>10} {down_after:>11} {t_after:>8.3f}")
+    print(f"fetched {len(after)}/{len(ids)} messages; subject/body identical: {same}")
+    sys.exit(0 if same and len(after) == len(ids) else 1)
+
+
+if __name__ == "__main__":
+    main()
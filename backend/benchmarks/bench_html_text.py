@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+HTML-to-text for Gmail payloads: the old regex path (top-level parts only, `<[^<]+?>` strip, then the
+parser's own regexes) against app.utils.html_text (recursive MIME walk, visible text only, entities
+decoded, early stop), on real-world-shaped fixtures.
+
+Reports time, peak memory, leakage in the classified text (CSS/JS fragments, undecoded entities) and
+whether the fixture's real content made it in at all (old path: nested parts missed, attachments used).
+
+Usage: python benchmarks/bench_html_text.py [--repeat 5]
+"""
+import argparse
+import base64
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_preprocess import old_extract_text, sentence  # noqa: E402
+
+CSS_JS_RE = re.compile(r"\{|\}|font-family|mso-|function\s*\(|var \w+ ?=|@media")
+ENTITY_RE = re.compile(r"&(#\d+|#x[0-9a-f]+|[a-z]+);", re.IGNORECASE)
+
+
+def _b64(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")
+
+
+def _part(mime_type: str, text: str = "", parts=None, filename: str = "") -> dict:
+    part = {"mimeType": mime_type, "filename": filename, "body": {"data": _b64(text)} if text else {}}
+    if parts:
+        part["parts"] = parts
+    return part
+
+
+def _message(subject: str, payload: dict, snippet: str) -> dict:
+    payload["headers"] = [{"name": "Subject", "value": subject}, {"name": "From", "value": "news@example.com"}]
+    return {"id": subject, "snippet": snippet, "payload": payload}
+
+
+def newsletter_html(rng: random.Random) -> str:
+    """Marketing mail: big <style> block, MSO conditionals, layout tables, entities, tracking pixel."""
+    css = "".join(f".c{i}{{font-family:Arial,sans-serif;color:#{i:06x};mso-line-height-rule:exactly}}\n"
+                  for i in range(600))
+    rows = "".join(
+        f"<tr><td class='c{i}' style='padding:8px'>{sentence(rng)} Don&#8217;t miss it &amp; save&nbsp;20%."
+        f"</td></tr>\n" for i in range(40)
+    )
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Weekly deals</title>"
+        f"<style type='text/css'>{css}@media (max-width:600px){{.c1{{width:100%}}}}</style>"
+        "<!--[if mso]><xml><o:OfficeDocumentSettings><o:PixelsPerInch>96</o:PixelsPerInch>"
+        "</o:OfficeDocumentSettings></xml><![endif]--></head><body>"
+        f"<table role='presentation' width='100%'>{rows}</table>"
+        "<img src='https://t.example.com/open.gif?id=1' width='1' height='1' alt=''>"
+        "<p>Unsubscribe &middot; &copy; 2024 Example Inc.</p></body></html>"
+    )
+
+
+def receipt_html(rng: random.Random) -> str:
+    """Transactional mail: inline script, itemised table, entity-heavy prices."""
+    items = "".join(f"<tr><td>Item {i}</td><td>&euro;{rng.randint(1, 99)}.00</td></tr>" for i in range(30))
+    return (
+        "<html><head><script>function track(){var x=document.cookie;return x;}</script></head><body>"
+        f"<h1>Thanks for your order</h1><p>{sentence(rng)}</p><table>{items}</table>"
+        "<p>Questions? Contact support@example.com</p></body></html>"
+    )
+
+
+def malformed_html(rng: random.Random) -> str:
+    """Broken markup: unclosed tags, stray '<', a tag missing its '>', script with markup inside."""
+    text = " ".join(sentence(rng) for _ in range(30))
+    return ("<html><body><div><p>Your ticket is confirmed. <b>" + text.replace(". ", ". <i>")
+            + " a < b <<< c <br <p>" + "<script><!-- var s = '<div>' + '</p>';</script><p>"
+            + " ".join(sentence(rng) for _ in range(10)) + "</body>")
+
+
+def big_html(rng: random.Random, megabytes: float = 5.0) -> str:
+    block = newsletter_html(rng)
+    return block * max(1, int(megabytes * 1024 * 1024 / len(block)))
+
+
+def fixtures(rng: random.Random):
+    news, receipt = newsletter_html(rng), receipt_html(rng)
+    return [
+        # multipart/alternative with html only, at the top level (the case the old code handled)
+        ("newsletter (top-level html)", "miss it & save",
+         _message("Deals", _part("multipart/alternative", parts=[_part("text/html", news)]), "Weekly deals")),
+        # mixed > related > alternative > html, plus a text/plain *attachment* that must not become the body
+        ("receipt (html 3 levels deep)", "Thanks for your order",
+         _message("Receipt", _part("multipart/mixed", parts=[
+             _part("multipart/related", parts=[
+                 _part("multipart/alternative", parts=[_part("text/html", receipt)]),
+                 _part("image/png", filename="logo.png"),
+             ]),
+             _part("text/plain", "order-id,amount\n1,9.99\n", filename="order.csv"),
+         ]), "Thanks for your order")),
+        ("malformed (top-level html)", "ticket is confirmed",
+         _message("Broken", _part("multipart/alternative", parts=[_part("text/html", malformed_html(rng))]), "Broken")),
+        ("5MB newsletter (single part)", "miss it & save",
+         _message("Huge", _part("text/html", big_html(rng)), "Huge")),
+    ]
+
+
+def old_extract_subject_body(msg: dict):
+    """gmail_service.extract_subject_body_from_msg before the recursive walk / HTML rendering."""
+    from app.services.gmail_service import _get_header, decode_base64_data
+    payload = msg.get("payload", {})
+    subject = _get_header(payload.get("headers", []), "Subject")
+    body = ""
+    if payload.get("body", {}).get("data"):
+        body = decode_base64_data(payload["body"]["data"])
+    else:
+        for part in payload.get("parts", []) or []:
+            mime_type = part.get("mimeType", "")
+            if mime_type == "text/plain":
+                body = decode_base64_data(part.get("body", {}).get("data", ""))
+                break
+            if mime_type == "text/html" and not body:
+                html = decode_base64_data(part.get("body", {}).get("data", ""))
+                body = re.sub("<[^<]+?>", "", html)
+    if not body:
+        body = msg.get("snippet", "")
+    return subject, body
+
+
+def old_pipeline(msg):
+    subject, body = old_extract_subject_body(msg)
+    return body, old_extract_text(subject, body)
+
+
+def new_pipeline(msg):
+    from app.services.gmail_service import extract_subject_body_from_msg
+    from app.services.parser import extract_text
+    subject, body = extract_subject_body_from_msg(msg)
+    return body, extract_text(subject, body)
+
+
+def measure(fn, msg, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(msg)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(msg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, best, peak
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    rng = random.Random(12)
+    print(f"{'fixture':>30} {'impl':>7} {'best ms':>9} {'peak KiB':>9} {'css/js':>7} {'entities':>9} {'content':>8}")
+    ok = True
+    for name, expect, msg in fixtures(rng):
+        repeat = 1 if "5MB" in name else args.repeat
+        for impl, fn in (("regex", old_pipeline), ("html", new_pipeline)):
+            (body, (combined, cleaned)), best, peak = measure(fn, msg, repeat)
+            leaks = len(CSS_JS_RE.findall(combined))
+            entities = len(ENTITY_RE.findall(combined))
+            found = expect in combined
+            print(f"{name:>30} {impl:>7} {best * 1000:>9.2f} {peak / 1024:>9.0f} {leaks:>7} {entities:>9} {str(found):>8}")
+            if impl == "html":
+                ok &= leaks == 0 and entities == 0 and found
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Latency, throughput, resident memory and parity of INFERENCE_BACKEND=eager/quantized/onnx.
+
+Each backend runs in its own subprocess so RSS numbers are not polluted by the others.
+Parity is measured against "eager"; the script exits non-zero if a backend falls outside
+the tolerance in app/services/inference_backend.py.
+
+Usage: python benchmarks/bench_inference_backends.py [--emails 64] [--backends eager,quantized,onnx]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def run_worker(backend: str, emails: int):
+    """Runs inside the subprocess: load models on the given backend and measure."""
+    os.environ["INFERENCE_BACKEND"] = backend
+    from bench_classifier_batch import make_corpus
+    from app.services.classifier import EmailClassifier
+
+    corpus = make_corpus(emails)
+    clf = EmailClassifier()
+    load_start = time.perf_counter()
+    clf.warm_up()
+    load_seconds = time.perf_counter() - load_start
+
+    latencies = []
+    for text in corpus[:16]:
+        start = time.perf_counter()
+        clf.predict_with_confidence([text])
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    start = time.perf_counter()
+    preds = clf.predict_with_confidence(corpus)
+    throughput = len(corpus) / (time.perf_counter() - start)
+
+    print(json.dumps({
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "p50_ms": 1000 * latencies[len(latencies) // 2],
+        "throughput": throughput,
+        "rss_mb": rss_mb(),
+        "preds": [[p[0], p[1]] for p in preds],
+    }))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--emails", type=int, default=64)
+    ap.add_argument("--backends", default="eager,quantized,onnx")
+    ap.add_argument("--worker", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.emails)
+        return
+
+    from app.services.inference_backend import PARITY_MIN_LABEL_AGREEMENT, PARITY_MAX_MEAN_SCORE_DELTA
+
+    results = {}
+    for backend in args.backends.split(","):
+        out = subprocess.run(
+            [sys.executable, __file__, "--worker", backend, "--emails", str(args.emails)],
+            capture_output=True, text=True,
+        )
+        if out.returncode != 0:
+            print(f"{backend}: failed\n{out.stderr.strip()[-2000:]}")
+            continue
+        results[backend] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    print(f"{'backend':>10} {'load s':>7} {'p50 ms':>8} {'emails/s':>9} {'RSS MB':>8} {'agree':>6} {'Δscore':>7}")
+    ok = True
+    ref = results.get("eager")
+    for backend, r in results.items():
+        agree, delta = 1.0, 0.0
+        if ref and backend != "eager":
+            pairs = list(zip(ref["preds"], r["preds"]))
+            agree = sum(a[0] == b[0] for a, b in pairs) / len(pairs)
+            delta = sum(abs(a[1] - b[1]) for a, b in pairs) / len(pairs)
+            ok &= agree >= PARITY_MIN_LABEL_AGREEMENT and delta <= PARITY_MAX_MEAN_SCORE_DELTA
+        print(f"{backend:>10} {r['load_seconds']:>7.1f} {r['p50_ms']:>8.1f} {r['throughput']:>9.2f} "
+              f"{r['rss_mb']:>8.0f} {agree:>6.3f} {delta:>7.4f}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Reply generation against a local stub of the OpenAI and Gemini REST APIs that adds latency and
+rate-limits OpenAI (429 + Retry-After once a per-second budget is used up).
+
+Compares the old /reply path (requests.post per call, time.sleep(20 * (attempt + 1)) on a rate
+limit, scaled by --sleep-scale so the run stays short) with app.services.llm_client from a pool
+of worker threads: throughput, latency, TCP connections opened and worker time spent sleeping.
+Then checks that with every provider rate limited the client answers at once with LLMRateLimited.
+
+Usage: python benchmarks/bench_llm_client.py [--requests 300] [--workers 8] [--latency-ms 40]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+class Stub:
+    latency = 0.04
+    openai_per_second = 20  # Requests OpenAI accepts per wall-clock second before answering 429
+    gemini_limited = False
+    retry_after = 1
+    lock = threading.Lock()
+    connections = 0
+    window = (0, 0)  # (second, requests seen in it)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real APIs
+
+    def setup(self):
+        super().setup()
+        with Stub.lock:
+            Stub.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=()):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(Stub.latency)
+        if self.path.endswith("/chat/completions"):
+            with Stub.lock:
+                second, seen = Stub.window
+                now = int(time.time())
+                Stub.window = (now, 1) if now != second else (second, seen + 1)
+                limited = Stub.window[1] > Stub.openai_per_second
+            if limited:
+                # Same body shape OpenAI uses, so the old path's 'rate_limit_exceeded' check fires
+                self._send(429, {"error": {"code": "rate_limit_exceeded"}}, [("Retry-After", str(Stub.retry_after))])
+            else:
+                self._send(200, {"choices": [{"message": {"content": "**Thanks**, see you Monday."}}]})
+        elif Stub.gemini_limited:
+            self._send(429, {"error": {"status": "RESOURCE_EXHAUSTED"}}, [("Retry-After", str(Stub.retry_after))])
+        else:
+            self._send(200, {"candidates": [{"content": {"parts": [{"text": "Thanks, see you Monday."}]}}]})
+
+
+def old_reply(base_url: str, sleep_scale: float, slept: list) -> int:
+    """The previous /reply body, minus Flask."""
+    import requests
+    payload = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "hi"}], "temperature": 0.7}
+    response = None
+    for attempt in range(3):
+        response = requests.post(f"{base_url}/chat/completions", headers={"Authorization": "Bearer x"},
+                                 json=payload, timeout=30)
+        if response.status_code == 200:
+            break
+        elif "rate_limit_exceeded" in response.text:
+            wait = 20 * (attempt + 1) * sleep_scale
+            slept.append(wait)
+            time.sleep(wait)
+        else:
+            return 500
+    return 200 if response.status_code == 200 else 500
+
+
+def new_reply(client) -> int:
+    from app.services.llm_client import LLMError, LLMRateLimited
+    try:
+        client.generate("You are an email assistant.", "hi")
+        return 200
+    except LLMRateLimited:
+        return 429
+    except LLMError:
+        return 500
+
+
+def run(fn, n: int, workers: int):
+    latencies, statuses = [], []
+    lock = threading.Lock()
+
+    def one(_):
+        start = time.perf_counter()
+        status = fn()
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            statuses.append(status)
+
+    Stub.connections = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(one, range(n)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "wall": wall,
+        "ok": statuses.count(200),
+        "r429": statuses.count(429),
+        "errors": statuses.count(500),
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "connections": Stub.connections,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=300)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--latency-ms", type=float, default=40)
+    ap.add_argument("--sleep-scale", type=float, default=0.05, help="Old backoff 20s*(attempt+1) times this")
+    args = ap.parse_args()
+
+    Stub.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.update(OPENAI_BASE_URL=f"{base}/v1", GEMINI_BASE_URL=f"{base}/v1beta",
+                      OPENAI_API_KEY="stub", GEMINI_API_KEY="stub")
+    from app.services.llm_client import LLMClient
+
+    slept = []
+    old = run(lambda: old_reply(f"{base}/v1", args.sleep_scale, slept), args.requests, args.workers)
+    old["slept"] = sum(slept)
+    client = LLMClient(providers=["openai", "gemini"], max_concurrency=args.workers,
+                       rate_per_minute=1e6, burst=args.workers)
+    new = run(lambda: new_reply(client), args.requests, args.workers)
+    new["slept"] = 0.0  # The client never sleeps through a cooldown (only up to LLM_MAX_WAIT for a token)
+    stats = client.stats()
+
+    print(f"{args.requests} replies, {args.workers} workers, {args.latency_ms:.0f} ms stub latency, "
+          f"OpenAI limited to {Stub.openai_per_second}/s")
+    print(f"{'path':>6} {'wall s':>7} {'req/s':>7} {'ok':>5} {'429':>5} {'err':>5} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'conns':>6} {'slept s':>8}")
+    for name, r in (("old", old), ("new", new)):
+        print(f"{name:>6} {r['wall']:>7.2f} {args.requests / r['wall']:>7.1f} "
+              f"{r['ok']:>5} {r['r429']:>5} {r['errors']:>5} {r['p50']:>8.1f} {r['p99']:>8.1f} "
+              f"{r['connections']:>6} {r['slept']:>8.2f}")
+    print(f"new client: {stats['failovers']} failovers, providers {json.dumps(stats['providers'])}")
+
+    # Both providers limited: callers must get a 429 immediately, not a sleeping worker
+    Stub.gemini_limited = True
+    Stub.openai_per_second = 0
+    Stub.retry_after = 30
+    limited = run(lambda: new_reply(client), 50, args.workers)
+    print(f"all providers limited: {limited['r429']}/50 answered 429, p99 {limited['p99']:.1f} ms")
+    server.shutdown()
+
+    ok = (new["ok"] == args.requests and new["wall"] < old["wall"]
+          and new["connections"] <= 2 * args.workers and limited["r429"] == 50 and limited["p99"] < 500)
+    print("checks:", "ok" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Cost of the /metrics instrumentation on the processing pipeline.
+
+Times each hot-path operation (counter inc, histogram observe, `with histogram.time()`,
+`with work_queue.stage()`), then replays the instrumentation process_messages does for a sync
+batch: two per-email stages (mime_decode, extract_text) plus the per-batch stages, counters and
+model batch sizes. It reports that as µs per email next to the cost of parser.extract_text on a
+typical email. It also reports how long a full scrape takes with every series populated and
+checks that the per-email overhead stays under --budget-us.
+
+Usage: python benchmarks/bench_metrics.py [--iterations 200000] [--batch 32] [--budget-us 10]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("EMAILS_DB_FILE", os.path.join(tempfile.mkdtemp(prefix="bench_metrics_"), "emails.db"))
+
+BODY = ("Hi team, please find the agenda for Thursday's quarterly review attached. "
+        "Let me know by Wednesday if anything is missing. https://example.com/agenda?id=42 ") * 6
+
+
+def per_call_ns(fn, iterations: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter_ns() - start) / iterations
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--iterations", type=int, default=200000)
+    ap.add_argument("--batch", type=int, default=32, help="Emails per simulated sync batch")
+    ap.add_argument("--budget-us", type=float, default=10.0, help="Allowed instrumentation cost per email")
+    args = ap.parse_args()
+
+    from app.database.db import init_db
+    from app.services import parser
+    from app.services.metrics import emails_processed, gmail_calls, metrics, model_batch_size, stage_seconds
+    from app.services.work_queue import work_queue
+    from app.routers import metrics_router  # noqa: F401  (registers every collector a real scrape sees)
+    init_db()
+    n = args.iterations
+
+    def timed():
+        with stage_seconds.time("bench"):
+            pass
+
+    def queue_stage():
+        with work_queue.stage("bench"):
+            pass
+
+    ops = {
+        "counter inc": per_call_ns(lambda: emails_processed.labels("bench").inc(), n),
+        "histogram observe": per_call_ns(lambda: stage_seconds.labels("bench").observe(0.003), n),
+        "histogram.time()": per_call_ns(timed, n),
+        "work_queue.stage()": per_call_ns(queue_stage, n),
+    }
+    print(f"{'operation':<22} {'ns/call':>8}")
+    for name, ns in ops.items():
+        print(f"{name:<22} {ns:>8.0f}")
+
+    def sync_batch():
+        """The metrics work of one process_messages call, without the work itself."""
+        with work_queue.stage("gmail_fetch"):
+            gmail_calls.labels("messages.get").inc(args.batch)
+        for _ in range(args.batch):
+            with work_queue.stage("mime_decode"):
+                pass
+            with work_queue.stage("extract_text"):
+                pass
+        with work_queue.stage("classify"):
+            model_batch_size.labels("sentiment").observe(args.batch)
+            with stage_seconds.time("sentiment_inference"):
+                pass
+        with work_queue.stage("db_save"):
+            pass
+        emails_processed.labels("sync").inc(args.batch)
+
+    batches = max(1, n // (args.batch * 10))
+    per_email_us = per_call_ns(sync_batch, batches) / args.batch / 1000
+    extract_us = per_call_ns(lambda: parser.extract_text("Quarterly review agenda", BODY), max(1, n // 100)) / 1000
+    print(f"instrumentation: {per_email_us:.2f} µs/email; parser.extract_text: {extract_us:.1f} µs/email "
+          f"({per_email_us / extract_us:.1%})")
+
+    start = time.perf_counter()
+    text = metrics.render()
+    render_ms = (time.perf_counter() - start) * 1000
+    print(f"/metrics render: {render_ms:.2f} ms, {len(text.splitlines())} lines")
+
+    ok = per_email_us < args.budget_us and 'email_stage_seconds_count{stage="mime_decode"}' in text
+    ok &= "email_queue_jobs" in text and render_ms < 50
+    print("checks:", "ok" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+Time and peak memory of parser.extract_text on small, typical and pathological (5 MB HTML) bodies,
+against the previous whole-string implementation, plus an output equivalence check on plain text
+(HTML bodies are rendered by app.utils.html_text now, see bench_html_text.py).
+
+Usage: python benchmarks/bench_preprocess.py [--repeat 5] [--big-mb 5]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+WORDS = ("meeting invoice offer team update review project deadline customer payment schedule report "
+         "budget launch feedback contract shipping order account security").split()
+
+
+def sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 16))]
+    return " ".join(words).capitalize() + rng.choice([".", ".", "!", "?"])
+
+
+def small_body(rng: random.Random) -> str:
+    return " ".join(sentence(rng) for _ in range(3))
+
+
+def typical_body(rng: random.Random) -> str:
+    """Newsletter-style HTML: styled paragraphs, tracking links, repeated CTA, footer."""
+    paras = []
+    for i in range(25):
+        paras.append(f"<p style='font-family:Arial;color:#333'>{sentence(rng)} {sentence(rng)}</p>")
+        if i % 5 == 0:
+            paras.append(f"<a href='https://news.example.com/track/{rng.getrandbits(64):x}/click?utm_source=mail"
+                         f"&utm_medium=email'>Read the full story here.</a>")
+    paras.append("<div class='footer'>Unsubscribe | © 2024 Example Inc. All rights reserved.</div>")
+    return "<html><head><title>News</title></head><body>" + "\n".join(paras) + "</body></html>"
+
+
+def pathological_body(rng: random.Random, megabytes: float) -> str:
+    """Multi-MB HTML: deep table markup and one very long unpunctuated run, no early footer."""
+    rows = []
+    size = 0
+    target = int(megabytes * 1024 * 1024)
+    while size < target:
+        row = ("<tr><td class='cell' style='padding:4px;border:1px solid #eee'>"
+               + " ".join(rng.choice(WORDS) for _ in range(12)) + "</td></tr>\n")
+        rows.append(row)
+        size += len(row)
+    return "<html><body><table>" + "".join(rows) + "</table></body></html>"
+
+
+def old_clean_text(text: str) -> str:
+    from nltk.corpus import stopwords
+    try:
+        from nltk.tokenize import word_tokenize
+        word_tokenize("probe")
+    except LookupError:  # punkt not installed: Treebank alone tokenizes letters-only text the same way
+        from nltk.tokenize import TreebankWordTokenizer
+        word_tokenize = TreebankWordTokenizer().tokenize
+    stop_words = set(stopwords.words('english'))
+    text = str(text).lower()
+    text = re.sub(r"http\S+|www\.\S+", " ", text)
+    text = re.sub(r"\S+@\S+", " ", text)
+    text = re.sub(r"<[^>]+>", " ", text)
+    text = re.sub(r"[^a-z\s]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    tokens = word_tokenize(text)
+    return ' '.join(t for t in tokens if t not in stop_words and len(t) > 2)
+
+
+def old_extract_text(subject: str, body: str):
+    """parser.extract_text as it was before streaming (full-string passes, truncate last)."""
+    from app.utils.near_dup import dedupe_sentences, DEDUP_SIMILARITY_THRESHOLD
+    clean_body = re.sub(r'\?utm_[^&\s]*&?', '', body)
+    clean_body = re.sub(r'\?utm_[^&\s]*$', '', clean_body)
+    clean_body = re.sub(r'<[^>]+>', '', clean_body)
+    clean_body = re.sub(r'\s+', ' ', clean_body).strip()
+    clean_body = re.sub(r'(https?://[^\s]+)',
+                        lambda m: f"[{m.group(1)[:50]}...]" if len(m.group(1)) > 50 else m.group(1), clean_body)
+    sentences = re.split(r'(?<=[.!?])\s+', clean_body)
+    clean_body = ' '.join(dedupe_sentences(sentences, DEDUP_SIMILARITY_THRESHOLD))
+    clean_body = re.sub(r'(Unsubscribe|©|All rights reserved|support@|View on|Learn more).*', '', clean_body,
+                        flags=re.IGNORECASE | re.DOTALL)
+    if len(clean_body) > 500:
+        clean_body = clean_body[:500] + "..."
+    combined = f"{subject}\n\n{clean_body}"
+    cleaned = old_clean_text(combined)
+    if len(cleaned) > 300:
+        cleaned = cleaned[:300] + "..."
+    return combined, cleaned
+
+
+def measure(fn, subject: str, body: str, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(subject, body)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(subject, body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, best, peak
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--big-mb", type=float, default=5.0)
+    ap.add_argument("--corpus", type=int, default=300, help="Random bodies for the equivalence check")
+    args = ap.parse_args()
+
+    from app.services.parser import extract_text
+    from app.utils.html_text import looks_like_html
+
+    rng = random.Random(11)
+    cases = [
+        ("small", small_body(rng)),
+        ("typical", typical_body(rng)),
+        (f"pathological {args.big_mb:g}MB", pathological_body(rng, args.big_mb)),
+    ]
+
+    print(f"{'case':>20} {'impl':>9} {'best ms':>10} {'peak KiB':>10}")
+    ok = True
+    for name, body in cases:
+        repeat = 1 if len(body) > 1_000_000 else args.repeat
+        old_out, old_t, old_peak = measure(old_extract_text, "Weekly update", body, repeat)
+        new_out, new_t, new_peak = measure(extract_text, "Weekly update", body, repeat)
+        print(f"{name:>20} {'before':>9} {old_t * 1000:>10.2f} {old_peak / 1024:>10.0f}")
+        # HTML bodies are rendered to visible text now, so only plain-text output must match
+        same = "n/a (html)" if looks_like_html(body) else old_out == new_out
+        print(f"{name:>20} {'after':>9} {new_t * 1000:>10.2f} {new_peak / 1024:>10.0f}"
+              f"   x{old_t / new_t:.1f} faster, identical: {same}")
+        ok &= same is not False
+
+    same = 0
+    for _ in range(args.corpus):
+        body = " ".join(small_body(rng) for _ in range(rng.randint(1, 40)))
+        same += old_extract_text("Subject", body) == extract_text("Subject", body)
+    print(f"equivalence on {args.corpus} random plain-text bodies: {same}/{args.corpus}")
+    sys.exit(0 if ok and same == args.corpus else 1)
+
+
+if __name__ == "__main__":
+    main()
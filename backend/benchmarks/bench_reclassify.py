@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+Bulk reclassification throughput and its impact on a live writer.
+
+Fills a fresh DB with synthetic keyword emails, trains a student on them (the benchmark runs with
+ZERO_SHOT_MODE=student unless set otherwise; sentiment still uses the transformer), then for each
+worker count marks every row stale and runs app.commands.reclassify end to end. Meanwhile a
+separate process plays the Flask server, saving a batch of 20 emails every 50 ms, and records how
+long each save takes. Reports rows/s per worker count and the live writer's p50/p99/max latency,
+and checks the rollups against a full rebuild afterwards.
+
+Usage: python benchmarks/bench_reclassify.py [--emails 50000] [--workers 0,2,4] [--chunk 2000]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+from argparse import Namespace
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# Spawned processes inherit the parent's DB through the environment instead of making a new temp dir
+if "EMAILS_DB_FILE" not in os.environ:
+    import tempfile
+    _tmp = tempfile.mkdtemp(prefix="bench_reclassify_")
+    os.environ["EMAILS_DB_FILE"] = os.path.join(_tmp, "emails.db")
+    os.environ["STUDENTS_DIR"] = os.path.join(_tmp, "students")
+os.environ.setdefault("ZERO_SHOT_MODE", "student")
+
+WORDS = {
+    "business": "meeting agenda quarterly review invoice contract client project deadline report".split(),
+    "personal": "dinner family weekend birthday mom party friends vacation photos wedding".split(),
+    "promotions": "sale discount offer deal shipping coupon limited friday save membership".split(),
+    "spam": "winner prize claim lottery urgent verify account suspended bitcoin inheritance".split(),
+    "education": "course university student lecture assignment exam semester enroll tuition campus".split(),
+}
+
+
+def make_email(rng):
+    label = rng.choice(list(WORDS))
+    words = rng.choices(WORDS[label], k=rng.randint(3, 10)) + rng.choices(WORDS[rng.choice(list(WORDS))], k=2)
+    rng.shuffle(words)
+    return " ".join(words), label
+
+
+def fill(n: int):
+    from app.database.db import SessionLocal, email_row, save_email_records
+    rng = random.Random(3)
+    session = SessionLocal()
+    try:
+        for start in range(0, n, 5000):
+            rows = []
+            for i in range(start, min(n, start + 5000)):
+                text, label = make_email(rng)
+                rows.append(email_row(f"m{i}", "s", text, text, text, label, rng.uniform(0.5, 1.0)))
+            save_email_records(session, rows)
+    finally:
+        session.close()
+
+
+def live_writer(stop, results, version: str):
+    """Stand-in for the server's sync path: a 20-email upsert every 50 ms, timed."""
+    from app.database.db import SessionLocal, email_row, save_email_records
+    rng = random.Random(os.getpid())
+    latencies, n = [], 0
+    while not stop.is_set():
+        rows = []
+        for _ in range(20):
+            text, label = make_email(rng)
+            rows.append(email_row(f"live-{os.getpid()}-{n}", "s", text, text, text, label, 0.9, "neutral",
+                                  "medium", version))
+            n += 1
+        session = SessionLocal()
+        start = time.perf_counter()
+        try:
+            save_email_records(session, rows)
+        finally:
+            session.close()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.05)
+    results.put(latencies)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--emails", type=int, default=50000)
+    ap.add_argument("--workers", default="0,2,4")
+    ap.add_argument("--chunk", type=int, default=2000)
+    ap.add_argument("--batch", type=int, default=64)
+    args = ap.parse_args()
+
+    from sqlalchemy import update
+    from app.database.db import SessionLocal, EmailRecord, init_db
+    from app.commands.reclassify import reclassify
+    from app.commands.rollup_rebuild import rebuild
+    from app.services.classifier import EmailClassifier
+    init_db()
+    fill(args.emails)
+    if os.environ["ZERO_SHOT_MODE"] == "student":
+        from app.commands.train_student import train
+        student, metrics = train(Namespace(epochs=1, chunk=5000, min_confidence=0.0, holdout=5, limit=0,
+                                           alpha=1e-5, seed=13))
+        student.save(os.environ["STUDENTS_DIR"], metrics)
+    version = EmailClassifier(cache=None).model_fingerprint
+
+    ctx = multiprocessing.get_context("spawn")
+    ok = True
+    report = []
+    for workers in (int(w) for w in args.workers.split(",")):
+        session = SessionLocal()
+        try:
+            session.execute(update(EmailRecord).values(model_version=None))
+            session.commit()
+        finally:
+            session.close()
+        stop, results = ctx.Event(), ctx.Queue()
+        writer = ctx.Process(target=live_writer, args=(stop, results, version))
+        writer.start()
+        stats = reclassify(workers=workers, chunk=args.chunk, batch=args.batch, pause=0.05, restart=True)
+        stop.set()
+        latencies = sorted(results.get())
+        writer.join()
+        drift = rebuild()["buckets_corrected"]
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        ok &= drift == 0 and latencies[-1] < 1.0
+        report.append((workers, stats["scanned"], stats["rows_per_second"], p50, p99, latencies[-1] * 1000, drift))
+
+    print(f"{'workers':>8} {'rows':>8} {'rows/s':>8} {'live p50 ms':>12} {'p99 ms':>8} {'max ms':>8} {'drift':>6}")
+    for workers, rows, rate, p50, p99, worst, drift in report:
+        print(f"{workers:>8} {rows:>8} {rate:>8.0f} {p50:>12.1f} {p99:>8.1f} {worst:>8.1f} {drift:>6}")
+    print("checks:", "ok" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+"""
+Retention + compaction on a realistic emails table: N emails spread over two years, written
+uncompressed (as before CompressedText), then one RetentionJob pass with default policies.
+
+Reports file size before/after, bytes reclaimed, the cost of decompressing bodies
+on read (/history with include=body), and the latency a live writer sees while the job runs
+(it shares the single writer connection, so this is the "does it stall syncs" number).
+
+Usage: python benchmarks/bench_retention.py [--emails 20000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+_tmp = tempfile.mkdtemp(prefix="bench_retention_")
+os.environ["EMAILS_DB_FILE"] = os.path.join(_tmp, "emails.db")
+os.environ.setdefault("RETENTION_PAUSE", "0.01")
+
+WORDS = ("invoice meeting please review attached quarterly report schedule delivery account payment "
+         "update team project offer unsubscribe newsletter order shipped tracking password security").split()
+
+
+def make_body(rng) -> str:
+    # Newsletter-sized text with the repetition real mail has (footers, boilerplate)
+    paras = [" ".join(rng.choices(WORDS, k=rng.randint(20, 60))) for _ in range(rng.randint(5, 40))]
+    return "\n\n".join(paras) + "\n\nYou are receiving this email because you subscribed. Unsubscribe here."
+
+
+def populate(n: int, now):
+    from datetime import timedelta
+    from app.database import compression
+    from app.database.db import SessionLocal, email_row, save_email_records
+    rng = random.Random(3)
+    compression.COMPRESS_MIN_BYTES = 1 << 60  # Write the way the app did before compression existed
+    session = SessionLocal()
+    try:
+        for start in range(0, n, 2000):
+            rows = []
+            for i in range(start, min(n, start + 2000)):
+                body = make_body(rng)
+                row = email_row(f"m{i:07d}", f"Subject {i}", body, f"Subject {i}\n\n{body[:500]}",
+                                " ".join(body.split()[:40]), rng.choice(("business", "personal", "spam")), rng.random())
+                row["timestamp"] = now - timedelta(days=rng.uniform(0, 730))
+                rows.append(row)
+            save_email_records(session, rows)
+    finally:
+        session.close()
+        compression.COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 256))
+
+
+def checkpoint_and_size() -> int:
+    from app.database.db import engine, DB_FILE
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return os.path.getsize(DB_FILE)
+
+
+def history_read_ms(repeat: int = 20) -> float:
+    from app.database.db import ReadSession, email_history_page
+    session = ReadSession()
+    try:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            email_history_page(session, 50, include=("body", "combined_text"))
+            times.append(time.perf_counter() - start)
+    finally:
+        session.close()
+    return sorted(times)[len(times) // 2] * 1000
+
+
+def live_writer(stop, latencies):
+    from app.database.db import SessionLocal, email_row, save_email_records
+    i = 0
+    while not stop.is_set():
+        session = SessionLocal()
+        start = time.perf_counter()
+        try:
+            save_email_records(session, [email_row(f"live-{i}", "Live", "fresh body " * 50, "c", "c", "business", 0.9)])
+        finally:
+            session.close()
+        latencies.append(time.perf_counter() - start)
+        i += 1
+        time.sleep(0.01)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--emails", type=int, default=20000)
+    args = ap.parse_args()
+
+    from datetime import datetime, timedelta
+    from sqlalchemy import func, select
+    from app.database.db import SessionLocal, init_db, EmailRecord, ArchivedRollup
+    from app.services.retention import RETENTION_FULL_DAYS, RETENTION_DETAIL_DAYS, RetentionJob
+    init_db()
+
+    now = datetime.utcnow()
+    start = time.perf_counter()
+    populate(args.emails, now)
+    print(f"wrote {args.emails} uncompressed emails in {time.perf_counter() - start:.1f}s")
+    size_before = checkpoint_and_size()
+    read_plain = history_read_ms()
+
+    latencies, stop = [], threading.Event()
+    writer = threading.Thread(target=live_writer, args=(stop, latencies))
+    writer.start()
+    time.sleep(0.5)
+    idle = len(latencies)
+    report = RetentionJob().run(now=now)
+    stop.set()
+    writer.join()
+    during = sorted(latencies[idle:]) or [0.0]
+    size_after = checkpoint_and_size()
+    read_compressed = history_read_ms()
+
+    print(f"file size: {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB "
+          f"(job reported {report['bytes_reclaimed'] / 1e6:.1f} MB reclaimed in {report['seconds']:.1f}s)")
+    print(f"archived {report['archived']}, bodies pruned {report['bodies_pruned']}, "
+          f"compressed {report['compressed']}, pages freed {report['pages_freed']}")
+    print(f"/history page of 50 with bodies: plain {read_plain:.2f} ms, compressed {read_compressed:.2f} ms")
+    print(f"live writes during the job: {len(during)}, p50 {during[len(during) // 2] * 1000:.1f} ms, "
+          f"max {during[-1] * 1000:.1f} ms")
+
+    session = SessionLocal()
+    try:
+        detail_cutoff = now - timedelta(days=RETENTION_DETAIL_DAYS)
+        full_cutoff = now - timedelta(days=RETENTION_FULL_DAYS)
+        kept = session.execute(select(func.count()).where(EmailRecord.message_id.like("m%"))).scalar()
+        archived = session.execute(
+            select(ArchivedRollup.emails).where(ArchivedRollup.dimension == "total")).scalar() or 0
+        too_old = session.execute(select(func.count()).where(EmailRecord.timestamp < detail_cutoff)).scalar()
+        unpruned = session.execute(select(func.count()).where(
+            EmailRecord.timestamp < full_cutoff, EmailRecord.body.is_not(None))).scalar()
+        sample = session.execute(select(EmailRecord.body).where(EmailRecord.body.is_not(None)).limit(1)).scalar()
+    finally:
+        session.close()
+    ok = kept + archived == args.emails and not too_old and not unpruned and isinstance(sample, str)
+    ok &= size_after < size_before
+    print(f"checks: kept {kept} + archived {archived} == {args.emails}, none past policy: "
+          f"{'ok' if ok else 'FAILED'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
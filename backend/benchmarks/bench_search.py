@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+"""
+Search latency: FTS5 (fts.search_emails, bm25 + snippet) against the only option before it, a
+LIKE '%term%' scan over subject and body, on one DB grown through 10k, 100k and 1M emails.
+
+LIKE has no relevance order; it returns the newest 20 substring hits, so it is only fast when
+almost every email matches (the "common" word) and degrades to a full scan for selective queries.
+FTS ranks the newest FTS_RANK_WINDOW matches, so its cost is bounded either way.
+
+Emails are written through save_email_records, so the index cost on the write path is timed too.
+Also checks that a planted term finds exactly its email, that the label filter and pagination
+hold, and that deleting an email removes it from the index.
+
+Usage: python benchmarks/bench_search.py [--sizes 10000,100000,1000000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+_tmp = tempfile.mkdtemp(prefix="bench_search_")
+os.environ["EMAILS_DB_FILE"] = os.path.join(_tmp, "emails.db")
+
+LABELS = ("business", "personal", "promotions", "updates", "spam")
+# (name, query): frequent word, rarer word, word in 1 of 50k emails, two words (AND), prefix
+QUERIES = (("common", "report"), ("rare", "w4321"), ("needle", "kestrel"), ("and", "invoice w1234"),
+           ("prefix", "w12*"))
+NEEDLE_EVERY = 50000
+
+
+def make_vocab(rng, n=20000):
+    common = ["report", "meeting", "invoice", "please", "review", "attached", "friday", "update", "order",
+              "account", "payment", "schedule", "project", "team", "offer", "delivery"]
+    return common + [f"w{i}" for i in range(n)]
+
+
+def make_rows(rng, vocab, weights, start: int, n: int):
+    from app.database.db import email_row
+    rows = []
+    for i in range(start, start + n):
+        words = rng.choices(vocab, weights=weights, k=60)
+        subject = " ".join(words[:6]).capitalize()
+        body = " ".join(words) + (" kestrel." if i % NEEDLE_EVERY == 0 else ".")
+        rows.append(email_row(f"m{i:08d}", subject, body, f"{subject}\n\n{body}", body, LABELS[i % len(LABELS)], 0.9))
+    return rows
+
+
+def grow(target: int, current: int, rng, vocab, weights) -> float:
+    from app.database.db import SessionLocal, save_email_records
+    session = SessionLocal()
+    spent = 0.0
+    try:
+        while current < target:
+            n = min(10000, target - current)
+            rows = make_rows(rng, vocab, weights, current, n)
+            start = time.perf_counter()
+            save_email_records(session, rows)
+            spent += time.perf_counter() - start
+            current += n
+    finally:
+        session.close()
+    return spent
+
+
+def like_search(session, query: str, limit: int = 20):
+    """Pre-FTS approach: substring scan, every word in subject or body, newest first."""
+    from sqlalchemy import or_, select
+    from app.database.db import EmailRecord
+    stmt = select(EmailRecord.id, EmailRecord.subject)
+    for word in query.replace("*", "").split():
+        stmt = stmt.where(or_(EmailRecord.subject.like(f"%{word}%"), EmailRecord.body.like(f"%{word}%")))
+    return session.execute(stmt.order_by(EmailRecord.timestamp.desc()).limit(limit)).all()
+
+
+def timed(fn, repeat: int) -> float:
+    best = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best.append(time.perf_counter() - start)
+    best.sort()
+    return best[len(best) // 2] * 1000  # median ms
+
+
+def check(size: int) -> bool:
+    from sqlalchemy import delete
+    from app.database.db import SessionLocal, ReadSession, EmailRecord, save_email_records, email_row
+    from app.database.fts import search_emails
+
+    token = f"zzplanted{size}"
+    write = SessionLocal()
+    try:
+        save_email_records(write, [email_row(f"planted-{size}", "Needle", f"the {token} is here", "", "", "spam", 0.5)])
+    finally:
+        write.close()
+    read = ReadSession()
+    try:
+        hits, _ = search_emails(read, token)
+        ok = len(hits) == 1 and hits[0]["message_id"] == f"planted-{size}" and "<mark>" in hits[0]["snippet"]
+        ok &= not search_emails(read, token, label="business")[0]
+        page1, more = search_emails(read, "report", limit=10)
+        page2, _ = search_emails(read, "report", limit=10, offset=10)
+        ok &= more and len(page1) == 10 and not {r["id"] for r in page1} & {r["id"] for r in page2}
+        ok &= not search_emails(read, '"unbalanced AND (')[1]  # Never an FTS5 syntax error
+    finally:
+        read.close()
+    write = SessionLocal()
+    try:
+        write.execute(delete(EmailRecord).where(EmailRecord.message_id == f"planted-{size}"))
+        write.commit()
+    finally:
+        write.close()
+    read = ReadSession()
+    try:
+        ok &= not search_emails(read, token)[0]
+    finally:
+        read.close()
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10000,100000,1000000")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--like-repeat", type=int, default=3, help="LIKE scans are slow at 1M rows")
+    args = ap.parse_args()
+
+    from app.database.db import ReadSession, init_db
+    from app.database.fts import search_emails
+    init_db()
+
+    rng = random.Random(7)
+    vocab = make_vocab(rng)
+    weights = [1.0 / (rank + 1) for rank in range(len(vocab))]  # Zipf-like word frequencies
+
+    ok = True
+    current = 0
+    print(f"{'emails':>9} {'query':>7} {'fts ms':>9} {'like ms':>9} {'speedup':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        spent = grow(size, current, rng, vocab, weights)
+        print(f"{size:>9} {'write':>7} {(size - current) / spent:>9.0f} rows/s (upsert + index)")
+        current = size
+        session = ReadSession()
+        try:
+            for name, query in QUERIES:
+                fts_ms = timed(lambda: search_emails(session, query), args.repeat)
+                like_ms = timed(lambda: like_search(session, query), args.like_repeat)
+                print(f"{size:>9} {name:>7} {fts_ms:>9.2f} {like_ms:>9.1f} {like_ms / fts_ms:>7.0f}x")
+        finally:
+            session.close()
+        passed = check(size)
+        ok &= passed
+        print(f"{size:>9} {'checks':>7} {'ok' if passed else 'FAILED'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+Sentence deduplication: the old all-pairs SequenceMatcher loop vs app.utils.near_dup.
+
+Bodies are synthetic newsletter / reply-chain text: fresh sentences mixed with exact repeats,
+lightly edited repeats and quoted copies. Reports time per body and how closely the kept
+sentences agree with the old rule. Then runs --bodies random bodies (3-100 sentences, many of
+them short) through both and counts the bodies whose kept sentences differ. Finally it runs the
+new filter under several PYTHONHASHSEED values and checks the output is identical, since
+cleaned_text feeds the prediction cache key.
+
+Usage: python benchmarks/bench_sentence_dedup.py [--sizes 10,100,1000] [--bodies 3000] [--threshold 0.7]
+"""
+import argparse
+import os
+import hashlib
+import random
+import subprocess
+import sys
+import time
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.utils.near_dup import dedupe_sentences  # noqa: E402
+
+WORDS = ("offer team update meeting invoice weekly report review account deal sale free project "
+         "deadline shipping order course student event ticket price member news alert support").split()
+
+
+def make_sentences(n: int, seed: int = 11, max_words: int = 18):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        r = rng.random()
+        if out and r < 0.2:
+            out.append(rng.choice(out))  # Exact repeat (footers, signatures)
+        elif out and r < 0.45:
+            words = rng.choice(out).split()
+            i = rng.randrange(len(words))
+            words[i] = rng.choice(WORDS)  # One-word edit (templated items)
+            out.append(" ".join(words))
+        elif out and r < 0.55:
+            out.append("> " + rng.choice(out))  # Quoted reply chain
+        else:
+            out.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, max_words))).capitalize() + ".")
+    return out
+
+
+def dedupe_quadratic(sentences, threshold):
+    kept = []
+    for sent in sentences:
+        if not any(SequenceMatcher(None, sent, u).ratio() > threshold for u in kept):
+            kept.append(sent)
+    return kept
+
+
+def differential(bodies: int, threshold: float):
+    """(bodies where the kept sentences differ from the old rule, differing sentences)."""
+    bodies_off = sentences_off = 0
+    for seed in range(bodies):
+        rng = random.Random(seed)
+        sentences = make_sentences(rng.choice((3, 10, 30, 100)), seed, rng.choice((6, 18, 40)))
+        old, new = set(dedupe_quadratic(sentences, threshold)), set(dedupe_sentences(sentences, threshold))
+        off = sum((s in old) != (s in new) for s in sentences)
+        bodies_off += off > 0
+        sentences_off += off
+    return bodies_off, sentences_off
+
+
+def output_digest(threshold: float) -> str:
+    digest = hashlib.sha1()
+    for seed in range(200):
+        digest.update("\n".join(dedupe_sentences(make_sentences(100, seed, 40), threshold)).encode())
+    return digest.hexdigest()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10,100,1000")
+    ap.add_argument("--bodies", type=int, default=3000)
+    ap.add_argument("--threshold", type=float, default=0.7)
+    ap.add_argument("--digest", action="store_true", help=argparse.SUPPRESS)  # Used by the seed check
+    args = ap.parse_args()
+    if args.digest:
+        print(output_digest(args.threshold))
+        return
+
+    print(f"{'sentences':>9} {'old ms':>9} {'new ms':>9} {'speedup':>8} {'kept old':>9} {'kept new':>9} {'agreement':>10}")
+    for n in (int(x) for x in args.sizes.split(",")):
+        sentences = make_sentences(n)
+        start = time.perf_counter()
+        old = dedupe_quadratic(sentences, args.threshold)
+        t_old = time.perf_counter() - start
+        start = time.perf_counter()
+        new = dedupe_sentences(sentences, args.threshold)
+        t_new = time.perf_counter() - start
+        # Per-sentence keep/drop agreement
+        old_set, new_set = set(old), set(new)
+        agree = sum((s in old_set) == (s in new_set) for s in sentences) / len(sentences)
+        print(f"{n:>9} {1000 * t_old:>9.1f} {1000 * t_new:>9.1f} {t_old / t_new:>7.1f}x "
+              f"{len(old):>9} {len(new):>9} {agree:>10.3f}")
+
+    bodies_off, sentences_off = differential(args.bodies, args.threshold)
+    print(f"differential: {bodies_off}/{args.bodies} bodies differ from the old rule "
+          f"({sentences_off} sentence(s) kept or dropped differently)")
+
+    digests = {subprocess.run([sys.executable, __file__, "--digest", "--threshold", str(args.threshold)],
+                              env=dict(os.environ, PYTHONHASHSEED=str(seed)), capture_output=True, text=True,
+                              check=True).stdout.strip() for seed in range(1, 6)}
+    print(f"PYTHONHASHSEED 1..5: {len(digests)} distinct output(s)")
+    ok = len(digests) == 1
+    print("checks:", "ok" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
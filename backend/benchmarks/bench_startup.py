@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Time from process start to the first successful /api/email/health response.
+
+Starts the Flask app in a subprocess and polls /health. Model warm-up runs in the
+background, so this measures how soon the server can take non-classifying traffic.
+
+Usage: python benchmarks/bench_startup.py [--port 8765] [--runs 3] [--no-warm-up]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SERVER_SNIPPET = (
+    "import sys; sys.path.insert(0, '.');"
+    "from app.main import app;"
+    "app.run(host='127.0.0.1', port={port}, debug=False, use_reloader=False)"
+)
+
+
+def time_to_health(port: int, warm_up: bool, timeout: float = 300.0):
+    env = dict(os.environ, WARM_UP_MODELS="true" if warm_up else "false")
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-c", SERVER_SNIPPET.format(port=port)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}/api/email/health"
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"Server exited with code {proc.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - start, json.loads(resp.read())
+            except OSError:
+                time.sleep(0.05)
+        raise TimeoutError("No /health response")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--no-warm-up", action="store_true")
+    args = ap.parse_args()
+
+    for run in range(args.runs):
+        seconds, body = time_to_health(args.port, warm_up=not args.no_warm_up)
+        print(f"run {run + 1}: first /health after {seconds:.2f}s, models_ready={body.get('models_ready')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Dashboard statistics: rollups.dashboard_stats (reads email_rollups) against computing the same
+breakdowns with GROUP BY scans over emails, on one DB grown through 10k, 100k and 1M emails.
+
+Checks at every size that the rollups maintained on the write path (including re-classified
+emails) equal the scan results, and times the streaming rebuild.
+
+Usage: python benchmarks/bench_stats.py [--sizes 10000,100000,1000000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+_tmp = tempfile.mkdtemp(prefix="bench_stats_")
+os.environ["EMAILS_DB_FILE"] = os.path.join(_tmp, "emails.db")
+
+LABELS = ("business", "personal", "promotions", "updates", "spam")
+SENTIMENTS = ("positive", "neutral", "negative")
+PRIORITIES = ("high", "medium", "low")
+
+
+def grow(target: int, current: int, rng, now):
+    from datetime import timedelta
+    from app.database.db import SessionLocal, email_row, save_email_records
+    session = SessionLocal()
+    try:
+        while current < target:
+            rows = []
+            for i in range(current, min(target, current + 5000)):
+                # ~5% re-classify an email already stored, so rollups must move counts between buckets
+                mid = f"m{rng.randrange(i)}" if i and rng.random() < 0.05 else f"m{i}"
+                row = email_row(mid, "Subject", "body", "combined", "cleaned", rng.choice(LABELS), rng.random(),
+                                rng.choice(SENTIMENTS), rng.choice(PRIORITIES))
+                row["timestamp"] = now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+                rows.append(row)
+            save_email_records(session, rows)
+            current += len(rows)
+    finally:
+        session.close()
+
+
+def scan_stats(session, days: int, now):
+    """What /stats would have to do without rollups."""
+    from datetime import timedelta
+    from sqlalchemy import text
+    since = (now - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    out = {}
+    for name, column in (("by_label", "predicted_label"), ("by_sentiment", "sentiment"), ("by_priority", "priority")):
+        out[name] = dict(session.execute(text(f"SELECT {column}, COUNT(*) FROM emails GROUP BY 1")).all())
+    hours = dict(session.execute(
+        text("SELECT CAST(strftime('%H', timestamp) AS INTEGER), COUNT(*) FROM emails GROUP BY 1")).all())
+    out["by_hour"] = [hours.get(h, 0) for h in range(24)]
+    out["daily"] = dict(session.execute(
+        text("SELECT substr(timestamp, 1, 10), COUNT(*) FROM emails WHERE timestamp >= :since GROUP BY 1"),
+        {"since": since}).all())
+    out["confidence"] = dict(session.execute(
+        text("SELECT MIN(CAST(confidence * 10 AS INTEGER), 9), COUNT(*) FROM emails GROUP BY 1")).all())
+    return out
+
+
+def timed(fn, repeat: int):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2] * 1000, result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10000,100000,1000000")
+    ap.add_argument("--days", type=int, default=30)
+    args = ap.parse_args()
+
+    from datetime import datetime
+    from app.database.db import ReadSession, init_db
+    from app.database.rollups import dashboard_stats
+    from app.commands.rollup_rebuild import rebuild
+    init_db()
+
+    rng = random.Random(11)
+    now = datetime.utcnow()
+    ok = True
+    current = 0
+    print(f"{'emails':>9} {'rollup ms':>10} {'scan ms':>9} {'rebuild s':>10}  match")
+    for size in (int(s) for s in args.sizes.split(",")):
+        grow(size, current, rng, now)
+        current = size
+        session = ReadSession()
+        try:
+            fast_ms, fast = timed(lambda: dashboard_stats(session, days=args.days, now=now), 20)
+            scan_ms, scan = timed(lambda: scan_stats(session, args.days, now), 3)
+        finally:
+            session.close()
+        match = (
+            {k: v["count"] for k, v in fast["by_label"].items()} == scan["by_label"]
+            and {k: v["count"] for k, v in fast["by_priority"].items()} == scan["by_priority"]
+            and fast["by_hour"] == scan["by_hour"]
+            and {d["day"]: d["count"] for d in fast["daily"] if d["count"]} == scan["daily"]
+            and fast["confidence_histogram"]["all"] == [scan["confidence"].get(b, 0) for b in range(10)]
+        )
+        report = rebuild()
+        match &= report["buckets_corrected"] == 0  # Write-path rollups needed no correction
+        ok &= match
+        print(f"{size:>9} {fast_ms:>10.2f} {scan_ms:>9.1f} {report['seconds']:>10.2f}  {'ok' if match else 'MISMATCH'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
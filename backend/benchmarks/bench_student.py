@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Student training and serving cost on synthetic teacher-labelled emails tables.
+
+For each size, fills a fresh DB with emails whose predicted_label comes from a noisy keyword
+teacher, runs the train_student pipeline (streamed chunks, holdout metrics, calibration) and
+reports training time, peak Python/NumPy heap during training (tracemalloc; should stay flat
+as the table grows, unlike RSS which also counts SQLite's mmap and page cache; tracing makes
+the training time a few times slower than untraced), held-out
+agreement and the label-stage throughput of the saved student (what ZERO_SHOT_MODE=student runs)
+in classifier-sized batches.
+With --with-bart also times facebook/bart-large-mnli on the same texts for comparison.
+
+Usage: python benchmarks/bench_student.py [--sizes 20000,200000] [--with-bart]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import Namespace
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+_tmp = tempfile.mkdtemp(prefix="bench_student_")
+os.environ["EMAILS_DB_FILE"] = os.path.join(_tmp, "emails.db")
+os.environ["STUDENTS_DIR"] = os.path.join(_tmp, "students")
+
+TOPICS = {
+    "business": "meeting agenda quarterly review invoice contract client project deadline report".split(),
+    "personal": "dinner family weekend birthday mom party friends vacation photos wedding".split(),
+    "promotions": "sale discount offer deal shipping coupon limited friday save membership".split(),
+    "spam": "winner prize claim lottery urgent verify account suspended bitcoin inheritance".split(),
+    "education": "course university student lecture assignment exam semester enroll tuition campus".split(),
+}
+FILLER = "hello thanks please update regarding today tomorrow week information attached".split()
+
+
+def make_email(rng):
+    label = rng.choice(list(TOPICS))
+    noise = rng.choice(list(TOPICS))
+    words = (rng.choices(TOPICS[label], k=rng.randint(2, 8)) + rng.choices(TOPICS[noise], k=rng.randint(0, 3))
+             + rng.choices(FILLER, k=rng.randint(3, 12)))
+    rng.shuffle(words)
+    return " ".join(words), label, rng.uniform(0.4, 1.0)
+
+
+def fill(n: int, rng):
+    from app.database.db import SessionLocal, email_row, save_email_records
+    session = SessionLocal()
+    try:
+        for start in range(0, n, 5000):
+            rows = []
+            for i in range(start, min(n, start + 5000)):
+                text, label, confidence = make_email(rng)
+                rows.append(email_row(f"m{i}", "s", text, text, text, label, confidence))
+            save_email_records(session, rows)
+    finally:
+        session.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="20000,200000")
+    ap.add_argument("--with-bart", action="store_true")
+    args = ap.parse_args()
+
+    from app.database.db import init_db
+    from app.commands.train_student import train
+    from app.services.classifier import CANDIDATE_LABELS
+    from app.services.student import StudentModel
+    init_db()
+
+    rng = random.Random(9)
+    current, ok = 0, True
+    sample = [make_email(rng)[0] for _ in range(2048)]
+    print(f"{'emails':>8} {'train s':>8} {'heap MB':>8} {'agreement':>10} {'serve emails/s':>15}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        fill(size - current, rng)
+        current = size
+        tracemalloc.start()
+        start = time.perf_counter()
+        student, metrics = train(Namespace(epochs=3, chunk=5000, min_confidence=0.5, holdout=5, limit=0,
+                                           alpha=1e-5, seed=13))
+        train_s = time.perf_counter() - start
+        heap_mb = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+        student.save(os.environ["STUDENTS_DIR"], metrics)
+
+        served = StudentModel.load()  # Round-trip through the artifact, as the classifier loads it
+        start = time.perf_counter()
+        for i in range(0, len(sample), 16):
+            served.score(sample[i:i + 16], CANDIDATE_LABELS)
+        serve = len(sample) / (time.perf_counter() - start)
+        ok &= metrics["agreement"] > 0.8
+        print(f"{size:>8} {train_s:>8.1f} {heap_mb:>8.1f} {metrics['agreement']:>10.1%} {serve:>15.0f}")
+
+    if args.with_bart:
+        from transformers import pipeline
+        nli = pipeline("zero-shot-classification", model="facebook/bart-large-mnli", device=-1)
+        texts = sample[:64]
+        start = time.perf_counter()
+        nli(texts, CANDIDATE_LABELS, batch_size=16 * len(CANDIDATE_LABELS))
+        print(f"bart-large-mnli: {len(texts) / (time.perf_counter() - start):.1f} emails/s")
+    print("checks:", "ok" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
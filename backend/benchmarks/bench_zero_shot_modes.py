@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Evaluate a single-pass zero-shot candidate against ZERO_SHOT_MODE=pipeline (BART-MNLI, one pass per label).
+
+BART-MNLI is a cross-encoder: premise and hypothesis attend to each other in every layer, so its
+encoder output cannot be reused across labels without changing the scores. The candidate here
+(SinglePassScorer) is a different model: a sentence-embedding bi-encoder that encodes each email
+once and scores softmax(scale * cosine) against cached label-hypothesis embeddings. It is not a
+serving mode; it can only become one once this benchmark meets the parity tolerance below on
+stored mail.
+
+Reports top-1 agreement, mean confidence delta and seconds per email as the label set grows, and
+exits non-zero if the parity tolerance below is not met. --db N uses the cleaned_text of the N
+newest stored emails (EMAILS_DB_FILE) instead of the synthetic corpus; parity only means
+something on real mail. --calibrate fits the scale on half the corpus: the softmax temperature
+whose label distribution is closest (mean KL) to the pipeline's. It then reports parity on the
+other half with that scale.
+
+Usage: python benchmarks/bench_zero_shot_modes.py [--emails 64] [--db N] [--calibrate] [--scale S]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_classifier_batch import make_corpus  # noqa: E402
+
+# Candidate embedding model (small, CPU friendly) and the hypothesis wording the pipeline uses
+SINGLE_PASS_MODEL = os.getenv("SINGLE_PASS_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+HYPOTHESIS_TEMPLATE = "This example is {}."
+EXTRA_LABELS = ["finance", "travel", "shopping", "social", "health", "newsletter", "support", "jobs"]
+
+# Parity contract with the NLI pipeline: top-1 labels agree on at least this share of the corpus...
+PARITY_MIN_TOP1_AGREEMENT = 0.85
+# ...and the top-label confidence differs by at most this much on average (auto-replies gate on 0.7)
+PARITY_MAX_MEAN_CONFIDENCE_DELTA = 0.05
+CALIBRATION_SCALES = np.geomspace(1.0, 300.0, 600)
+
+
+def similarity_probabilities(similarities: np.ndarray, scale: float) -> np.ndarray:
+    """Row-wise softmax of scale * cosine similarity."""
+    logits = scale * similarities
+    logits = logits - logits.max(axis=1, keepdims=True)
+    probs = np.exp(logits)
+    return probs / probs.sum(axis=1, keepdims=True)
+
+
+class SinglePassScorer:
+    """Encodes each email once; label hypotheses are embedded once and cached per label set."""
+
+    def __init__(self, model_name: str = SINGLE_PASS_MODEL, template: str = HYPOTHESIS_TEMPLATE):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+        self.torch = torch
+        self.template = template
+        self.scale = None
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).eval()
+        self._label_cache = {}
+
+    def _encode(self, texts):
+        """Mean-pooled, L2-normalised embeddings for one padded batch."""
+        torch = self.torch
+        inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=256, return_tensors="pt")
+        with torch.inference_mode():
+            hidden = self.model(**inputs).last_hidden_state
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        return torch.nn.functional.normalize(pooled, p=2, dim=1).numpy()
+
+    def similarities(self, texts, labels) -> np.ndarray:
+        """(len(texts), len(labels)) cosine similarities between emails and label hypotheses."""
+        key = tuple(labels)
+        if key not in self._label_cache:
+            self._label_cache[key] = self._encode([self.template.format(label) for label in labels])
+        return self._encode(texts) @ self._label_cache[key].T
+
+    def score(self, texts, labels) -> np.ndarray:
+        return similarity_probabilities(self.similarities(texts, labels), self.scale)
+
+
+def stored_corpus(n: int):
+    from sqlalchemy import select
+    from app.database.db import ReadSession, EmailRecord
+    session = ReadSession()
+    try:
+        return [t for (t,) in session.execute(
+            select(EmailRecord.cleaned_text).where(EmailRecord.cleaned_text.is_not(None))
+            .order_by(EmailRecord.id.desc()).limit(n)
+        ) if t]
+    finally:
+        session.close()
+
+
+def pipeline_probabilities(results, labels) -> np.ndarray:
+    """The pipeline's per-label scores, in `labels` order."""
+    out = np.zeros((len(results), len(labels)))
+    for i, r in enumerate(results):
+        scores = dict(zip(r["labels"], r["scores"]))
+        out[i] = [scores[label] for label in labels]
+    return out
+
+
+def fit_scale(similarities: np.ndarray, reference: np.ndarray) -> float:
+    """Scale minimising mean KL(reference || softmax(scale * similarities))."""
+    ref = np.clip(reference, 1e-9, 1.0)
+
+    def loss(scale):
+        probs = np.clip(similarity_probabilities(similarities, scale), 1e-12, 1.0)
+        return float((ref * (np.log(ref) - np.log(probs))).sum(axis=1).mean())
+
+    return float(min(CALIBRATION_SCALES, key=loss))
+
+
+def parity(probs: np.ndarray, reference: np.ndarray):
+    top = probs.argmax(axis=1)
+    ref_top = reference.argmax(axis=1)
+    rows = np.arange(len(probs))
+    agreement = float((top == ref_top).mean())
+    mean_delta = float(np.abs(probs[rows, top] - reference[rows, ref_top]).mean())
+    # Emails the 0.7 auto-reply gate treats differently
+    gate_flips = float(((probs[rows, top] > 0.7) != (reference[rows, ref_top] > 0.7)).mean())
+    return agreement, mean_delta, gate_flips
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--emails", type=int, default=64)
+    ap.add_argument("--db", type=int, default=0, help="Use the N newest stored emails as the corpus")
+    ap.add_argument("--calibrate", action="store_true", help="Fit the similarity scale on half the corpus")
+    ap.add_argument("--scale", type=float, default=None, help="Scale to check instead of calibrating")
+    args = ap.parse_args()
+
+    from app.services import classifier as clf_module
+    from transformers import pipeline
+
+    corpus = stored_corpus(args.db) if args.db else make_corpus(args.emails)
+    print(f"corpus: {len(corpus)} {'stored' if args.db else 'synthetic'} emails")
+    labels = list(clf_module.CANDIDATE_LABELS)
+    nli = pipeline("zero-shot-classification", model="facebook/bart-large-mnli", device=-1)
+    scorer = SinglePassScorer()
+
+    reference = pipeline_probabilities(nli(corpus, labels), labels)
+    similarities = scorer.similarities(corpus, labels)
+    evaluate = slice(None)
+    scale = args.scale
+    if args.calibrate:
+        half = len(corpus) // 2
+        scale = fit_scale(similarities[:half], reference[:half])
+        evaluate = slice(half, None)
+        print(f"calibrated on {half} emails: scale={scale:.2f}")
+    if scale is None:
+        raise SystemExit("❌ No scale: pass --calibrate or --scale")
+
+    probs = similarity_probabilities(similarities[evaluate], scale)
+    agreement, mean_delta, gate_flips = parity(probs, reference[evaluate])
+    print(f"top-1 agreement: {agreement:.3f} (min {PARITY_MIN_TOP1_AGREEMENT})")
+    print(f"mean confidence delta: {mean_delta:.3f} (max {PARITY_MAX_MEAN_CONFIDENCE_DELTA})")
+    print(f"auto-reply gate (confidence > 0.7) decided differently: {gate_flips:.1%}")
+
+    # Cost as labels are added
+    scorer.scale = scale
+    print(f"{'labels':>7} {'pipeline s/email':>17} {'single_pass s/email':>20}")
+    for n_extra in (0, 4, 8):
+        label_set = labels + EXTRA_LABELS[:n_extra]
+        start = time.perf_counter()
+        nli(corpus, label_set)
+        t_nli = (time.perf_counter() - start) / len(corpus)
+        start = time.perf_counter()
+        scorer.score(corpus, label_set)
+        t_sp = (time.perf_counter() - start) / len(corpus)
+        print(f"{len(label_set):>7} {t_nli:>17.4f} {t_sp:>20.4f}")
+
+    ok = agreement >= PARITY_MIN_TOP1_AGREEMENT and mean_delta <= PARITY_MAX_MEAN_CONFIDENCE_DELTA
+    print("checks:", "ok" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()